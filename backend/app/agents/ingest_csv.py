@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+from app.utils.hashing import hash_df
 
 class IngestCSV:
     """
@@ -33,6 +34,7 @@ class IngestCSV:
             # Read the CSV file into a pandas DataFrame
             df = pd.read_csv(file_path)
             ctx["df"] = df
+            ctx["dataset_hash"] = hash_df(df)
             print(f"--- IngestCSV Agent: Successfully read {dataset_id} with {len(df)} rows. ---")
 
         except FileNotFoundError:
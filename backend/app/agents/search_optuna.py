@@ -1,32 +1,123 @@
+import os
 import optuna
-from sklearn.model_selection import cross_val_predict, StratifiedKFold
-from sklearn.linear_model import LogisticRegression
+from sklearn.base import clone
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import StratifiedKFold
 from sklearn.pipeline import Pipeline
+from app.core.genetic import instantiate
+from app.core.storage import ROOT
+from app.core.executor import core_budget
+
+# Studies live in one SQLite file under the runtime dir, named after the
+# dataset/target/folds and the search space version. Every search adds
+# n_trials new trials to its study; the trials of earlier searches on the same
+# data warm up the sampler, and other processes on the same data join it.
+OPTUNA_DB = ROOT / "optuna.db"
+OPTUNA_PRUNER = os.getenv("NG1_OPTUNA_PRUNER", "median")   # median | halving | none
+OPTUNA_FOLDS = int(os.getenv("NG1_OPTUNA_FOLDS", "5"))
+# Trials running in parallel in this process (<=0: the search core budget).
+OPTUNA_N_JOBS = int(os.getenv("NG1_OPTUNA_N_JOBS", "0"))
+HEARTBEAT_S = 60
+
+def _storage():
+    # Trials whose heartbeat stops (the process died) are failed on the next
+    # optimize() and retried once by a fresh trial with the same params.
+    return optuna.storages.RDBStorage(
+        f"sqlite:///{OPTUNA_DB}",
+        engine_kwargs={"connect_args": {"timeout": 30}},
+        heartbeat_interval=HEARTBEAT_S,
+        failed_trial_callback=optuna.storages.RetryFailedTrialCallback(max_retry=1),
+    )
+
+def _pruner():
+    if OPTUNA_PRUNER == "halving":
+        return optuna.pruners.SuccessiveHalvingPruner()
+    if OPTUNA_PRUNER == "none":
+        return optuna.pruners.NopPruner()
+    return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=1)
+
+# Bump when _suggest changes: its trials then go to a new study instead of
+# mixing with ones drawn from the old distributions.
+SEARCH_SPACE_VERSION = 1
+
+def _suggest(trial, inner_jobs: int):
+    """Same families and ranges as core.genetic."""
+    family = trial.suggest_categorical("family", ["logreg", "rf", "gb"])
+    if family == "logreg":
+        return family, {"C": trial.suggest_float("C", 1e-2, 1e2, log=True), "solver": "lbfgs", "max_iter": 1000}
+    if family == "rf":
+        return family, {
+            "n_estimators": trial.suggest_categorical("rf_n_estimators", [100, 200]),
+            "max_depth": trial.suggest_categorical("rf_max_depth", [None, 6, 10]),
+            "min_samples_split": trial.suggest_categorical("rf_min_samples_split", [2, 4, 8]),
+            "min_samples_leaf": trial.suggest_categorical("rf_min_samples_leaf", [1, 2, 4]),
+            "n_jobs": inner_jobs,
+        }
+    return family, {
+        "n_estimators": trial.suggest_categorical("gb_n_estimators", [100, 150]),
+        "learning_rate": trial.suggest_categorical("gb_learning_rate", [0.05, 0.1, 0.2]),
+        "max_depth": trial.suggest_categorical("gb_max_depth", [2, 3]),
+        "subsample": trial.suggest_categorical("gb_subsample", [0.8, 1.0]),
+    }
+
+def _model(params, inner_jobs: int):
+    """Rebuild (family, estimator params) from a finished trial's params."""
+    family = params["family"]
+    if family == "logreg":
+        return family, {"C": params["C"], "solver": "lbfgs", "max_iter": 1000}
+    prefix = f"{family}_"
+    out = {k[len(prefix):]: v for k, v in params.items() if k.startswith(prefix)}
+    if family == "rf":
+        out["n_jobs"] = inner_jobs
+    return family, out
 
 class SearchOptuna:
-    name="search_optuna"; version="0.1"
+    name="search_optuna"; version="0.2"
     def run(self, ctx):
         X, y = ctx["X"], ctx["y"]
         pre_clf: Pipeline = ctx["pipeline_template"]
+        n_trials = ctx.get("n_trials", 40)
+        n_jobs = OPTUNA_N_JOBS if OPTUNA_N_JOBS > 0 else core_budget()
+        inner_jobs = max(1, core_budget() // n_jobs)
+
+        # Preprocessing is fitted once per fold and shared by every trial.
+        cv = StratifiedKFold(n_splits=OPTUNA_FOLDS, shuffle=True, random_state=42)
+        folds = []
+        for tr, te in cv.split(X, y):
+            pre = clone(pre_clf.named_steps["pre"])
+            folds.append((pre.fit_transform(X.iloc[tr]), y.iloc[tr].to_numpy(),
+                          pre.transform(X.iloc[te]), y.iloc[te].to_numpy()))
 
         def objective(trial):
-            C = trial.suggest_float("C", 1e-3, 1e2, log=True)
-            clf = LogisticRegression(max_iter=1000, C=C, n_jobs=-1)
-            pipe = Pipeline([("pre", pre_clf.named_steps["pre"]), ("clf", clf)])
-            cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-            # Use cross_val_predict to get probs for auc metrics
-            prob = cross_val_predict(pipe, X, y, cv=cv, method="predict_proba")[:,1]
-            from sklearn.metrics import roc_auc_score
-            return roc_auc_score(y, prob)
-
-        study = optuna.create_study(direction="maximize")
-        study.optimize(objective, n_trials=ctx.get("n_trials", 40))
-        best_C = study.best_params["C"]
-
-        best_clf = LogisticRegression(max_iter=1000, C=best_C, n_jobs=-1)
-        best_pipe = Pipeline([("pre", pre_clf.named_steps["pre"]), ("clf", best_clf)])
+            family, params = _suggest(trial, inner_jobs)
+            aucs = []
+            for step, (Xtr, ytr, Xte, yte) in enumerate(folds):
+                clf = instantiate(family, params).fit(Xtr, ytr)
+                aucs.append(roc_auc_score(yte, clf.predict_proba(Xte)[:, 1]))
+                trial.report(sum(aucs) / len(aucs), step)
+                if trial.should_prune():
+                    raise optuna.TrialPruned()
+            return sum(aucs) / len(aucs)
+
+        study = optuna.create_study(
+            study_name=f"{ctx['dataset_hash'][:16]}-{ctx['target']}-k{OPTUNA_FOLDS}-s{SEARCH_SPACE_VERSION}",
+            storage=_storage(), load_if_exists=True, direction="maximize", pruner=_pruner(),
+        )
+        done = (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)
+        prior = sum(t.state in done for t in study.trials)
+        # n_trials new trials on top of whatever earlier searches left in the study.
+        study.optimize(objective, n_trials=n_trials, n_jobs=n_jobs)
+
+        family, params = _model(study.best_params, inner_jobs)
+        best_pipe = Pipeline([("pre", clone(pre_clf.named_steps["pre"])), ("clf", instantiate(family, params))])
         best_pipe.fit(X, y)
 
+        states = [t.state for t in study.trials]
         ctx["fitted_pipeline"] = best_pipe
-        ctx["search_summary"] = {"best_auc_cv": study.best_value, "best_params": study.best_params}
-        return ctx
\ No newline at end of file
+        ctx["search_summary"] = {
+            "best_auc_cv": study.best_value, "best_params": study.best_params, "study": study.study_name,
+            "trials": len(states), "prior_trials": prior,
+            "pruned": states.count(optuna.trial.TrialState.PRUNED),
+            "complete": states.count(optuna.trial.TrialState.COMPLETE),
+        }
+        return ctx
@@ -0,0 +1,118 @@
+from __future__ import annotations
+import os, time, asyncio, bisect
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from .serving import LoadedChampion
+from .executor import run_io
+from .telemetry import PREDICT_BATCH_ROWS, PREDICT_QUEUE_SECONDS
+
+MAX_WAIT_MS = float(os.getenv("NG1_BATCH_MAX_WAIT_MS", "2"))
+MAX_BATCH_ROWS = int(os.getenv("NG1_BATCH_MAX_ROWS", "256"))
+
+_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096]
+_WAIT_BUCKETS_MS = [0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250]
+
+_batch_rows, _queue_s = PREDICT_BATCH_ROWS.labels(), PREDICT_QUEUE_SECONDS.labels()
+
+class BatchStats:
+    """Counters + fixed-bucket histograms for batch size and queue latency."""
+    def __init__(self):
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+        self.size_hist = [0] * (len(_SIZE_BUCKETS) + 1)
+        self.wait_hist = [0] * (len(_WAIT_BUCKETS_MS) + 1)
+        self.wait_ms_sum = 0.0
+        self.wait_ms_max = 0.0
+
+    def record(self, rows: int, waits_ms: List[float]):
+        self.batches += 1
+        self.requests += len(waits_ms)
+        self.rows += rows
+        self.size_hist[bisect.bisect_left(_SIZE_BUCKETS, rows)] += 1
+        _batch_rows.observe(rows)
+        for w in waits_ms:
+            _queue_s.observe(w / 1000.0)
+            self.wait_hist[bisect.bisect_left(_WAIT_BUCKETS_MS, w)] += 1
+            self.wait_ms_sum += w
+            if w > self.wait_ms_max:
+                self.wait_ms_max = w
+
+    def snapshot(self) -> Dict[str, Any]:
+        le = lambda bs: [str(b) for b in bs] + ["+Inf"]
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "rows": self.rows,
+            "mean_batch_rows": self.rows / self.batches if self.batches else 0.0,
+            "mean_queue_ms": self.wait_ms_sum / self.requests if self.requests else 0.0,
+            "max_queue_ms": self.wait_ms_max,
+            "batch_rows_hist": dict(zip(le(_SIZE_BUCKETS), self.size_hist)),
+            "queue_ms_hist": dict(zip(le(_WAIT_BUCKETS_MS), self.wait_hist)),
+        }
+
+class MicroBatcher:
+    """
+    Coalesces concurrent /predict calls into one predict_proba per pipeline.
+
+    A batch is flushed when it reaches max_rows or max_wait_ms after its first
+    request, whichever comes first. Requests are grouped by champion key, so
+    callers that resolved the old champion are scored with it even if a new
+    one was published while they were queued. Event-loop only; the scoring
+    itself runs on the I/O pool.
+    """
+    def __init__(self, max_wait_ms: float = MAX_WAIT_MS, max_rows: int = MAX_BATCH_ROWS):
+        self.max_wait_ms = max_wait_ms
+        self.max_rows = max_rows
+        self.stats = BatchStats()
+        self._pending: List[Tuple[LoadedChampion, np.ndarray, asyncio.Future, float]] = []
+        self._pending_rows = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight: set = set()
+
+    async def submit(self, loaded: LoadedChampion, X: np.ndarray) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((loaded, X, fut, time.perf_counter()))
+        self._pending_rows += X.shape[0]
+        if self._pending_rows >= self.max_rows:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000.0, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_rows = self._pending, [], 0
+        if not batch:
+            return
+        groups: Dict[Any, list] = {}
+        for item in batch:
+            groups.setdefault(item[0].key, []).append(item)
+        for items in groups.values():
+            task = asyncio.ensure_future(self._score(items))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _score(self, items):
+        started = time.perf_counter()
+        waits = [(started - t0) * 1000.0 for _, _, _, t0 in items]
+        X = items[0][1] if len(items) == 1 else np.vstack([x for _, x, _, _ in items])
+        self.stats.record(X.shape[0], waits)
+        try:
+            preds = await run_io(items[0][0].predict, X)
+        except Exception as e:
+            for _, _, fut, _ in items:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        off = 0
+        for _, x, fut, _ in items:
+            n = x.shape[0]
+            if not fut.done():
+                fut.set_result(preds[off:off + n])
+            off += n
+
+batcher = MicroBatcher()
@@ -0,0 +1,211 @@
+from __future__ import annotations
+import os, json, shutil
+from pathlib import Path
+from typing import Any, Dict, Optional
+import numpy as np
+
+# Champion pipelines exported as plain numpy arrays, scored without sklearn:
+#   logreg   - scaler folded into the weights: p = sigmoid(X @ w + b)
+#   forest   - every tree's nodes concatenated into flat arrays; p = mean of leaf P(y=1)
+#   boosting - same node layout; p = sigmoid(init + lr * sum of leaf values)
+# Trees compare float32 inputs against float64 thresholds like sklearn does,
+# so leaf assignment is identical; only summation order can differ (~1e-15).
+# A leading SimpleImputer step ("impute") is kept as per-feature fill values.
+# sklearn is only imported by compile_pipeline (training side): the serving
+# path that loads and scores CompiledModel stays numpy-only.
+CHUNK_ROWS = 4096   # bounds the (rows, trees) node-index matrix
+# numpy traversal beats sklearn's per-call overhead on small batches but not
+# its Cython loop on large ones: tree models take the compiled path only up
+# to this many row x tree paths per call (see prefer_compiled).
+COMPILED_MAX_PATHS = int(os.getenv("NG1_COMPILED_MAX_PATHS", "10000"))
+EXPORT_TOL = 1e-9   # max |compiled - sklearn| on the validation rows to export
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    """1 / (1 + exp(-z)) without overflow for large |z|."""
+    e = np.exp(-np.abs(z))
+    return np.where(z >= 0, 1 / (1 + e), e / (1 + e))
+
+def _flatten_trees(trees, leaf_value) -> Dict[str, np.ndarray]:
+    """Concatenate fitted sklearn trees; leaves are the nodes whose children are themselves."""
+    feature, threshold, left, right, missing, value, roots = [], [], [], [], [], [], []
+    off = 0
+    for t in trees:
+        tr = t.tree_
+        n = tr.node_count
+        leaf = tr.children_left == -1
+        ids = np.arange(off, off + n)
+        feature.append(np.where(leaf, 0, tr.feature))
+        threshold.append(tr.threshold)
+        left.append(np.where(leaf, ids, tr.children_left + off))
+        right.append(np.where(leaf, ids, tr.children_right + off))
+        missing.append(getattr(tr, "missing_go_to_left", np.ones(n, dtype=np.uint8)) == 0)
+        value.append(leaf_value(tr))
+        roots.append(off)
+        off += n
+    # Index arrays are stored as intp so they are used as loaded, without a cast.
+    children = np.stack([np.concatenate(left), np.concatenate(right)]).astype(np.intp)
+    return {"feature": np.concatenate(feature).astype(np.intp),
+            "threshold": np.concatenate(threshold).astype(np.float64),
+            "children": children,
+            "is_leaf": children[0] == np.arange(children.shape[1]),
+            "missing_right": np.concatenate(missing),
+            "value": np.concatenate(value).astype(np.float64),
+            "roots": np.asarray(roots, dtype=np.intp)}
+
+def _class1_fraction(tr) -> np.ndarray:
+    v = tr.value[:, 0, :]
+    total = v.sum(axis=1)
+    return v[:, 1] / np.where(total == 0.0, 1.0, total)
+
+def _is_linear(clf) -> bool:
+    from sklearn.linear_model import LogisticRegression, SGDClassifier
+    # SGDClassifier only with log loss: its predict_proba is then sigmoid(decision) too.
+    return isinstance(clf, LogisticRegression) or (isinstance(clf, SGDClassifier) and clf.loss == "log_loss")
+
+def _boosting_init(clf) -> Optional[float]:
+    """
+    Raw (log-odds) starting score of a binary GradientBoostingClassifier, from
+    its public init_ estimator. None for a feature-dependent init estimator.
+    """
+    from sklearn.dummy import DummyClassifier
+    if isinstance(clf.init_, str):   # init="zero"
+        return 0.0
+    if not (isinstance(clf.init_, DummyClassifier) and clf.init_.strategy == "prior"):
+        return None
+    # Clipped like sklearn's log-loss link before taking the logit.
+    eps = np.finfo(np.float32).eps
+    p = float(np.clip(clf.init_.class_prior_[1], eps, 1 - eps))
+    return float(np.log(p / (1 - p)))
+
+def compile_pipeline(pipe) -> Optional["CompiledModel"]:
+    """Compiled form of a fitted (["impute"], "pre", "clf") binary pipeline, or None if unsupported."""
+    from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import StandardScaler
+    pre, clf = pipe.named_steps.get("pre"), pipe.named_steps.get("clf")
+    impute = pipe.named_steps.get("impute")
+    if len(getattr(clf, "classes_", ())) != 2 or set(pipe.named_steps) - {"impute", "pre", "clf"}:
+        return None
+    if impute is not None and not (isinstance(impute, SimpleImputer) and not impute.add_indicator
+                                   and isinstance(impute.missing_values, float) and np.isnan(impute.missing_values)
+                                   and len(impute.statistics_) == clf.n_features_in_):
+        return None
+    if pre in (None, "passthrough"):
+        mean = scale = None
+    elif isinstance(pre, StandardScaler) and _is_linear(clf):
+        mean, scale = pre.mean_, pre.scale_
+    else:
+        return None
+    n_features = clf.n_features_in_
+    if _is_linear(clf):
+        w, b = clf.coef_[0].astype(np.float64), float(clf.intercept_[0])
+        if scale is not None:
+            w = w / scale
+        if mean is not None:
+            b -= float(mean @ w)
+        arrays = {"kind": np.asarray("logreg"), "coef": w, "intercept": np.asarray(b)}
+    elif isinstance(clf, RandomForestClassifier):
+        arrays = {"kind": np.asarray("forest"), **_flatten_trees(clf.estimators_, _class1_fraction)}
+    elif isinstance(clf, GradientBoostingClassifier) and clf.estimators_.shape[1] == 1:
+        init = _boosting_init(clf)
+        if init is None:
+            return None
+        arrays = {"kind": np.asarray("boosting"),
+                  **_flatten_trees(clf.estimators_[:, 0], lambda tr: tr.value[:, 0, 0]),
+                  "init": np.asarray(init),
+                  "learning_rate": np.asarray(float(clf.learning_rate))}
+    else:
+        return None
+    if impute is not None:
+        arrays["fill"] = impute.statistics_.astype(np.float64)
+    arrays["n_features"] = np.asarray(n_features, dtype=np.int64)
+    return CompiledModel(arrays)
+
+class CompiledModel:
+    """Numpy-only scorer for a compiled champion (see compile_pipeline)."""
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.arrays = arrays
+        self.kind = str(arrays["kind"])
+        self.n_features = int(arrays["n_features"])
+
+    @classmethod
+    def load(cls, path, mmap: bool = False) -> "CompiledModel":
+        """
+        From a directory of .npy files (one per array). With mmap=True the
+        arrays are read-only memory maps, so every process serving the same
+        champion shares one page-cached copy instead of holding its own.
+        """
+        path = Path(path)
+        if path.suffix == ".npz":   # single-file format of earlier exports
+            with np.load(path, allow_pickle=False) as z:
+                return cls({k: z[k] for k in z.files})
+        mode = "r" if mmap else None
+        arrays = {k: np.asarray(v) for k, v in json.loads((path / "meta.json").read_text()).items()}
+        for f in path.glob("*.npy"):
+            arrays[f.stem] = np.load(f, mmap_mode=mode, allow_pickle=False)
+        return cls(arrays)
+
+    def save(self, path: Path):
+        """Write the directory (scalars in meta.json, arrays as .npy) and rename it into place."""
+        tmp = path.with_name(f".{path.name}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        meta = {}
+        for name, arr in self.arrays.items():
+            if np.ndim(arr) == 0:
+                meta[name] = np.asarray(arr).item()
+            else:
+                np.save(tmp / f"{name}.npy", np.ascontiguousarray(arr), allow_pickle=False)
+        (tmp / "meta.json").write_text(json.dumps(meta))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+    def _leaf_values(self, X32: np.ndarray) -> np.ndarray:
+        # Walk all (row, tree) paths together, one level per step, dropping
+        # paths as they reach a leaf so shallow leaves cost nothing more.
+        a = self.arrays
+        feature, threshold, children = a["feature"], a["threshold"], a["children"]
+        roots, n_trees = a["roots"], len(a["roots"])
+        has_nan = bool(np.isnan(X32).any())
+        out = np.empty((X32.shape[0], n_trees), dtype=np.float64)
+        for s in range(0, X32.shape[0], CHUNK_ROWS):
+            flat = X32[s:s + CHUNK_ROWS].ravel()
+            n = len(flat) // self.n_features
+            idx = np.tile(roots, n)
+            base = np.repeat(np.arange(n, dtype=np.intp) * self.n_features, n_trees)
+            active = np.flatnonzero(~a["is_leaf"][idx])
+            while active.size:
+                node = idx[active]
+                x = flat[base[active] + feature[node]]
+                go_right = x > threshold[node]
+                if has_nan:
+                    go_right |= np.isnan(x) & a["missing_right"][node]
+                node = children[go_right.view(np.int8), node]
+                idx[active] = node
+                active = active[~a["is_leaf"][node]]
+            out[s:s + n] = a["value"][idx].reshape(n, n_trees)
+        return out
+
+    def prefer_compiled(self, n_rows: int) -> bool:
+        return self.kind == "logreg" or n_rows * len(self.arrays["roots"]) <= COMPILED_MAX_PATHS
+
+    def predict_positive(self, X: np.ndarray) -> np.ndarray:
+        """P(y=1) for a (rows, n_features) matrix in manifest feature order."""
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"expected shape (rows, {self.n_features}), got {X.shape}")
+        a = self.arrays
+        if "fill" in a and np.isnan(X).any():
+            X = np.where(np.isnan(X), a["fill"], X)
+        if self.kind == "logreg":
+            return _sigmoid(X.astype(np.float64, copy=False) @ a["coef"] + a["intercept"])
+        leaves = self._leaf_values(np.ascontiguousarray(X, dtype=np.float32))
+        if self.kind == "forest":
+            return leaves.mean(axis=1)
+        return _sigmoid(a["init"] + a["learning_rate"] * leaves.sum(axis=1))
+
+def max_abs_diff(compiled: CompiledModel, pipe: Any, X: np.ndarray) -> float:
+    """Largest |compiled - sklearn| P(y=1) over X (export-time equivalence check)."""
+    if len(X) == 0:
+        return 0.0
+    return float(np.max(np.abs(compiled.predict_positive(X) - pipe.predict_proba(X)[:, 1])))
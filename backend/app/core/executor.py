@@ -0,0 +1,90 @@
+from __future__ import annotations
+import os, asyncio, functools, multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Executor
+from typing import Any, Callable, Dict, Optional
+from fastapi import HTTPException
+
+# Pool sizes (env-configurable). NG1_INFERENCE_PROCESSES=0 keeps inference on
+# the thread pool; >0 sends large batches to a spawn-based process pool.
+IO_WORKERS = int(os.getenv("NG1_IO_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+INFERENCE_PROCESSES = int(os.getenv("NG1_INFERENCE_PROCESSES", "0"))
+PROCESS_MIN_ROWS = int(os.getenv("NG1_PROCESS_MIN_ROWS", "5000"))
+
+# Total cores a training search may use (-1 = all). Split between
+# population-level workers and per-estimator n_jobs so an n_jobs=-1 RF inside
+# a parallel population does not oversubscribe the box.
+SEARCH_N_JOBS = int(os.getenv("NG1_SEARCH_N_JOBS", "-1"))
+
+def core_budget() -> int:
+    """Cores for one training search (genetic population or Optuna study)."""
+    cpus = os.cpu_count() or 1
+    return cpus if SEARCH_N_JOBS <= 0 else min(SEARCH_N_JOBS, cpus)
+
+_io_pool: Optional[ThreadPoolExecutor] = None
+_cpu_pool: Optional[ProcessPoolExecutor] = None
+
+def io_pool() -> ThreadPoolExecutor:
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="ng1-io")
+    return _io_pool
+
+def cpu_pool() -> Executor:
+    global _cpu_pool
+    if INFERENCE_PROCESSES <= 0:
+        return io_pool()
+    if _cpu_pool is None:
+        # spawn: forking a threaded server process is not safe
+        _cpu_pool = ProcessPoolExecutor(max_workers=INFERENCE_PROCESSES,
+                                        mp_context=multiprocessing.get_context("spawn"))
+    return _cpu_pool
+
+async def run_io(fn: Callable, *args, **kwargs) -> Any:
+    """Blocking I/O (file reads/writes, csv sniffing, model loading) off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(io_pool(), functools.partial(fn, *args, **kwargs))
+
+async def run_cpu(fn: Callable, *args, **kwargs) -> Any:
+    """Heavy inference. fn and its arguments must be picklable when a process pool is configured."""
+    return await asyncio.get_running_loop().run_in_executor(cpu_pool(), functools.partial(fn, *args, **kwargs))
+
+def shutdown():
+    global _io_pool, _cpu_pool
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=False, cancel_futures=True)
+        _cpu_pool = None
+    if _io_pool is not None:
+        _io_pool.shutdown(wait=False, cancel_futures=True)
+        _io_pool = None
+
+class ConcurrencyLimit:
+    """
+    Per-endpoint in-flight cap. Requests over the cap are rejected with 503 and
+    Retry-After instead of piling up in the executor queue. Only touched from
+    the event loop thread, so a plain counter is enough.
+    """
+    def __init__(self, name: str, limit: int, retry_after: int = 1):
+        self.name, self.limit, self.retry_after = name, limit, retry_after
+        self.active = 0
+
+    async def __aenter__(self):
+        if self.limit > 0 and self.active >= self.limit:
+            raise HTTPException(status_code=503,
+                                detail=f"{self.name} is at capacity ({self.limit} in flight), retry later.",
+                                headers={"Retry-After": str(self.retry_after)})
+        self.active += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.active -= 1
+        return False
+
+def limit_from_env(name: str, default: int) -> ConcurrencyLimit:
+    """NG1_LIMIT_<NAME> overrides the default; 0 disables the cap."""
+    return ConcurrencyLimit(name, int(os.getenv(f"NG1_LIMIT_{name.upper()}", str(default))))
+
+LIMITS: Dict[str, ConcurrencyLimit] = {
+    "upload": limit_from_env("upload", 4),
+    "predict": limit_from_env("predict", 64),
+    "predict_batch": limit_from_env("predict_batch", 8),
+    "champion": limit_from_env("champion", 64),
+}
@@ -0,0 +1,138 @@
+from __future__ import annotations
+import os, json, time, uuid, asyncio, threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from .storage import MODELS_DIR, ROOT
+from .serving import LoadedChampion, model_pool
+from .executor import run_io
+from .batching import batcher
+
+# One A/B experiment at a time against the champion: a challenger version
+# either answers a fraction of /predict requests ("split"), or is scored on
+# every request after the champion's answer is ready ("shadow") and only the
+# comparison is logged. The config is a file next to champion.json so every
+# API process runs the same experiment; reading it costs one stat().
+SHADOW_DIR = ROOT / "shadow"
+SHADOW_DIR.mkdir(parents=True, exist_ok=True)
+# Shadow scorings allowed in flight per process; beyond that they are skipped
+# rather than queued, so a slow challenger never backs up the champion.
+SHADOW_MAX_INFLIGHT = int(os.getenv("NG1_SHADOW_MAX_INFLIGHT", "8"))
+
+def experiment_file() -> Path:
+    return MODELS_DIR / "experiment.json"
+
+class ExperimentConfig:
+    def __init__(self):
+        self._sig: Optional[Tuple[int, int, int]] = None
+        self._cfg: Optional[Dict[str, Any]] = None
+
+    def get(self) -> Optional[Dict[str, Any]]:
+        try:
+            st = os.stat(experiment_file())
+        except FileNotFoundError:
+            self._sig = self._cfg = None
+            return None
+        sig = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if sig != self._sig:
+            self._cfg, self._sig = json.loads(experiment_file().read_text()), sig
+        return self._cfg
+
+    def set(self, cfg: Dict[str, Any]):
+        dst = experiment_file()
+        tmp = dst.with_suffix(f".json.{uuid.uuid4().hex}.tmp")
+        tmp.write_text(json.dumps({**cfg, "started": time.time()}))
+        os.replace(tmp, dst)
+
+    def clear(self):
+        experiment_file().unlink(missing_ok=True)
+
+experiment = ExperimentConfig()
+
+class ShadowLog:
+    """
+    Champion vs challenger comparison: running totals per pair in memory,
+    plus one JSON line per scored request in shadow/<champion>-vs-<challenger>.jsonl.
+    record() runs on io-pool threads, so totals and file appends take a lock.
+    """
+    def __init__(self):
+        self.pairs: Dict[str, Dict[str, float]] = {}
+        self.skipped = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def record(self, champion: Any, challenger: int, p_champion: np.ndarray, p_challenger: np.ndarray):
+        name = f"{champion}-vs-{challenger}"
+        diff = np.abs(p_champion - p_challenger)
+        agree = int(np.sum((p_champion >= 0.5) == (p_challenger >= 0.5)))
+        line = {"ts": time.time(), "rows": len(diff), "mean_abs_diff": float(diff.mean()), "agree": agree,
+                "champion_mean": float(p_champion.mean()), "challenger_mean": float(p_challenger.mean())}
+        with self._lock:
+            s = self.pairs.setdefault(name, {"requests": 0, "rows": 0, "abs_diff_sum": 0.0, "max_abs_diff": 0.0,
+                                             "agree": 0, "champion_sum": 0.0, "challenger_sum": 0.0})
+            s["requests"] += 1
+            s["rows"] += len(diff)
+            s["abs_diff_sum"] += float(diff.sum())
+            s["max_abs_diff"] = max(s["max_abs_diff"], float(diff.max()))
+            s["agree"] += agree
+            s["champion_sum"] += float(p_champion.sum())
+            s["challenger_sum"] += float(p_challenger.sum())
+            with open(SHADOW_DIR / f"{name}.jsonl", "a") as f:
+                f.write(json.dumps(line) + "\n")
+
+    def fail(self):
+        with self._lock:
+            self.failed += 1
+
+    def skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            pairs = {name: dict(s) for name, s in self.pairs.items()}
+            skipped, failed = self.skipped, self.failed
+        out = {}
+        for name, s in pairs.items():
+            n = s["rows"] or 1
+            out[name] = {"requests": s["requests"], "rows": s["rows"], "mean_abs_diff": s["abs_diff_sum"] / n,
+                         "max_abs_diff": s["max_abs_diff"], "agreement": s["agree"] / n,
+                         "champion_mean": s["champion_sum"] / n, "challenger_mean": s["challenger_sum"] / n}
+        return {"pairs": out, "skipped": skipped, "failed": failed}
+
+shadow_log = ShadowLog()
+_tasks: set = set()
+_warming: set = set()
+
+def _spawn(coro):
+    task = asyncio.ensure_future(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+async def _warm(version: int):
+    try:
+        await run_io(model_pool.get, version)
+    except KeyError:
+        pass
+    finally:
+        _warming.discard(version)
+
+def warm(version: int):
+    """Load a challenger into the pool in the background (event loop only)."""
+    if version not in _warming:
+        _warming.add(version)
+        _spawn(_warm(version))
+
+async def _shadow(challenger: LoadedChampion, X: np.ndarray, p_champion: np.ndarray, champion: Any):
+    try:
+        p_challenger = await batcher.submit(challenger, X)
+        await run_io(shadow_log.record, champion, challenger.manifest["version"], p_champion, p_challenger)
+    except Exception:
+        shadow_log.fail()
+
+def shadow(challenger: LoadedChampion, X: np.ndarray, p_champion: np.ndarray, champion: Any):
+    """Score X on the challenger off the request path and log it against the champion's answer."""
+    if len(_tasks) - len(_warming) >= SHADOW_MAX_INFLIGHT:
+        shadow_log.skip()
+        return
+    _spawn(_shadow(challenger, X, p_champion, champion))
@@ -1,5 +1,5 @@
 from __future__ import annotations
-import random
+import json, random
 from typing import Dict, Any, List, Tuple
 from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
@@ -45,6 +45,10 @@ FAMILIES = [
     ("gb", random_gb),
 ]
 
+def canonical_params(params: Dict[str, Any]) -> str:
+    """Order-independent, hashable form of a param dict (cache keys, dedupe)."""
+    return json.dumps(params, sort_keys=True, default=str)
+
 def mutate(name: str, params: Dict[str, Any]) -> Dict[str, Any]:
     # tiny random tweak
     rp = dict(params)
@@ -0,0 +1,155 @@
+from __future__ import annotations
+import os, json, time, sqlite3
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+from .storage import ROOT
+
+# Durable run queue. One SQLite file shared by the API (enqueue/cancel) and the
+# worker processes (claim/heartbeat/finish). A run whose worker stops
+# heartbeating for STALE_AFTER_S is put back in the queue.
+DB_PATH = ROOT / "jobs.db"
+STALE_AFTER_S = float(os.getenv("NG1_JOB_STALE_S", "60"))
+MAX_ATTEMPTS = int(os.getenv("NG1_JOB_MAX_ATTEMPTS", "3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    run_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    heartbeat REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_pick ON jobs (status, priority DESC, created);
+"""
+
+class LeaseLost(Exception):
+    """The run was recovered as stale and may now belong to another worker."""
+
+@contextmanager
+def _db():
+    con = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    try:
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.row_factory = sqlite3.Row
+        yield con
+    finally:
+        con.close()
+
+def init_db():
+    with _db() as con:
+        con.executescript(_SCHEMA)
+
+def enqueue(run_id: str, payload: Dict[str, Any], priority: int = 0):
+    now = time.time()
+    with _db() as con:
+        con.execute("INSERT INTO jobs (run_id, payload, priority, status, created, updated) VALUES (?, ?, ?, 'queued', ?, ?)",
+                    (run_id, json.dumps(payload), priority, now, now))
+
+def claim(worker: str) -> Optional[Dict[str, Any]]:
+    """Atomically take the highest-priority, oldest queued run."""
+    now = time.time()
+    with _db() as con:
+        con.execute("BEGIN IMMEDIATE")
+        row = con.execute("SELECT run_id, payload, attempts FROM jobs WHERE status = 'queued' "
+                          "ORDER BY priority DESC, created LIMIT 1").fetchone()
+        if row is None:
+            con.execute("COMMIT")
+            return None
+        con.execute("UPDATE jobs SET status = 'running', worker = ?, heartbeat = ?, attempts = attempts + 1, "
+                    "updated = ? WHERE run_id = ?", (worker, now, now, row["run_id"]))
+        con.execute("COMMIT")
+    return {"run_id": row["run_id"], "payload": json.loads(row["payload"]), "attempt": row["attempts"] + 1}
+
+def heartbeat(run_id: str, worker: str) -> bool:
+    """
+    Refresh the lease; returns False if the run is no longer this worker's
+    (recovered as stale and claimed again). Cancellation is read separately
+    with cancel_requested().
+    """
+    now = time.time()
+    with _db() as con:
+        cur = con.execute("UPDATE jobs SET heartbeat = ?, updated = ? WHERE run_id = ? AND worker = ? "
+                          "AND status = 'running'", (now, now, run_id, worker))
+    return cur.rowcount > 0
+
+def owns(run_id: str, worker: str) -> bool:
+    """Whether worker still holds the run's lease."""
+    with _db() as con:
+        row = con.execute("SELECT 1 FROM jobs WHERE run_id = ? AND worker = ? AND status = 'running'",
+                          (run_id, worker)).fetchone()
+    return row is not None
+
+def finish(run_id: str, status: str, worker: str) -> bool:
+    """Record the final status; a no-op (False) if the run has since passed to another worker."""
+    with _db() as con:
+        cur = con.execute("UPDATE jobs SET status = ?, updated = ? WHERE run_id = ? AND worker = ?",
+                          (status, time.time(), run_id, worker))
+    return cur.rowcount > 0
+
+def request_cancel(run_id: str) -> Optional[str]:
+    """
+    Queued runs are cancelled on the spot; running ones are flagged and stop at
+    the next checkpoint. Returns the job status after the call (None if unknown).
+    """
+    now = time.time()
+    with _db() as con:
+        con.execute("BEGIN IMMEDIATE")
+        row = con.execute("SELECT status FROM jobs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            con.execute("COMMIT")
+            return None
+        status = row["status"]
+        if status == "queued":
+            status = "cancelled"
+            con.execute("UPDATE jobs SET status = 'cancelled', cancel_requested = 1, updated = ? WHERE run_id = ?",
+                        (now, run_id))
+        elif status == "running":
+            con.execute("UPDATE jobs SET cancel_requested = 1, updated = ? WHERE run_id = ?", (now, run_id))
+        con.execute("COMMIT")
+    return status
+
+def cancel_requested(run_id: str) -> bool:
+    with _db() as con:
+        row = con.execute("SELECT cancel_requested FROM jobs WHERE run_id = ?", (run_id,)).fetchone()
+    return bool(row and row["cancel_requested"])
+
+def recover_stale(stale_after: float = STALE_AFTER_S) -> List[Tuple[str, str]]:
+    """
+    Requeue runs whose worker died mid-run (no heartbeat for stale_after
+    seconds). After MAX_ATTEMPTS they are failed instead.
+    """
+    now = time.time()
+    out = []
+    with _db() as con:
+        con.execute("BEGIN IMMEDIATE")
+        rows = con.execute("SELECT run_id, attempts, cancel_requested FROM jobs "
+                           "WHERE status = 'running' AND heartbeat < ?", (now - stale_after,)).fetchall()
+        for row in rows:
+            if row["cancel_requested"]:
+                status = "cancelled"
+            elif row["attempts"] >= MAX_ATTEMPTS:
+                status = "error"
+            else:
+                status = "queued"
+            con.execute("UPDATE jobs SET status = ?, worker = NULL, updated = ? WHERE run_id = ?",
+                        (status, now, row["run_id"]))
+            out.append((row["run_id"], status))
+        con.execute("COMMIT")
+    return out
+
+def queue_depth() -> Dict[str, int]:
+    with _db() as con:
+        rows = con.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+    return {r["status"]: r["n"] for r in rows}
+
+def get_job(run_id: str) -> Optional[Dict[str, Any]]:
+    with _db() as con:
+        row = con.execute("SELECT run_id, priority, status, attempts, worker, heartbeat, cancel_requested, "
+                          "created, updated FROM jobs WHERE run_id = ?", (run_id,)).fetchone()
+    return dict(row) if row else None
@@ -1,6 +1,7 @@
 # app/core/orchestrator.py
 import uuid
 from app.core.telemetry import init_run, log, get as get_run
+from app.core.profiling import RunProfile
 from app.core.registry import load_latest
 from app.agents.ingest_csv import IngestCSV
 from app.agents.prep_basic import PrepBasic
@@ -13,6 +14,7 @@ def start_run(req: dict):
     run_id = str(uuid.uuid4())[:8]
     init_run(run_id, req)
     ctx = {"run_id": run_id, **req}
+    prof = RunProfile()
     for stage, agent in [
         ("ingest", IngestCSV()),
         ("prep",   PrepBasic()),
@@ -20,9 +22,11 @@ def start_run(req: dict):
         ("eval",   Evaluate()),
         ("deploy", DeployFastAPI()),
     ]:
-        ctx = agent.run(ctx)
-        log(run_id, stage, {"ok": True, **{k: v for k, v in ctx.items() if k in ("metrics","search_summary")}})
-    log(run_id, "done", {"manifest": ctx.get("manifest")})
+        with prof.stage(stage) as m:
+            ctx = agent.run(ctx)
+        log(run_id, stage, {"ok": True, **m.as_dict(),
+                            **{k: v for k, v in ctx.items() if k in ("metrics","search_summary")}})
+    log(run_id, "done", {"manifest": ctx.get("manifest"), "profile": prof.summary()})
     return run_id
 
 def get_status(run_id: str):
@@ -0,0 +1,148 @@
+from __future__ import annotations
+import os, sys, time, resource, threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Opt-in stack sampling for every run (a run can also ask for it with profile=true).
+PROFILE_SAMPLER = os.getenv("NG1_PROFILE_SAMPLER", "0") == "1"
+SAMPLE_INTERVAL_S = float(os.getenv("NG1_PROFILE_INTERVAL_S", "0.005"))
+
+# Peak RSS per block, not per process lifetime: on Linux the kernel's
+# high-water mark (VmHWM) is reset when a Measure starts (clear_refs "5",
+# which costs no page walk). Enclosing Measures are first credited with the
+# peak so far, so nesting stays correct. Elsewhere, or if the reset is not
+# permitted, the value is the process high-water mark (ru_maxrss).
+_active: List["Measure"] = []
+_active_lock = threading.Lock()
+
+def _proc_status_kb(field: str) -> Optional[int]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def _reset_peak():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def peak_rss_mb() -> float:
+    """High-water resident set size since the last reset (see above)."""
+    kb = _proc_status_kb("VmHWM:")
+    if kb is not None:
+        return kb / 1024
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def current_rss_mb() -> float:
+    kb = _proc_status_kb("VmRSS:")
+    return kb / 1024 if kb is not None else peak_rss_mb()
+
+def _credit_active(hwm: float):
+    for m in _active:
+        m.peak_rss_mb = max(m.peak_rss_mb, hwm)
+
+class Measure:
+    """Wall time, CPU time (this process, all threads) and peak RSS within a block."""
+    def __enter__(self):
+        with _active_lock:
+            _credit_active(peak_rss_mb())
+            _reset_peak()
+            self.peak_rss_mb = current_rss_mb()
+            _active.append(self)
+        self._wall, self._cpu = time.perf_counter(), time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_s = time.perf_counter() - self._wall
+        self.cpu_s = time.process_time() - self._cpu
+        with _active_lock:
+            _credit_active(peak_rss_mb())
+            _active.remove(self)
+        return False
+
+    def as_dict(self) -> Dict[str, float]:
+        return {"wall_s": round(self.wall_s, 4), "cpu_s": round(self.cpu_s, 4),
+                "peak_rss_mb": round(self.peak_rss_mb, 1)}
+
+def merge(a: Optional[Dict[str, Dict[str, float]]], b: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    """Combine two {stage: measure} dicts: times add up, peak RSS is the max."""
+    out = {k: dict(v) for k, v in (a or {}).items()}
+    for stage, m in b.items():
+        cur = out.setdefault(stage, {"wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": 0.0})
+        cur["wall_s"] = round(cur["wall_s"] + m["wall_s"], 4)
+        cur["cpu_s"] = round(cur["cpu_s"] + m["cpu_s"], 4)
+        cur["peak_rss_mb"] = max(cur["peak_rss_mb"], m["peak_rss_mb"])
+    return out
+
+class RunProfile:
+    """Per-stage totals (count, wall, CPU, peak RSS) for one run; saved as profile.json."""
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self._wall, self._cpu = time.perf_counter(), time.process_time()
+
+    def add(self, stage: str, m: Dict[str, float]):
+        s = self.stages.setdefault(stage, {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": 0.0})
+        s["count"] += 1
+        s["wall_s"] = round(s["wall_s"] + m["wall_s"], 4)
+        s["cpu_s"] = round(s["cpu_s"] + m["cpu_s"], 4)
+        s["peak_rss_mb"] = max(s["peak_rss_mb"], m["peak_rss_mb"])
+
+    @contextmanager
+    def stage(self, stage: str):
+        with Measure() as m:
+            yield m
+        self.add(stage, m.as_dict())
+
+    def peak_rss_mb(self) -> float:
+        """Peak RSS of this run: the largest stage peak."""
+        return max((s["peak_rss_mb"] for s in self.stages.values()), default=current_rss_mb())
+
+    def summary(self) -> Dict[str, Any]:
+        return {"wall_s": round(time.perf_counter() - self._wall, 4),
+                "cpu_s": round(time.process_time() - self._cpu, 4),
+                "peak_rss_mb": round(self.peak_rss_mb(), 1),
+                "stages": self.stages}
+
+class StackSampler:
+    """
+    Statistical profiler: a daemon thread snapshots one thread's stack every
+    `interval` seconds and counts collapsed stacks ("a.py:f;b.py:g N" lines,
+    readable by flamegraph.pl and speedscope). Only this process is sampled;
+    candidates fitted by loky workers show up as time waiting in joblib.
+    """
+    def __init__(self, interval: float = SAMPLE_INTERVAL_S, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._t = threading.Thread(target=self._run, daemon=True, name="ng1-sampler")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._t.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._t.is_alive():
+            self._t.join()
+
+    def save(self, path: Path):
+        path.write_text("".join(f"{stack} {n}\n" for stack, n in self.samples.most_common()))
@@ -0,0 +1,119 @@
+from __future__ import annotations
+import os, asyncio
+from typing import Any, Dict, Optional, Set
+from .storage import events_file, read_events, read_status, add_event_listener, TERMINAL_STATUSES
+from .executor import run_io
+
+# Fan-out of run events to streaming clients. Each watched run has exactly one
+# feed task that tails its event log from the last offset it read and pushes
+# new events to every subscriber, so N watchers cost one reader. Appends made
+# in this process wake the feed immediately (storage listener); appends from
+# worker processes are picked up on the next POLL_S tick.
+POLL_S = float(os.getenv("NG1_EVENTS_POLL_S", "0.25"))
+SUBSCRIBER_BUFFER = int(os.getenv("NG1_EVENTS_BUFFER", "1000"))
+
+class Subscription:
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_BUFFER)
+        # Set when the client fell too far behind; it should reconnect with Last-Event-ID.
+        self.overflowed = False
+
+    def push(self, item: Any) -> bool:
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            return False
+
+class _RunFeed:
+    def __init__(self, hub: "RunEventHub", run_id: str, offset: int):
+        self.hub, self.run_id, self.offset = hub, run_id, offset
+        self.subscribers: Set[Subscription] = set()
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def broadcast(self, item: Any):
+        for sub in list(self.subscribers):
+            if not sub.push(item):
+                self.subscribers.discard(sub)
+
+    async def pump(self):
+        try:
+            while self.subscribers:
+                events, self.offset = await run_io(read_events, self.run_id, self.offset)
+                for ev in events:
+                    self.broadcast(ev)
+                if not events:
+                    status = await run_io(read_status, self.run_id)
+                    if status in TERMINAL_STATUSES:
+                        # Status is published after its events are written: drain once more.
+                        events, self.offset = await run_io(read_events, self.run_id, self.offset)
+                        for ev in events:
+                            self.broadcast(ev)
+                        self.broadcast({"status": status})
+                        break
+                    try:
+                        await asyncio.wait_for(self.wake.wait(), POLL_S)
+                    except asyncio.TimeoutError:
+                        pass
+                    self.wake.clear()
+        finally:
+            self.hub._drop(self)
+
+class RunEventHub:
+    def __init__(self):
+        self._feeds: Dict[str, _RunFeed] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        add_event_listener(self._on_local_event)
+
+    def _on_local_event(self, run_id: str):
+        # Called from whichever thread appended; hop onto the loop.
+        loop = self._loop
+        if loop is not None and run_id in self._feeds:
+            loop.call_soon_threadsafe(self._wake, run_id)
+
+    def _wake(self, run_id: str):
+        feed = self._feeds.get(run_id)
+        if feed is not None:
+            feed.wake.set()
+
+    def _drop(self, feed: _RunFeed):
+        if self._feeds.get(feed.run_id) is feed:
+            del self._feeds[feed.run_id]
+        for sub in feed.subscribers:
+            sub.push(None)  # end of stream
+        feed.subscribers.clear()
+
+    async def subscribe(self, run_id: str) -> Subscription:
+        """
+        Live events appended after this call. Callers read the backlog
+        themselves afterwards and de-duplicate by seq.
+        """
+        self._loop = asyncio.get_running_loop()
+        sub = Subscription()
+        feed = self._feeds.get(run_id)
+        if feed is None:
+            offset = await run_io(_log_size, run_id)
+            feed = self._feeds.get(run_id)
+            if feed is None:
+                feed = self._feeds[run_id] = _RunFeed(self, run_id, offset)
+        feed.subscribers.add(sub)
+        if feed.task is None:
+            feed.task = asyncio.ensure_future(feed.pump())
+        return sub
+
+    def unsubscribe(self, run_id: str, sub: Subscription):
+        feed = self._feeds.get(run_id)
+        if feed is not None:
+            feed.subscribers.discard(sub)
+            feed.wake.set()  # let the feed notice it has no watchers left
+
+    def watchers(self) -> int:
+        return sum(len(f.subscribers) for f in self._feeds.values())
+
+def _log_size(run_id: str) -> int:
+    f = events_file(run_id)
+    return f.stat().st_size if f.exists() else 0
+
+hub = RunEventHub()
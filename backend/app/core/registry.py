@@ -1,42 +1,236 @@
-import json, os, glob
-from typing import Any, Dict
+from __future__ import annotations
+import os, json, time, shutil, sqlite3
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
 from joblib import load, dump
-from datetime import datetime
+from .storage import ROOT, MODELS_DIR, model_dir_for, save_champion as _publish_pointer
 
-MODELS_DIR = "models"
+# Model registry: every trained model gets a version row in one SQLite index,
+# and the champion is the top of a promotion stack (each promotion points at
+# the one it replaced, so rollback is an undo). champion.json stays the
+# published pointer: it is rewritten inside the same write transaction, and
+# the serving cache keeps watching it with a single stat().
+DB_PATH = ROOT / "registry.db"
+# Versions kept by gc() besides the champion and its rollback chain (0 = never collect).
+KEEP_VERSIONS = int(os.getenv("NG1_REGISTRY_KEEP", "0"))
 
-def _latest_manifest():
-    manifests = glob.glob(os.path.join(MODELS_DIR, "run_*", "model.manifest.json"))
-    if not manifests:
-        return None
-    manifests.sort(key=lambda p: os.path.getmtime(p), reverse=True)
-    return manifests[0]
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    family TEXT,
+    auc REAL,
+    status TEXT NOT NULL DEFAULT 'ready',
+    manifest TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS models_run ON models (run_id);
+CREATE INDEX IF NOT EXISTS models_source ON models (source, status, version);
+CREATE INDEX IF NOT EXISTS models_auc ON models (status, auc);
+CREATE TABLE IF NOT EXISTS champion (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    version INTEGER NOT NULL,
+    prev INTEGER,
+    reason TEXT,
+    promoted REAL NOT NULL
+);
+"""
+_ready = False
+
+@contextmanager
+def _db():
+    global _ready
+    con = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    try:
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.row_factory = sqlite3.Row
+        if not _ready:
+            con.executescript(_SCHEMA)
+            _ready = True
+        yield con
+    finally:
+        con.close()
+
+def _summary(row: sqlite3.Row) -> Dict[str, Any]:
+    m = json.loads(row["manifest"])
+    return {"version": row["version"], "run_id": row["run_id"], "source": row["source"],
+            "family": row["family"], "status": row["status"], "auc": row["auc"],
+            "metrics": m.get("metrics"), "created": row["created"]}
+
+def _register(con, manifest: Dict[str, Any]) -> int:
+    cur = con.execute("INSERT INTO models (run_id, source, family, auc, manifest, created) VALUES (?, ?, ?, ?, '', ?)",
+                      (manifest["run_id"], manifest.get("source", "genetic"), manifest.get("model", {}).get("family"),
+                       manifest.get("metrics", {}).get("auc"), time.time()))
+    manifest["version"] = cur.lastrowid
+    con.execute("UPDATE models SET manifest = ? WHERE version = ?", (json.dumps(manifest), cur.lastrowid))
+    return cur.lastrowid
+
+def register(manifest: Dict[str, Any]) -> int:
+    """Record a model version (sets manifest["version"]) without promoting it."""
+    with _db() as con:
+        return _register(con, manifest)
+
+def _promote(con, version: int, reason: str, prev: Optional[int] = -1) -> Dict[str, Any]:
+    """
+    KeyError if the version is unknown or collected; ValueError if /predict
+    cannot serve it (agent-pipeline versions have no single-matrix pipeline).
+    """
+    row = con.execute("SELECT manifest, status, source FROM models WHERE version = ?", (version,)).fetchone()
+    if row is None or row["status"] != "ready":
+        raise KeyError(version)
+    manifest = json.loads(row["manifest"])
+    if row["source"] != "genetic" or "features" not in manifest:
+        raise ValueError(f"model version {version} cannot be served by /predict")
+    if prev == -1:
+        top = con.execute("SELECT id FROM champion ORDER BY id DESC LIMIT 1").fetchone()
+        prev = top["id"] if top else None
+    con.execute("INSERT INTO champion (version, prev, reason, promoted) VALUES (?, ?, ?, ?)",
+                (version, prev, reason, time.time()))
+    _publish_pointer(manifest)
+    return manifest
+
+def publish(manifest: Dict[str, Any], reason: str = "trained") -> Dict[str, Any]:
+    """
+    Make manifest the champion: promote its version if it is registered
+    (e.g. a cached result), otherwise register it first.
+    """
+    with _db() as con:
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            known = manifest.get("version") is not None and con.execute(
+                "SELECT 1 FROM models WHERE version = ? AND status = 'ready'", (manifest["version"],)).fetchone()
+            version = manifest["version"] if known else _register(con, manifest)
+            out = _promote(con, version, reason)
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+    if KEEP_VERSIONS > 0:
+        gc(KEEP_VERSIONS)
+    return out
+
+def promote(version: int, reason: str = "manual") -> Dict[str, Any]:
+    """KeyError if the version is unknown or its artifacts were collected, ValueError if not servable."""
+    with _db() as con:
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            out = _promote(con, version, reason)
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+    return out
+
+def rollback() -> Optional[Dict[str, Any]]:
+    """
+    Return to the champion before the current promotion; None if there is
+    none. Raises like promote() if that version can no longer be served.
+    """
+    with _db() as con:
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            out = None
+            top = con.execute("SELECT prev FROM champion ORDER BY id DESC LIMIT 1").fetchone()
+            if top is not None and top["prev"] is not None:
+                target = con.execute("SELECT version, prev FROM champion WHERE id = ?", (top["prev"],)).fetchone()
+                out = _promote(con, target["version"], "rollback", prev=target["prev"])
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+    return out
+
+def champion_version() -> Optional[int]:
+    with _db() as con:
+        row = con.execute("SELECT version FROM champion ORDER BY id DESC LIMIT 1").fetchone()
+    return row["version"] if row else None
+
+def get(version: int) -> Optional[Dict[str, Any]]:
+    with _db() as con:
+        row = con.execute("SELECT manifest FROM models WHERE version = ?", (version,)).fetchone()
+    return json.loads(row["manifest"]) if row else None
+
+def version_for_run(run_id: str) -> Optional[int]:
+    """Newest servable version trained by run_id."""
+    with _db() as con:
+        row = con.execute("SELECT version FROM models WHERE run_id = ? AND status = 'ready' "
+                          "ORDER BY version DESC LIMIT 1", (run_id,)).fetchone()
+    return row["version"] if row else None
+
+def list_versions(before: Optional[int] = None, limit: int = 50) -> Dict[str, Any]:
+    """Newest first; pass the returned next_before to get the following page."""
+    with _db() as con:
+        rows = con.execute("SELECT * FROM models WHERE version < ? ORDER BY version DESC LIMIT ?",
+                           (before if before is not None else 1 << 62, limit)).fetchall()
+        top = con.execute("SELECT version FROM champion ORDER BY id DESC LIMIT 1").fetchone()
+    items = [_summary(r) for r in rows]
+    return {"items": items, "champion": top["version"] if top else None,
+            "next_before": items[-1]["version"] if len(items) == limit else None}
+
+def gc(keep: int, keep_best: Optional[int] = None) -> List[int]:
+    """
+    Delete the artifacts of all but the newest `keep` versions and the
+    `keep_best` (default `keep`) with the highest validation AUC. The champion
+    and the next `keep` versions on its rollback chain are kept too. Rows stay
+    (status 'deleted') so listings and history remain complete.
+    """
+    keep_best = keep if keep_best is None else keep_best
+    with _db() as con:
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            protected = set()
+            row = con.execute("SELECT prev, version FROM champion ORDER BY id DESC LIMIT 1").fetchone()
+            while row is not None and len(protected) <= keep:
+                protected.add(row["version"])
+                row = con.execute("SELECT prev, version FROM champion WHERE id = ?", (row["prev"],)).fetchone()
+            best = con.execute("SELECT version FROM models WHERE status = 'ready' AND auc IS NOT NULL "
+                               "ORDER BY auc DESC, version DESC LIMIT ?", (keep_best,)).fetchall()
+            protected.update(r["version"] for r in best)
+            rows = con.execute("SELECT version, run_id FROM models WHERE status = 'ready' "
+                               "ORDER BY version DESC").fetchall()
+            doomed = [r for r in rows[keep:] if r["version"] not in protected]
+            kept_dirs = {r["run_id"] for r in rows} - {r["run_id"] for r in doomed}
+            for r in doomed:
+                con.execute("UPDATE models SET status = 'deleted' WHERE version = ?", (r["version"],))
+                if r["run_id"] not in kept_dirs:
+                    shutil.rmtree(MODELS_DIR / f"run_{r['run_id']}", ignore_errors=True)
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+    return [r["version"] for r in doomed]
+
+# Agent pipeline (core.orchestrator): preprocessor and estimator saved
+# separately. These versions are registered but not promoted, since /predict
+# serves full single-matrix pipelines; load_latest() finds the newest one
+# through the index instead of scanning the models directory.
+_latest_cache: Dict[str, Any] = {}
 
 def save_champion(run_id: str, pipeline, model, metrics: Dict[str, float]):
-    run_dir = os.path.join(MODELS_DIR, f"run_{run_id}")
-    os.makedirs(run_dir, exist_ok=True)
-    dump(pipeline, os.path.join(run_dir, "pipeline.pkl"))
-    dump(model,    os.path.join(run_dir, "model.pkl"))
+    run_dir = model_dir_for(run_id)
+    dump(pipeline, run_dir / "pipeline.pkl")
+    dump(model, run_dir / "model.pkl")
     manifest = {
         "run_id": run_id,
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
         "metrics": metrics,
-        "artifacts": {
-            "pipeline": "pipeline.pkl",
-            "model": "model.pkl"
-        }
+        "source": "agents",
+        "artifacts": {"pipeline": str(run_dir / "pipeline.pkl"), "model": str(run_dir / "model.pkl")},
     }
-    with open(os.path.join(run_dir, "model.manifest.json"), "w") as f:
-        json.dump(manifest, f, indent=2)
+    register(manifest)
+    (run_dir / "model.manifest.json").write_text(json.dumps(manifest, indent=2))
     return manifest
 
 def load_latest():
-    mpath = _latest_manifest()
-    if not mpath:
+    with _db() as con:
+        row = con.execute("SELECT version, manifest FROM models WHERE source = 'agents' AND status = 'ready' "
+                          "ORDER BY version DESC LIMIT 1").fetchone()
+    if row is None:
         return None
-    run_dir = os.path.dirname(mpath)
-    with open(mpath) as f:
-        manifest = json.load(f)
-    pipeline = load(os.path.join(run_dir, "pipeline.pkl"))
-    model    = load(os.path.join(run_dir, "model.pkl"))
-    return {"manifest": manifest, "pipeline": pipeline, "model": model}
\ No newline at end of file
+    if _latest_cache.get("version") != row["version"]:
+        manifest = json.loads(row["manifest"])
+        _latest_cache.update(version=row["version"], manifest=manifest,
+                             pipeline=load(manifest["artifacts"]["pipeline"]), model=load(manifest["artifacts"]["model"]))
+    return {k: _latest_cache[k] for k in ("manifest", "pipeline", "model")}
@@ -0,0 +1,80 @@
+from __future__ import annotations
+import os, json, uuid, hashlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional
+import sklearn
+from .storage import ROOT, load_dataset_meta, append_event, set_status
+from . import registry
+
+# Finished-run results keyed by (dataset fingerprint, target, search config,
+# code version). A run whose key is already here is answered from the stored
+# manifest instead of being trained again.
+RESULTS_DIR = ROOT / "results"
+RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+# RunRequest fields that change what gets trained; the rest (priority, profile, ...) do not.
+SEARCH_FIELDS = ("target", "n_trials", "search_mode", "cv_folds", "memory_mb")
+_CODE_FILES = ("training.py", "genetic.py", "streaming.py")
+
+@lru_cache(maxsize=1)
+def code_version() -> str:
+    """NG1_CODE_VERSION, else a hash of the training code and the sklearn version."""
+    pinned = os.getenv("NG1_CODE_VERSION")
+    if pinned:
+        return pinned
+    h = hashlib.blake2b(sklearn.__version__.encode(), digest_size=8)
+    here = Path(__file__).resolve().parent
+    for name in _CODE_FILES:
+        h.update((here / name).read_bytes())
+    return h.hexdigest()
+
+def result_key(request: Dict[str, Any]) -> Optional[str]:
+    """None when the dataset has no upload fingerprint (uploaded before it was recorded)."""
+    try:
+        fingerprint = load_dataset_meta(request["dataset_id"])["content_hash"]
+    except (FileNotFoundError, KeyError):
+        return None
+    config = {k: request.get(k) for k in SEARCH_FIELDS}
+    if config.get("search_mode") != "cv":
+        config.pop("cv_folds", None)
+    if config.get("search_mode") != "streaming":
+        config.pop("memory_mb", None)
+    raw = json.dumps([fingerprint, config, code_version()], sort_keys=True)
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+def lookup(key: str) -> Optional[Dict[str, Any]]:
+    """Stored manifest for key, if its artifacts are still on disk."""
+    p = RESULTS_DIR / f"{key}.json"
+    if not p.exists():
+        return None
+    manifest = json.loads(p.read_text())
+    if not all(Path(a).exists() for a in manifest.get("artifacts", {}).values()):
+        p.unlink(missing_ok=True)
+        return None
+    return manifest
+
+def reuse(run_id: str, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Finish run_id from a stored result if an identical run already finished:
+    mark the run done with that model. The champion is left alone (the model
+    was considered for it when first trained, and it may since have been
+    rolled back or replaced on purpose). Returns the manifest, or None when
+    the run has to be trained (or force=True).
+    """
+    if request.get("force"):
+        return None
+    key = result_key(request)
+    manifest = lookup(key) if key is not None else None
+    if manifest is None:
+        return None
+    version = manifest.get("version") or registry.version_for_run(manifest["run_id"])
+    append_event(run_id, "cache_hit", {"result_key": key, "source_run": manifest["run_id"], "version": version,
+                                       "champion": version is not None and version == registry.champion_version()})
+    set_status(run_id, "done")
+    return manifest
+
+def store(key: str, manifest: Dict[str, Any]):
+    dst = RESULTS_DIR / f"{key}.json"
+    tmp = dst.with_suffix(f".{uuid.uuid4().hex}.tmp")
+    tmp.write_text(json.dumps(manifest))
+    os.replace(tmp, dst)
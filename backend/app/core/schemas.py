@@ -1,11 +1,31 @@
 from pydantic import BaseModel, Field, RootModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
 
 # This class is correct. No changes needed.
 class RunRequest(BaseModel):
     dataset_id: str
     target: str
     n_trials: int = Field(default=12, ge=1, le=200)
+    # "halving": successive halving over data rows / trees before full fits
+    # "cv": rank candidates by k-fold CV on the training part (cv_folds folds)
+    # "streaming": out-of-core training in chunks within memory_mb (see core.streaming)
+    search_mode: Literal["full", "halving", "cv", "streaming"] = "full"
+    cv_folds: int = Field(default=5, ge=2, le=10)
+    memory_mb: Optional[int] = Field(default=None, ge=64)
+    # Higher runs first when the training queue is backed up
+    priority: int = Field(default=0, ge=-100, le=100)
+    # Attach the stack sampler and save profile.stacks.txt with the model
+    profile: bool = False
+    # Train even if an identical run (same data, target, search config, code) finished before
+    force: bool = False
+
+class ExperimentRequest(BaseModel):
+    # Registered model version tested against the champion
+    challenger: int
+    # "split": the challenger answers `fraction` of /predict requests
+    # "shadow": the challenger is also scored on every request, off the response path
+    mode: Literal["split", "shadow"] = "shadow"
+    fraction: float = Field(default=0.1, ge=0.0, le=1.0)
 
 # This class is correct. No changes needed.
 class RunStatus(BaseModel):
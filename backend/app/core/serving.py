@@ -0,0 +1,297 @@
+from __future__ import annotations
+import os, io, json, threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+import orjson
+from joblib import load
+from .storage import champion_file
+from .compiled import CompiledModel
+from . import registry
+from .telemetry import CHAMPION_CACHE_HITS, CHAMPION_CACHE_RELOADS
+
+# Serve the compiled champion (core.compiled) when training exported one.
+SERVE_COMPILED = os.getenv("NG1_SERVE_COMPILED", "1") == "1"
+# Compiled arrays are memory-mapped, so API workers and inference processes
+# share the page cache instead of each holding a copy of the model.
+MMAP_ARTIFACTS = os.getenv("NG1_MMAP_ARTIFACTS", "1") == "1"
+
+def serving_artifact(manifest: Dict[str, Any]) -> str:
+    arts = manifest["artifacts"]
+    return arts["compiled"] if SERVE_COMPILED and "compiled" in arts else arts["pipeline"]
+
+def load_artifact(path: str) -> Any:
+    """A compiled model (array directory or .npz) or a joblib sklearn pipeline."""
+    if path.endswith(".npz") or os.path.isdir(path):
+        return CompiledModel.load(path, mmap=MMAP_ARTIFACTS)
+    return load(path)
+
+@dataclass(frozen=True)
+class LoadedChampion:
+    key: Tuple[str, int]          # (run_id, served artifact mtime_ns)
+    manifest: Dict[str, Any]
+    pipeline: Any                 # CompiledModel or sklearn Pipeline
+    # Lazily loaded sklearn pipeline for big batches on compiled trees; it
+    # lives and dies with this object, so pool eviction frees it too.
+    _fallback: Dict[str, Any] = field(default_factory=dict, compare=False, repr=False)
+
+    def artifact_for(self, n_rows: int) -> str:
+        """Artifact to score n_rows with: big batches on compiled trees use the pipeline."""
+        if isinstance(self.pipeline, CompiledModel) and not self.pipeline.prefer_compiled(n_rows):
+            return self.manifest["artifacts"]["pipeline"]
+        return serving_artifact(self.manifest)
+
+    def handles_missing(self) -> bool:
+        """Whether NaN (null) inputs are imputed by the model, as streaming-trained ones do."""
+        if isinstance(self.pipeline, CompiledModel):
+            return "fill" in self.pipeline.arrays
+        return "impute" in getattr(self.pipeline, "named_steps", {})
+
+    def check_input(self, X: np.ndarray):
+        if not self.handles_missing() and np.isnan(X).any():
+            raise ValueError("null feature values are not supported by this model")
+
+    def may_fall_back(self) -> bool:
+        return isinstance(self.pipeline, CompiledModel) and self.pipeline.kind != "logreg"
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        path = self.artifact_for(X.shape[0])
+        if path == serving_artifact(self.manifest):
+            return predict_positive(self.pipeline, X)
+        pipe = self._fallback.get(path)
+        if pipe is None:
+            pipe = self._fallback[path] = load_artifact(path)
+        return predict_positive(pipe, X)
+
+_cache_hits = CHAMPION_CACHE_HITS.labels()
+
+class ChampionCache:
+    """
+    Keeps the champion pipeline deserialized in memory.
+
+    Each get() costs one stat() of champion.json. When save_champion publishes
+    a new file (atomic rename), the next get() re-reads the manifest and, if the
+    (run_id, artifact mtime) key changed, loads the new pipeline and swaps the
+    reference. Callers holding the previous LoadedChampion keep using it.
+    """
+    def __init__(self, path=None):
+        self._path = path
+        self._sig: Optional[Tuple[int, int, int]] = None
+        self._current: Optional[LoadedChampion] = None
+        self._lock = threading.Lock()
+
+    def _file(self):
+        return self._path if self._path is not None else champion_file()
+
+    def get(self) -> LoadedChampion:
+        # FileNotFoundError propagates: no champion yet.
+        st = os.stat(self._file())
+        sig = (st.st_mtime_ns, st.st_size, st.st_ino)
+        cur = self._current
+        if cur is not None and sig == self._sig:
+            _cache_hits.inc()
+            return cur
+        with self._lock:
+            if self._current is not None and sig == self._sig:
+                _cache_hits.inc()
+                return self._current
+            manifest = json.loads(self._file().read_text())
+            pipe_path = serving_artifact(manifest)
+            key = (manifest["run_id"], os.stat(pipe_path).st_mtime_ns)
+            prev = self._current
+            if prev is not None and prev.key == key:
+                loaded = LoadedChampion(key, manifest, prev.pipeline, prev._fallback)
+            else:
+                loaded = LoadedChampion(key, manifest, load_artifact(pipe_path))
+                CHAMPION_CACHE_RELOADS.inc()
+            self._current, self._sig = loaded, sig
+            return loaded
+
+    def invalidate(self):
+        with self._lock:
+            self._current, self._sig = None, None
+
+champion_cache = ChampionCache()
+
+# Non-champion versions (pinned /predict?version=..., A/B challengers).
+POOL_MAX_MODELS = int(os.getenv("NG1_MODEL_POOL_SIZE", "4"))
+POOL_MAX_MB = float(os.getenv("NG1_MODEL_POOL_MB", "512"))
+
+def _artifact_bytes(path: str) -> int:
+    p = Path(path)
+    return sum(f.stat().st_size for f in p.iterdir()) if p.is_dir() else p.stat().st_size
+
+class ModelPool:
+    """
+    LRU of loaded model versions, bounded by count and by artifact size on
+    disk (a proxy for memory: joblib pipelines unpickle to about their file
+    size, compiled arrays are mapped 1:1). The least recently used versions
+    are evicted first; the one just loaded always stays.
+    """
+    def __init__(self, max_models: int = POOL_MAX_MODELS, max_mb: float = POOL_MAX_MB):
+        self.max_models, self.max_bytes = max_models, int(max_mb * 1024 * 1024)
+        self._models: "OrderedDict[int, Tuple[LoadedChampion, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading: Dict[int, threading.Lock] = {}
+
+    def peek(self, version: int) -> Optional[LoadedChampion]:
+        """The loaded version if resident, without loading it (event-loop safe)."""
+        hit = self._models.get(version)
+        return hit[0] if hit is not None else None
+
+    def get(self, version: int) -> LoadedChampion:
+        """KeyError if the version is unknown, deleted or not servable by /predict."""
+        with self._lock:
+            hit = self._models.get(version)
+            if hit is not None:
+                self._models.move_to_end(version)
+                return hit[0]
+            loading = self._loading.setdefault(version, threading.Lock())
+        with loading:   # one load per version, concurrent callers wait for it
+            with self._lock:
+                hit = self._models.get(version)
+                if hit is not None:
+                    self._models.move_to_end(version)
+                    return hit[0]
+            try:
+                manifest = registry.get(version)
+                if manifest is None or "features" not in manifest:
+                    raise KeyError(version)
+                path = serving_artifact(manifest)
+                try:
+                    loaded = LoadedChampion((manifest["run_id"], os.stat(path).st_mtime_ns), manifest,
+                                            load_artifact(path))
+                except FileNotFoundError:   # artifacts garbage-collected
+                    raise KeyError(version)
+                size = _artifact_bytes(path)
+                if loaded.may_fall_back():   # big batches load the pipeline as well
+                    size += _artifact_bytes(manifest["artifacts"]["pipeline"])
+                # Inserted under the per-version lock, so waiters find it resident.
+                with self._lock:
+                    old = self._models.pop(version, None)
+                    if old is not None:
+                        self._bytes -= old[1]
+                    self._models[version] = (loaded, size)
+                    self._bytes += size
+                    while len(self._models) > 1 and (len(self._models) > self.max_models or self._bytes > self.max_bytes):
+                        _, (_, freed) = self._models.popitem(last=False)
+                        self._bytes -= freed
+            finally:
+                with self._lock:
+                    if self._loading.get(version) is loading:
+                        del self._loading[version]
+        return loaded
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"versions": list(self._models), "mb": round(self._bytes / 1024 / 1024, 2),
+                "max_models": self.max_models, "max_mb": self.max_bytes / 1024 / 1024}
+
+model_pool = ModelPool()
+
+def load_version(version: int) -> LoadedChampion:
+    """The champion from its cache if version is the champion, else from the pool."""
+    try:
+        champ = champion_cache.get()
+        if champ.manifest.get("version") == version:
+            return champ
+    except FileNotFoundError:
+        pass
+    return model_pool.get(version)
+
+def predict_positive(pipe, X: np.ndarray) -> np.ndarray:
+    """P(y=1) for a fitted pipeline; falls back to a logistic on decision_function."""
+    if isinstance(pipe, CompiledModel):
+        return pipe.predict_positive(X)
+    if getattr(pipe.named_steps["clf"], "predict_proba", None) is not None:
+        return pipe.predict_proba(X)[:, 1]
+    raw = pipe.decision_function(X)
+    return 1 / (1 + np.exp(-raw))
+
+NPY_MEDIA = "application/x-npy"
+RAW_MEDIA = "application/octet-stream"
+
+def rows_to_matrices(rows: List[Dict[str, Any]], feature_lists: List[List[str]]) -> List[np.ndarray]:
+    """
+    Feature matrices for several models from one pass over the row payload:
+    the union of their features is read once, then each model takes its
+    columns. Missing features are 0.0, as for a single model.
+    """
+    union = list(dict.fromkeys(f for feats in feature_lists for f in feats))
+    try:
+        X = np.array([[row.get(f, 0.0) for f in union] for row in rows], dtype=np.float64).reshape(len(rows), len(union))
+    except (TypeError, ValueError):
+        raise ValueError("feature values must be numbers")
+    if len(feature_lists) == 1 and feature_lists[0] == union:
+        return [X]
+    pos = {f: j for j, f in enumerate(union)}
+    return [X[:, [pos[f] for f in feats]] for feats in feature_lists]
+
+def columns_to_matrix(columns: Dict[str, Any], feats: List[str]) -> np.ndarray:
+    """
+    Build the (rows, features) float64 matrix from a columnar payload in the
+    manifest's feature order. One numpy conversion per column; missing
+    features are filled with 0.0 like the row-wise /predict.
+    """
+    present = [f for f in feats if f in columns]
+    if not present:
+        raise ValueError("payload contains none of the model features")
+    for f in present:
+        if not isinstance(columns[f], list):
+            raise ValueError(f"column '{f}' must be an array of numbers")
+    n = len(columns[present[0]])
+    X = np.zeros((n, len(feats)), dtype=np.float64)
+    for j, f in enumerate(feats):
+        col = columns.get(f)
+        if col is None:
+            continue
+        if len(col) != n:
+            raise ValueError(f"column '{f}' has {len(col)} values, expected {n}")
+        try:
+            X[:, j] = np.asarray(col, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError(f"column '{f}' must be an array of numbers")
+    return X
+
+def decode_matrix(body: bytes, media_type: str, n_features: int) -> np.ndarray:
+    """Binary payloads: .npy (any float dtype) or raw little-endian float64, row-major."""
+    if media_type == NPY_MEDIA:
+        X = np.load(io.BytesIO(body), allow_pickle=False)
+    else:
+        if len(body) % (8 * n_features):
+            raise ValueError(f"raw payload is not a whole number of {n_features}-feature float64 rows")
+        X = np.frombuffer(body, dtype="<f8").reshape(-1, n_features)
+    if X.ndim != 2 or X.shape[1] != n_features:
+        raise ValueError(f"expected shape (rows, {n_features}), got {X.shape}")
+    return X.astype(np.float64, copy=False)
+
+def encode_preds(preds: np.ndarray, accept: str) -> Tuple[bytes, str]:
+    """Serialize predictions without a Python-list round trip."""
+    preds = np.ascontiguousarray(preds, dtype=np.float64)
+    if NPY_MEDIA in accept:
+        buf = io.BytesIO()
+        np.save(buf, preds, allow_pickle=False)
+        return buf.getvalue(), NPY_MEDIA
+    if RAW_MEDIA in accept:
+        return preds.astype("<f8", copy=False).tobytes(), RAW_MEDIA
+    return orjson.dumps({"preds": preds}, option=orjson.OPT_SERIALIZE_NUMPY), "application/json"
+
+_WORKER_PIPES: "OrderedDict[str, Tuple[int, Any]]" = OrderedDict()
+
+def score_artifact(pipe_path: str, X: np.ndarray) -> np.ndarray:
+    """
+    Process-pool entry point. Each worker process keeps the last
+    POOL_MAX_MODELS pipelines it loaded (keyed by path and mtime), so only
+    the feature matrix crosses the process boundary per call, even when
+    champion and challenger batches alternate.
+    """
+    mtime = os.stat(pipe_path).st_mtime_ns
+    hit = _WORKER_PIPES.get(pipe_path)
+    if hit is None or hit[0] != mtime:
+        hit = _WORKER_PIPES[pipe_path] = (mtime, load_artifact(pipe_path))
+        while len(_WORKER_PIPES) > max(1, POOL_MAX_MODELS):
+            _WORKER_PIPES.popitem(last=False)
+    _WORKER_PIPES.move_to_end(pipe_path)
+    return predict_positive(hit[1], X)
@@ -1,8 +1,12 @@
-import os, json, time, uuid, shutil
+import os, csv, json, time, uuid, shutil, hashlib, fcntl, threading
+from array import array
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple, BinaryIO, Callable, Iterable, Iterator
+import numpy as np
 import pandas as pd
 import io
+from .telemetry import DATASET_PARSE_SECONDS, DATASET_PARSE_BYTES
 
 # Prefer Render-safe temp. Fallback to repo-local.
 ROOT = Path(os.getenv("NG1_RUNTIME_DIR", "/tmp/ng1"))
@@ -16,7 +20,8 @@ if not ROOT.exists():
 DATA_DIR = ROOT / "data"
 MODELS_DIR = ROOT / "models"
 RUNS_DIR = ROOT / "runs"
-for d in (DATA_DIR, MODELS_DIR, RUNS_DIR):
+METRICS_DIR = ROOT / "metrics"   # per-process metric snapshots (see telemetry.flush)
+for d in (DATA_DIR, MODELS_DIR, RUNS_DIR, METRICS_DIR):
     d.mkdir(parents=True, exist_ok=True)
 
 def save_dataset(contents: bytes, dataset_id: str) -> str:
@@ -26,44 +31,412 @@ def save_dataset(contents: bytes, dataset_id: str) -> str:
         f.write(contents)
     return str(dst)
 
+UPLOAD_CHUNK = int(os.getenv("NG1_UPLOAD_CHUNK_BYTES", str(1 << 20)))
+
+def dataset_meta_file(dataset_id: str) -> Path:
+    return DATA_DIR / f"{dataset_id}.meta.json"
+
+def _sniff_schema(head: bytes, nrows: int = 100) -> Dict[str, Any]:
+    # Only complete lines: the chunk boundary may cut a row in half.
+    cut = head.rfind(b"\n")
+    if cut >= 0:
+        head = head[:cut + 1]
+    df = pd.read_csv(io.BytesIO(head), nrows=nrows)
+    cols = list(df.columns)
+    return {"columns": cols, "dtypes": {c: str(df[c].dtype) for c in cols}}
+
+def _text_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """
+    Newline-terminated lines of a byte stream cut at arbitrary chunk boundaries.
+    Decoded as latin-1: every byte maps to one char, so a UTF-8 sequence split
+    between chunks is harmless, and the ASCII quote/comma/newline bytes csv
+    looks at never occur inside a multi-byte UTF-8 character.
+    """
+    tail = ""
+    for chunk in chunks:
+        parts = (tail + chunk.decode("latin-1")).split("\n")
+        tail = parts.pop()
+        for line in parts:
+            yield line + "\n"
+    if tail:
+        yield tail
+
+def save_dataset_stream(src: BinaryIO, dataset_id: str, chunk_size: int = UPLOAD_CHUNK) -> Dict[str, Any]:
+    """
+    Copy an upload stream to DATA_DIR chunk by chunk. Schema is sniffed from the
+    first chunk; the row count (csv records, so quoted newlines do not count),
+    byte size and content hash are accumulated as the chunks go by, so memory
+    stays at one chunk.
+    """
+    dst = DATA_DIR / dataset_id
+    tmp = dst.with_name(f".{dataset_id}.part")
+    digest = hashlib.blake2b(digest_size=16)
+    t0 = time.perf_counter()
+    size = 0
+    schema = None
+
+    def chunks(f) -> Iterator[bytes]:
+        nonlocal size, schema
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                return
+            if schema is None:
+                schema = _sniff_schema(chunk)
+            f.write(chunk)
+            digest.update(chunk)
+            size += len(chunk)
+            yield chunk
+
+    try:
+        with open(tmp, "wb") as f:
+            # Blank lines are skipped, as pandas does.
+            records = sum(1 for rec in csv.reader(_text_lines(chunks(f))) if rec)
+        if schema is None:
+            raise ValueError("Empty upload.")
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    os.replace(tmp, dst)
+    meta = {"dataset_id": dataset_id, **schema, "rows": max(0, records - 1),
+            "bytes": size, "content_hash": digest.hexdigest()}
+    dataset_meta_file(dataset_id).write_text(json.dumps(meta))
+    DATASET_PARSE_SECONDS.labels("upload").observe(time.perf_counter() - t0)
+    DATASET_PARSE_BYTES.labels("upload").inc(size)
+    return meta
+
+def load_dataset_meta(dataset_id: str) -> Dict[str, Any]:
+    p = dataset_meta_file(dataset_id)
+    if not p.exists():
+        raise FileNotFoundError(f"No metadata for dataset: {dataset_id}")
+    return json.loads(p.read_text())
+
 def load_csv(dataset_id: str) -> pd.DataFrame:
     p = DATA_DIR / dataset_id
     if not p.exists():
         raise FileNotFoundError(f"Dataset not found: {p}")
     return pd.read_csv(p, low_memory=False)
 
+# Columnar cache: each numeric column of a dataset is stored once as
+# DATA_DIR/<id>.cols/<i>.npy and memory-mapped on later loads, so retries and
+# repeated runs skip CSV parsing. Keyed to the source file's size + mtime.
+def column_cache_dir(dataset_id: str) -> Path:
+    return DATA_DIR / f"{dataset_id}.cols"
+
+def _column_cache_index(dataset_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        index = json.loads((column_cache_dir(dataset_id) / "index.json").read_text())
+    except FileNotFoundError:
+        return None
+    st = (DATA_DIR / dataset_id).stat()
+    if index.get("source") != [st.st_size, st.st_mtime_ns]:
+        return None
+    return index
+
+def build_column_cache(dataset_id: str) -> Dict[str, Any]:
+    """
+    (Re)build the cache. Builders of one dataset are serialized with an flock,
+    so concurrent first loads parse the CSV once: the later ones find the
+    cache valid and use it.
+    """
+    p = DATA_DIR / dataset_id
+    if not p.exists():
+        raise FileNotFoundError(f"Dataset not found: {p}")
+    fd = os.open(DATA_DIR / f".{dataset_id}.cols.lock", os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        index = _column_cache_index(dataset_id)
+        if index is None:
+            index = _build_column_cache(dataset_id)
+    finally:
+        os.close(fd)  # also releases the flock
+    return index
+
+def _build_column_cache(dataset_id: str) -> Dict[str, Any]:
+    p = DATA_DIR / dataset_id
+    st = p.stat()
+    t0 = time.perf_counter()
+    df = pd.read_csv(p, low_memory=False)
+    DATASET_PARSE_SECONDS.labels("csv").observe(time.perf_counter() - t0)
+    DATASET_PARSE_BYTES.labels("csv").inc(st.st_size)
+    tmp = DATA_DIR / f".{dataset_id}.cols.{uuid.uuid4().hex}"
+    tmp.mkdir()
+    cols = {}
+    for i, c in enumerate(df.columns):
+        if not pd.api.types.is_numeric_dtype(df[c]):
+            continue
+        fname = f"{i}.npy"
+        np.save(tmp / fname, np.ascontiguousarray(df[c].to_numpy()), allow_pickle=False)
+        cols[c] = {"file": fname, "dtype": str(df[c].dtype)}
+    index = {"rows": int(len(df)), "all_columns": list(df.columns), "columns": cols,
+             "source": [st.st_size, st.st_mtime_ns]}
+    (tmp / "index.json").write_text(json.dumps(index))
+    dst = column_cache_dir(dataset_id)
+    current = _column_cache_index(dataset_id)
+    if current is not None:
+        # Published meanwhile by a process that does not share our lock (e.g. another host).
+        shutil.rmtree(tmp, ignore_errors=True)
+        return current
+    # Move the stale cache aside and swap the new one in with two renames;
+    # readers caught in between retry once (see load_columns).
+    old = DATA_DIR / f".{dataset_id}.cols.old.{uuid.uuid4().hex}"
+    try:
+        os.replace(dst, old)
+    except FileNotFoundError:
+        pass
+    try:
+        os.replace(tmp, dst)
+    except OSError:
+        # Another loader published the cache first; theirs is just as good.
+        shutil.rmtree(tmp, ignore_errors=True)
+    shutil.rmtree(old, ignore_errors=True)
+    return index
+
+def column_cache_index(dataset_id: str) -> Dict[str, Any]:
+    return _column_cache_index(dataset_id) or build_column_cache(dataset_id)
+
+def load_columns(dataset_id: str, columns: List[str]) -> pd.DataFrame:
+    """
+    Project `columns` out of the dataset. Cached (numeric) columns come back as
+    read-only memory maps; anything else falls back to a usecols CSV read.
+    """
+    for attempt in (0, 1):
+        index = column_cache_index(dataset_id)
+        if any(c not in index["columns"] for c in columns):
+            return pd.read_csv(DATA_DIR / dataset_id, usecols=columns, low_memory=False)[columns]
+        d = column_cache_dir(dataset_id)
+        try:
+            return pd.DataFrame({c: np.load(d / index["columns"][c]["file"], mmap_mode="r", allow_pickle=False)
+                                 for c in columns}, copy=False)
+        except FileNotFoundError:
+            if attempt:   # the cache was replaced between reading its index and the columns
+                raise
+
+def load_training_frame(dataset_id: str, target: str) -> pd.DataFrame:
+    """Numeric features plus the target, in file order; the only columns training uses."""
+    index = column_cache_index(dataset_id)
+    cols = [c for c in index["all_columns"] if c in index["columns"] or c == target]
+    return load_columns(dataset_id, cols)
+
 def new_run() -> str:
     return uuid.uuid4().hex[:12]
 
 def run_file(run_id: str) -> Path:
+    # Legacy single-file run record ({"status", "events"}), read-only now.
     return RUNS_DIR / f"{run_id}.json"
 
-def append_event(run_id: str, stage: str, data: Dict[str, Any]):
-    f = run_file(run_id)
-    if f.exists():
-        js = json.loads(f.read_text())
-    else:
-        js = {"status": "running", "events": []}
-    js["events"].append({"ts": time.time(), "stage": stage, "data": data})
-    f.write_text(json.dumps(js))
+# Run records: an append-only JSON-lines event log plus a tiny status file.
+# Appends are O(1) regardless of history length; concurrent writers are
+# serialized with flock and each event gets a monotonically increasing seq.
+# The log is fsynced at most every EVENT_FSYNC_S per run, and always before
+# a status change is published.
+EVENT_FSYNC_S = float(os.getenv("NG1_EVENT_FSYNC_S", "1.0"))
+TERMINAL_STATUSES = ("done", "error", "cancelled")
+_log_lock = threading.Lock()
+_log_tail: Dict[str, Tuple[int, int]] = {}   # run_id -> (log size, next seq) as last written here
+_last_fsync: Dict[str, float] = {}
+# In-process subscribers (e.g. the SSE hub) called with the run_id after each
+# append or status change made by this process. Must be cheap and non-blocking.
+_event_listeners: List[Callable[[str], None]] = []
+
+def add_event_listener(fn: Callable[[str], None]):
+    _event_listeners.append(fn)
+
+def _notify(run_id: str):
+    for fn in _event_listeners:
+        try:
+            fn(run_id)
+        except Exception:
+            pass
+
+def events_file(run_id: str) -> Path:
+    return RUNS_DIR / f"{run_id}.events.jsonl"
+
+def status_file(run_id: str) -> Path:
+    return RUNS_DIR / f"{run_id}.status.json"
+
+def _count_lines(p: Path) -> int:
+    n = 0
+    with open(p, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            n += chunk.count(b"\n")
+    return n
+
+def _write_status(run_id: str, status: str):
+    f = status_file(run_id)
+    tmp = f.with_suffix(f".{uuid.uuid4().hex}.tmp")
+    tmp.write_text(json.dumps({"status": status, "updated": time.time()}))
+    os.replace(tmp, f)
+
+def append_event(run_id: str, stage: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    f = events_file(run_id)
+    with _log_lock:
+        fd = os.open(f, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            size = os.fstat(fd).st_size
+            tail = _log_tail.get(run_id)
+            # Another process appended since our last write: recount.
+            seq = tail[1] if tail is not None and tail[0] == size else _count_lines(f)
+            event = {"seq": seq, "ts": time.time(), "stage": stage, "data": data}
+            line = (json.dumps(event) + "\n").encode()
+            os.write(fd, line)
+            _log_tail[run_id] = (size + len(line), seq + 1)
+            now = time.monotonic()
+            if now - _last_fsync.get(run_id, 0.0) >= EVENT_FSYNC_S:
+                os.fsync(fd)
+                _last_fsync[run_id] = now
+        finally:
+            os.close(fd)  # also releases the flock
+    if size == 0 and not status_file(run_id).exists():
+        _write_status(run_id, "running")
+    _notify(run_id)
+    return event
 
 def set_status(run_id: str, status: str):
-    f = run_file(run_id)
-    js = json.loads(f.read_text()) if f.exists() else {"events": []}
-    js["status"] = status
-    f.write_text(json.dumps(js))
+    ev = events_file(run_id)
+    if ev.exists():
+        # Events are durable before the status that summarizes them.
+        fd = os.open(ev, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    _write_status(run_id, status)
+    if status in TERMINAL_STATUSES:
+        with _log_lock:
+            _log_tail.pop(run_id, None)
+            _last_fsync.pop(run_id, None)
+    _notify(run_id)
 
-def get_status(run_id: str) -> Dict[str, Any]:
-    f = run_file(run_id)
+def read_status(run_id: str) -> Optional[str]:
+    f = status_file(run_id)
+    if f.exists():
+        return json.loads(f.read_text())["status"]
+    return "running" if events_file(run_id).exists() else None
+
+def read_events(run_id: str, offset: int = 0, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Events from byte `offset` of the run's log; returns (events, next_offset).
+    Pass next_offset back to resume. A partially written last line is left for
+    the next call.
+    """
+    f = events_file(run_id)
     if not f.exists():
-        return {"status": "unknown", "events": []}
-    return json.loads(f.read_text())
+        return [], offset
+    with open(f, "rb") as fh:
+        fh.seek(offset)
+        buf = fh.read()
+    events, pos = [], 0
+    for line in buf[:buf.rfind(b"\n") + 1].splitlines(keepends=True):
+        if limit is not None and len(events) >= limit:
+            break
+        events.append(json.loads(line))
+        pos += len(line)
+    return events, offset + pos
+
+def get_status(run_id: str) -> Dict[str, Any]:
+    status = read_status(run_id)
+    if status is not None:
+        return {"status": status, "events": read_events(run_id)[0]}
+    legacy = run_file(run_id)
+    if legacy.exists():
+        return json.loads(legacy.read_text())
+    return {"status": "unknown", "events": []}
+
+def _stat_key(p: Path) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = p.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+class RunIndex:
+    """
+    In-memory view of run records for the status endpoints: the current
+    status plus the byte offset of every event (seq -> offset). Entries are
+    validated with a stat of the status file and the log, and only bytes
+    appended since the last look are scanned, so reading the tail of a long
+    run never re-parses its history. Least recently used runs are evicted.
+    """
+    def __init__(self, max_runs: int = int(os.getenv("NG1_RUN_INDEX_SIZE", "1024"))):
+        self.max_runs = max_runs
+        self._runs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def etag(self, run_id: str) -> Optional[str]:
+        """Changes whenever the status or the log does; None for unknown runs."""
+        s, e = _stat_key(status_file(run_id)), _stat_key(events_file(run_id))
+        if s is None and e is None:
+            return None
+        return 'W/"%x-%x-%x"' % ((s or (0, 0, 0))[0], (e or (0, 0, 0))[1], (e or (0, 0, 0))[2])
+
+    def _refresh(self, run_id: str) -> Optional[Dict[str, Any]]:
+        skey, ekey = _stat_key(status_file(run_id)), _stat_key(events_file(run_id))
+        if skey is None and ekey is None:
+            self._runs.pop(run_id, None)
+            return None
+        ent = self._runs.get(run_id)
+        if ent is None or (ekey is not None and (ekey[2] != ent["ino"] or ekey[1] < ent["size"])):
+            ent = {"skey": None, "status": None, "ino": ekey[2] if ekey else None, "size": 0, "offsets": array("q")}
+            self._runs[run_id] = ent
+        self._runs.move_to_end(run_id)
+        while len(self._runs) > self.max_runs:
+            self._runs.popitem(last=False)
+        if skey != ent["skey"]:
+            ent["skey"] = skey
+            ent["status"] = json.loads(status_file(run_id).read_text())["status"] if skey else "running"
+        if ekey is not None and ekey[1] > ent["size"]:
+            with open(events_file(run_id), "rb") as fh:
+                fh.seek(ent["size"])
+                buf = fh.read(ekey[1] - ent["size"])
+            pos, end = 0, buf.rfind(b"\n") + 1
+            while pos < end:
+                ent["offsets"].append(ent["size"] + pos)
+                pos = buf.index(b"\n", pos) + 1
+            ent["size"] += end
+        return ent
+
+    def status(self, run_id: str) -> Optional[str]:
+        with self._lock:
+            ent = self._refresh(run_id)
+            return ent["status"] if ent else None
+
+    def events(self, run_id: str, since: int = -1, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        {"status", "events", "last_seq"} with only events whose seq > since
+        (at most `limit`). Pass last_seq back as `since` to page forward.
+        """
+        with self._lock:
+            ent = self._refresh(run_id)
+            if ent is None:
+                return None
+            status, offsets, size = ent["status"], ent["offsets"], ent["size"]
+            first = max(since + 1, 0)
+            stop = len(offsets) if limit is None else min(len(offsets), first + limit)
+            lo = offsets[first] if first < len(offsets) else size
+            hi = offsets[stop] if stop < len(offsets) else size
+        events: List[Dict[str, Any]] = []
+        if hi > lo:
+            with open(events_file(run_id), "rb") as fh:
+                fh.seek(lo)
+                events = [json.loads(line) for line in fh.read(hi - lo).splitlines()]
+        return {"status": status, "events": events, "last_seq": first + len(events) - 1 if events else since}
+
+run_index = RunIndex()
+
+def champion_file() -> Path:
+    return MODELS_DIR / "champion.json"
 
 def save_champion(manifest: Dict[str, Any]):
-    (MODELS_DIR / "champion.json").write_text(json.dumps(manifest))
+    # Write-then-rename so readers (and the serving cache) never see a torn file.
+    dst = champion_file()
+    tmp = dst.with_suffix(f".json.{uuid.uuid4().hex}.tmp")
+    tmp.write_text(json.dumps(manifest))
+    os.replace(tmp, dst)
 
 def load_champion() -> Dict[str, Any]:
-    p = MODELS_DIR / "champion.json"
+    p = champion_file()
     if not p.exists():
         raise FileNotFoundError("No champion yet.")
     return json.loads(p.read_text())
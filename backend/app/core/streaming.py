@@ -0,0 +1,303 @@
+from __future__ import annotations
+import os, json, time, random
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from joblib import dump
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from .storage import DATA_DIR, append_event, set_status, model_dir_for
+from .training import _score, export_champion
+from .profiling import RunProfile, current_rss_mb
+from .telemetry import CANDIDATE_FIT_SECONDS
+
+# Out-of-core training for datasets larger than RAM. The CSV is read in
+# chunks; nothing but one chunk, the validation reservoir and the training
+# sample is ever in memory:
+#   pass 1   - scaler statistics (partial_fit), class counts, a validation
+#              reservoir from every VAL_EVERY-th row, and a training sample
+#              ("reservoir": uniform, or "stratified": per class)
+#   epochs   - every SGD (logistic loss) candidate takes partial_fit on each
+#              scaled training chunk, all candidates in the same read
+#   sample   - HistGradientBoosting candidates are fitted on the sample
+# Sizes follow from memory_mb; the budget and sample policy are recorded in
+# the manifest.
+STREAM_MEMORY_MB = int(os.getenv("NG1_STREAM_MEMORY_MB", "512"))
+STREAM_EPOCHS = int(os.getenv("NG1_STREAM_EPOCHS", "3"))
+SAMPLE_POLICY = os.getenv("NG1_STREAM_SAMPLE_POLICY", "reservoir")   # reservoir | stratified
+SAMPLE_MAX_ROWS = int(os.getenv("NG1_STREAM_SAMPLE_MAX_ROWS", "1000000"))
+VAL_MAX_ROWS = int(os.getenv("NG1_STREAM_VAL_MAX_ROWS", "200000"))
+# Datasets above this size train in streaming mode whatever search_mode says (0 = never).
+STREAM_ABOVE_MB = float(os.getenv("NG1_STREAM_ABOVE_MB", "2048"))
+VAL_EVERY = 5          # row i is held out for validation when i % VAL_EVERY == 0
+PARSE_OVERHEAD = 4     # pandas bytes per parsed float64 cell, roughly
+
+def use_streaming(dataset_id: str, search_mode: str) -> bool:
+    if search_mode == "streaming":
+        return True
+    return STREAM_ABOVE_MB > 0 and (DATA_DIR / dataset_id).stat().st_size > STREAM_ABOVE_MB * 1024 * 1024
+
+def plan_budget(memory_mb: int, n_columns: int, n_features: int) -> Dict[str, int]:
+    """Split the budget: 20% chunk buffer, 10% validation reservoir, 40% training sample."""
+    budget = memory_mb * 1024 * 1024
+    row = max(1, n_features) * 8
+    return {"chunk_rows": max(1000, int(budget * 0.2 / (n_columns * 8 * PARSE_OVERHEAD))),
+            "val_rows": max(1000, min(VAL_MAX_ROWS, int(budget * 0.1 / row))),
+            # HistGB adds a uint8 binned copy plus gradients/hessians per row.
+            "sample_rows": max(1000, min(SAMPLE_MAX_ROWS, int(budget * 0.4 / (row + n_features + 16))))}
+
+class Reservoir:
+    """
+    Uniform fixed-size sample of a row stream (algorithm R, vectorized per
+    chunk). `out` is an optional (X, y) pair of buffers to fill instead of
+    allocating.
+    """
+    def __init__(self, capacity: int, n_features: int, rng: np.random.Generator,
+                 out: Optional[Tuple[np.ndarray, np.ndarray]] = None):
+        self.capacity, self.rng = capacity, rng
+        self.X, self.y = out if out is not None else (np.empty((capacity, n_features), dtype=np.float64),
+                                                      np.empty(capacity, dtype=np.int64))
+        self.seen = 0
+
+    def add(self, X: np.ndarray, y: np.ndarray):
+        n = len(y)
+        free = max(0, min(n, self.capacity - self.seen))
+        if free:
+            self.X[self.seen:self.seen + free], self.y[self.seen:self.seen + free] = X[:free], y[:free]
+        if n > free:
+            # Row t (0-based in the stream) replaces a random slot with probability capacity/(t+1).
+            t = np.arange(self.seen + free, self.seen + n)
+            j = (self.rng.random(n - free) * (t + 1)).astype(np.int64)
+            keep = j < self.capacity
+            self.X[j[keep]], self.y[j[keep]] = X[free:][keep], y[free:][keep]
+        self.seen += n
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(self.seen, self.capacity)
+        return self.X[:k], self.y[:k]
+
+class StratifiedReservoir:
+    """
+    One reservoir per class with an equal share of the capacity (rare classes
+    kept whole). The parts are slices of one buffer, compacted in place by
+    arrays(), so the sample never costs more than its capacity.
+    """
+    def __init__(self, capacity: int, n_features: int, rng: np.random.Generator, classes=(0, 1)):
+        share = capacity // len(classes)
+        self.X = np.empty((share * len(classes), n_features), dtype=np.float64)
+        self.y = np.empty(share * len(classes), dtype=np.int64)
+        self.parts = {c: Reservoir(share, n_features, rng, out=(self.X[i * share:(i + 1) * share],
+                                                                 self.y[i * share:(i + 1) * share]))
+                      for i, c in enumerate(classes)}
+
+    def add(self, X: np.ndarray, y: np.ndarray):
+        for c, r in self.parts.items():
+            m = y == c
+            if m.any():
+                r.add(X[m], y[m])
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Views of the filled rows; call once, after the last add()."""
+        k = 0
+        for r in self.parts.values():
+            n = min(r.seen, r.capacity)
+            self.X[k:k + n], self.y[k:k + n] = r.X[:n], r.y[:n]
+            k += n
+        return self.X[:k], self.y[:k]
+
+def _chunks(path, target: str, features: List[str], chunk_rows: int):
+    """(row offset, X float64, y int) per chunk; rows without a target are dropped."""
+    offset = 0
+    for chunk in pd.read_csv(path, usecols=features + [target], chunksize=chunk_rows, low_memory=False):
+        n = len(chunk)
+        Xc = chunk[features]
+        if any(not pd.api.types.is_numeric_dtype(Xc[c]) for c in features):
+            Xc = Xc.apply(pd.to_numeric, errors="coerce")
+        yc = pd.to_numeric(chunk[target], errors="coerce")
+        ok = yc.notna().to_numpy()
+        y = yc.to_numpy()[ok]
+        binary = np.isin(y, (0, 1))
+        if not binary.all():
+            raise ValueError(f"Target '{target}' must be 0/1, found {np.unique(y[~binary])[:5].tolist()}")
+        yield np.arange(offset, offset + n)[ok], Xc.to_numpy(dtype=np.float64)[ok], y.astype(np.int64)
+        offset += n
+
+def _drop_columns(X: np.ndarray, keep: np.ndarray, block: int = 4096) -> np.ndarray:
+    """
+    X[:, keep] compacted into X's own buffer, front to back in row blocks (a
+    block's output never reaches rows not read yet). X is garbage afterwards.
+    """
+    assert X.flags.c_contiguous
+    out = X.reshape(-1)[:len(X) * int(keep.sum())].reshape(len(X), -1)
+    for s in range(0, len(X), block):
+        out[s:s + block] = X[s:s + block][:, keep]
+    return out
+
+def _keep_features(scaler: StandardScaler, keep: np.ndarray) -> StandardScaler:
+    """The partial_fit statistics of the kept features, as a fitted scaler."""
+    out = StandardScaler()
+    out.mean_, out.var_, out.scale_ = scaler.mean_[keep], scaler.var_[keep], scaler.scale_[keep]
+    seen = scaler.n_samples_seen_
+    out.n_samples_seen_ = seen[keep] if np.ndim(seen) else seen
+    out.n_features_in_ = int(keep.sum())
+    return out
+
+def _sgd_candidates(n: int) -> List[Dict[str, Any]]:
+    return [{"loss": "log_loss", "alpha": float(a), "random_state": 42} for a in np.logspace(-6, -2, n)]
+
+def _hgb_candidates(n: int) -> List[Dict[str, Any]]:
+    grid = [{"learning_rate": lr, "max_leaf_nodes": leaves, "max_iter": 200, "early_stopping": False, "random_state": 42}
+            for lr in (0.05, 0.1, 0.2) for leaves in (15, 31, 63)]
+    return random.sample(grid, min(n, len(grid)))
+
+def train_streaming(run_id: str, dataset_id: str, target: str, n_trials: int,
+                    memory_mb: int = STREAM_MEMORY_MB, should_stop: Optional[Callable[[], bool]] = None,
+                    sample_policy: str = SAMPLE_POLICY, epochs: int = STREAM_EPOCHS) -> Dict[str, Any]:
+    prof = RunProfile()
+    path = DATA_DIR / dataset_id
+    rss0 = current_rss_mb()
+
+    def _cancelled(where) -> bool:
+        if should_stop is None or not should_stop():
+            return False
+        set_status(run_id, "cancelled")
+        append_event(run_id, "cancelled", {"at": where})
+        return True
+
+    with prof.stage("ingest") as m:
+        head = pd.read_csv(path, nrows=1000, low_memory=False)
+        missing = target not in head.columns
+        features = [c for c in head.columns if c != target and pd.api.types.is_numeric_dtype(head[c])]
+    if missing:
+        set_status(run_id, "error")
+        append_event(run_id, "error", {"msg": f"Target '{target}' not in columns"})
+        return {"ok": False, "error": "target_missing"}
+    if not features:
+        set_status(run_id, "error")
+        append_event(run_id, "error", {"msg": "No numeric features found"})
+        return {"ok": False, "error": "no_numeric_features"}
+    plan = plan_budget(memory_mb, len(features) + 1, len(features))
+    append_event(run_id, "ingest", {"cols": len(head.columns), "streaming": True, "memory_mb": memory_mb,
+                                    **plan, **m.as_dict()})
+
+    # Pass 1: statistics, validation reservoir, training sample.
+    rng = np.random.default_rng(42)
+    scaler = StandardScaler()
+    val = Reservoir(plan["val_rows"], len(features), rng)
+    sample = (StratifiedReservoir if sample_policy == "stratified" else Reservoir)(plan["sample_rows"], len(features), rng)
+    counts = np.zeros(2, dtype=np.int64)
+    with prof.stage("prep") as m:
+        for rows, Xc, yc in _chunks(path, target, features, plan["chunk_rows"]):
+            hold = rows % VAL_EVERY == 0
+            # Missing cells are imputed with the means after pass 1 (partial_fit ignores NaN).
+            scaler.partial_fit(Xc[~hold])
+            val.add(Xc[hold], yc[hold])
+            sample.add(Xc[~hold], yc[~hold])
+            counts += np.bincount(yc[~hold], minlength=2)
+            if _cancelled("prep"):
+                return {"ok": False, "error": "cancelled"}
+        # In place: both are views of the reservoir buffers.
+        Xval, yval = val.arrays()
+        Xs, ys = sample.arrays()
+        # Columns with no values in the training rows have no mean to impute
+        # with: they are dropped from the features (and from serving).
+        keep = np.broadcast_to(scaler.n_samples_seen_, (len(features),)) > 0
+        dropped = [f for f, k in zip(features, keep) if not k]
+        if not keep.any():
+            set_status(run_id, "error")
+            append_event(run_id, "error", {"msg": "No numeric feature has any values"})
+            return {"ok": False, "error": "no_numeric_features"}
+        if dropped:
+            features = [f for f, k in zip(features, keep) if k]
+            scaler = _keep_features(scaler, keep)
+            Xval, Xs = _drop_columns(Xval, keep), _drop_columns(Xs, keep)
+        means = scaler.mean_
+        # Exported pipelines impute the same way at serving time.
+        imputer = SimpleImputer(strategy="mean").fit(means[None, :])
+    np.copyto(Xval, means, where=np.isnan(Xval))
+    np.copyto(Xs, means, where=np.isnan(Xs))
+    append_event(run_id, "prep", {"numeric_features": features, "dropped_features": dropped,
+                                  "train_rows": int(counts.sum()), "class_counts": counts.tolist(),
+                                  "val_rows": int(len(yval)), "sample_rows": int(len(ys)), **m.as_dict()})
+    if counts.min() == 0:
+        set_status(run_id, "error")
+        append_event(run_id, "error", {"msg": "Training rows contain a single class"})
+        return {"ok": False, "error": "single_class"}
+
+    n_sgd = max(2, n_trials // 2)
+    sgd = [SGDClassifier(**p) for p in _sgd_candidates(n_sgd)]
+    classes = np.array([0, 1])
+    for e in range(epochs):
+        if _cancelled(f"epoch {e}"):
+            return {"ok": False, "error": "cancelled"}
+        with prof.stage("epoch") as m:
+            for rows, Xc, yc in _chunks(path, target, features, plan["chunk_rows"]):
+                Xt, yt = Xc[rows % VAL_EVERY != 0], yc[rows % VAL_EVERY != 0]
+                np.copyto(Xt, means, where=np.isnan(Xt))
+                Xt = scaler.transform(Xt, copy=False)
+                for clf in sgd:
+                    clf.partial_fit(Xt, yt, classes=classes)
+        Xv = scaler.transform(Xval)
+        append_event(run_id, "search", {"epoch": e, "best": max(_score(yval, c.predict_proba(Xv)[:, 1])["auc"]
+                                                                for c in sgd), **m.as_dict()})
+
+    scored = []
+    Xv = scaler.transform(Xval)
+    for i, clf in enumerate(sgd):
+        metrics = _score(yval, clf.predict_proba(Xv)[:, 1])
+        params = {k: v for k, v in clf.get_params().items() if k in ("loss", "alpha")}
+        append_event(run_id, "candidate", {"generation": "stream", "index": i, "family": "sgd", "params": params,
+                                           "metrics": metrics, "epochs": epochs})
+        scored.append((("sgd", params), metrics, Pipeline([("impute", imputer), ("pre", scaler), ("clf", clf)])))
+    for i, params in enumerate(_hgb_candidates(max(1, n_trials - n_sgd))):
+        if _cancelled("sample"):
+            return {"ok": False, "error": "cancelled"}
+        t = time.perf_counter()
+        with prof.stage("fit"):
+            clf = HistGradientBoostingClassifier(**params).fit(Xs, ys)
+        CANDIDATE_FIT_SECONDS.labels("hgb").observe(time.perf_counter() - t)
+        metrics = _score(yval, clf.predict_proba(Xval)[:, 1])
+        append_event(run_id, "candidate", {"generation": "sample", "index": i, "family": "hgb", "params": params,
+                                           "metrics": metrics, "fit_s": round(time.perf_counter() - t, 4)})
+        scored.append((("hgb", params), metrics, Pipeline([("impute", imputer), ("pre", "passthrough"), ("clf", clf)])))
+
+    scored.sort(key=lambda s: (s[1]["auc"], s[1]["f1"]), reverse=True)
+    (best_fam, best_params), best_metrics, best_pipe = scored[0]
+    append_event(run_id, "eval", {"metrics": best_metrics, "family": best_fam, "params": best_params,
+                                  "fits": len(scored), "search_mode": "streaming"})
+
+    mdir = model_dir_for(run_id)
+    pipe_path = mdir / "pipeline.joblib"
+    profile_path = mdir / "profile.json"
+    with prof.stage("dump") as m:
+        dump(best_pipe, pipe_path)
+        manifest = {
+            "run_id": run_id,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "metrics": best_metrics,
+            "model": {"family": best_fam, "params": best_params},
+            "search": {"mode": "streaming", "fits": len(scored)},
+            "streaming": {"memory_budget_mb": memory_mb, "chunk_rows": plan["chunk_rows"], "epochs": epochs,
+                          "sample_policy": sample_policy, "sample_rows": int(len(ys)),
+                          "sample_capacity": plan["sample_rows"], "val_rows": int(len(yval)),
+                          "val_every": VAL_EVERY, "train_rows": int(counts.sum()),
+                          "dropped_features": dropped,
+                          "peak_rss_growth_mb": round(prof.peak_rss_mb() - rss0, 1)},
+            "features": features,
+            "artifacts": {"pipeline": str(pipe_path), "profile": str(profile_path)}
+        }
+        # Last checkpoint before the champion changes (lease or cancel).
+        if _cancelled("export"):
+            return {"ok": False, "error": "cancelled"}
+        export_champion(mdir, manifest, best_pipe, Xval)
+    append_event(run_id, "deploy", {"ok": True, "champion": True, **m.as_dict()})
+    summary = prof.summary()
+    profile_path.write_text(json.dumps(summary))
+    append_event(run_id, "profile", summary)
+
+    set_status(run_id, "done")
+    return {"ok": True, "manifest": manifest}
@@ -1,8 +1,11 @@
-from typing import Dict
+from __future__ import annotations
+import os, json, time, bisect
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 from datetime import datetime
 
 # Minimal in-memory telemetry for MVP. Replace with OTEL/Prometheus later.
-# Matches "observability-first" principle from your plan. 
+# Matches "observability-first" principle from your plan.
 _RUNS: Dict[str, dict] = {}
 
 def init_run(run_id: str, payload: dict):
@@ -14,4 +17,181 @@ def log(run_id: str, stage: str, data: dict):
     _RUNS[run_id]["status"] = stage
 
 def get(run_id: str):
-    return _RUNS.get(run_id, {"status": "unknown"})
\ No newline at end of file
+    return _RUNS.get(run_id, {"status": "unknown"})
+
+# Prometheus text-format metrics (no client library). Series are created once
+# per label set and cached; recording is a dict lookup plus an in-place add,
+# without locks: under the GIL a concurrent add can at worst be lost, which
+# is acceptable for monitoring and keeps /predict free of contention.
+# Worker processes flush() their series to storage.METRICS_DIR and the API's
+# /metrics adds those snapshots to its own values.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+def _fmt(v: float) -> str:
+    return "+Inf" if v == float("inf") else repr(float(v))
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _CounterChild:
+    __slots__ = ("value",)
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, v: float):
+        self.counts[bisect.bisect_left(self.buckets, v)] += 1
+        self.sum += v
+
+class _Metric:
+    kind = ""
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name, self.help = name, help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        REGISTRY.append(self)
+
+    def _new(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, self._new())
+        return child
+
+    def snapshot(self) -> Dict[str, object]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+    def _new(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def snapshot(self):
+        return {json.dumps(k): c.value for k, c in list(self._children.items())}
+
+class Histogram(_Metric):
+    kind = "histogram"
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames)
+
+    def _new(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, v: float):
+        self.labels().observe(v)
+
+    def snapshot(self):
+        return {json.dumps(k): [list(c.counts), c.sum] for k, c in list(self._children.items())}
+
+REGISTRY: List[_Metric] = []
+# Scrape-time collectors: each returns (name, kind, help, [(labels dict, value)]).
+_COLLECTORS: List[Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]] = []
+
+def register_collector(fn: Callable):
+    _COLLECTORS.append(fn)
+
+REQUEST_LATENCY = Histogram("ng1_http_request_duration_seconds", "HTTP request latency by route.", ("route", "method"))
+CHAMPION_CACHE_HITS = Counter("ng1_champion_cache_hits_total", "Champion lookups served from memory.")
+CHAMPION_CACHE_RELOADS = Counter("ng1_champion_cache_reloads_total", "Champion pipelines (re)loaded from disk.")
+CANDIDATE_FIT_SECONDS = Histogram("ng1_candidate_fit_seconds", "Candidate fit time by model family.", ("family",),
+                                  buckets=FIT_BUCKETS)
+DATASET_PARSE_SECONDS = Histogram("ng1_dataset_parse_seconds", "Dataset upload/parse time by stage.", ("stage",),
+                                  buckets=FIT_BUCKETS)
+DATASET_PARSE_BYTES = Counter("ng1_dataset_parse_bytes_total", "Dataset bytes processed by stage.", ("stage",))
+PREDICT_BATCH_ROWS = Histogram("ng1_predict_batch_rows", "Rows per micro-batched predict call.",
+                               buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096))
+PREDICT_QUEUE_SECONDS = Histogram("ng1_predict_queue_seconds", "Time a /predict request waited for its batch.",
+                                  buckets=(0.0001, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request by route template."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(route.path if route is not None else "unmatched",
+                                   scope["method"]).observe(time.perf_counter() - t0)
+
+def flush(directory: Path):
+    """Write this process's counters and histograms for the API to merge."""
+    directory.mkdir(parents=True, exist_ok=True)
+    dst = directory / f"{os.getpid()}.json"
+    tmp = dst.with_suffix(".tmp")
+    tmp.write_text(json.dumps({m.name: m.snapshot() for m in REGISTRY}))
+    os.replace(tmp, dst)
+
+def _merged(directory: Optional[Path]) -> Dict[str, Dict[str, object]]:
+    out = {m.name: m.snapshot() for m in REGISTRY}
+    if directory is None or not directory.exists():
+        return out
+    for f in directory.glob("*.json"):
+        if f.stem == str(os.getpid()):
+            continue
+        try:
+            snap = json.loads(f.read_text())
+        except (OSError, ValueError):
+            continue
+        for name, series in snap.items():
+            mine = out.setdefault(name, {})
+            for key, v in series.items():
+                if key not in mine:
+                    mine[key] = v
+                elif isinstance(v, list):
+                    mine[key] = [[a + b for a, b in zip(mine[key][0], v[0])], mine[key][1] + v[1]]
+                else:
+                    mine[key] = mine[key] + v
+    return out
+
+def render(directory: Optional[Path] = None) -> str:
+    """Prometheus text exposition (format 0.0.4)."""
+    values = _merged(directory)
+    lines: List[str] = []
+    for m in REGISTRY:
+        lines.append(f"# HELP {m.name} {m.help}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        for key, v in sorted(values.get(m.name, {}).items()):
+            lv = tuple(json.loads(key))
+            if m.kind == "counter":
+                lines.append(f"{m.name}{_labels(m.labelnames, lv)} {_fmt(v)}")
+                continue
+            counts, total = v
+            cum = 0
+            for le, n in zip(m.buckets + (float("inf"),), counts):
+                cum += n
+                bound = 'le="%s"' % _fmt(le)
+                lines.append(f"{m.name}_bucket{_labels(m.labelnames, lv, bound)} {cum}")
+            lines.append(f"{m.name}_sum{_labels(m.labelnames, lv)} {_fmt(total)}")
+            lines.append(f"{m.name}_count{_labels(m.labelnames, lv)} {cum}")
+    for collect in _COLLECTORS:
+        for name, kind, help, samples in collect():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
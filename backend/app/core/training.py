@@ -1,28 +1,69 @@
 from __future__ import annotations
-import time, json
+import os, json, random
 from datetime import datetime, timezone
-from typing import Dict, Any, List, Tuple
+from typing import Callable, Dict, Any, List, Optional, Tuple
 import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import train_test_split, StratifiedKFold, KFold
 from sklearn.metrics import roc_auc_score, f1_score
 from sklearn.preprocessing import StandardScaler
-from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from joblib import dump
-from .genetic import initial_population, evolve, instantiate
-from .storage import append_event, set_status, model_dir_for, save_champion
+from joblib import dump, Parallel, delayed
+from .genetic import initial_population, instantiate, canonical_params
+from ..utils.hashing import hash_arrays
+from .storage import append_event, set_status, model_dir_for
+from .registry import publish
+from .profiling import Measure, RunProfile, StackSampler, merge
+from .telemetry import CANDIDATE_FIT_SECONDS
+from .executor import core_budget
+from .compiled import compile_pipeline, max_abs_diff, EXPORT_TOL
 
 def _infer_numeric(df: pd.DataFrame) -> List[str]:
     return [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
 
-def _make_pipeline(family: str, params: Dict[str, Any], numeric_cols: List[str]) -> Pipeline:
-    scaler = ("scaler", StandardScaler(with_mean=True, with_std=True))
-    pre = ColumnTransformer(transformers=[
-        ("num", Pipeline(steps=[scaler]), numeric_cols)
-    ], remainder="drop")
-    clf = instantiate(family, params)
-    return Pipeline(steps=[("pre", pre), ("clf", clf)])
+# Families whose fit depends on feature scale. Trees split on order only, so
+# they are trained on the raw arrays and exported with a passthrough step.
+SCALED_FAMILIES = ("logreg",)
+
+class PreparedSplit:
+    """
+    One train/validation split, preprocessed once: the scaler is fitted on
+    Xtr a single time and the standardized arrays are shared by every
+    linear candidate of every generation. All arrays are C-contiguous
+    float64 so loky hands them to workers as read-only memory maps
+    instead of pickling a copy per task.
+    """
+    def __init__(self, Xtr: np.ndarray, ytr: np.ndarray, Xval: np.ndarray, yval: np.ndarray, cv_folds: int = 0):
+        self.Xtr = np.ascontiguousarray(Xtr, dtype=np.float64)
+        self.Xval = np.ascontiguousarray(Xval, dtype=np.float64)
+        self.ytr, self.yval = np.ascontiguousarray(ytr), np.ascontiguousarray(yval)
+        self.scaler = StandardScaler(with_mean=True, with_std=True).fit(self.Xtr)
+        self.Xtr_scaled = np.ascontiguousarray(self.scaler.transform(self.Xtr))
+        self.Xval_scaled = np.ascontiguousarray(self.scaler.transform(self.Xval))
+        # CV folds over the training part, as (train_idx, test_idx) index arrays.
+        self.folds = _make_folds(self.ytr, cv_folds) if cv_folds else []
+
+    def arrays(self, family: str) -> Dict[str, Any]:
+        """_fit_candidate keyword arguments for this family's representation."""
+        scaled = family in SCALED_FAMILIES
+        return {"pre": self.scaler if scaled else "passthrough",
+                "Xtr": self.Xtr_scaled if scaled else self.Xtr, "ytr": self.ytr,
+                "Xval": self.Xval_scaled if scaled else self.Xval, "yval": self.yval}
+
+    def fold_arrays(self, family: str) -> Dict[str, Any]:
+        """_fit_fold keyword arguments: raw training arrays; scaled families fit a scaler per fold."""
+        return {"scale": family in SCALED_FAMILIES, "Xtr": self.Xtr, "ytr": self.ytr}
+
+def _make_folds(y: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    k = max(2, min(k, len(y)))
+    _, counts = np.unique(y, return_counts=True)
+    cv = StratifiedKFold(k, shuffle=True, random_state=42) if len(counts) > 1 and counts.min() >= k \
+        else KFold(k, shuffle=True, random_state=42)
+    return [(tr.astype(np.intp), te.astype(np.intp)) for tr, te in cv.split(np.zeros(len(y)), y)]
+
+def _make_pipeline(family: str, params: Dict[str, Any], pre: Any) -> Pipeline:
+    # `pre` is already fitted (or "passthrough"); only the classifier is trained.
+    return Pipeline(steps=[("pre", pre), ("clf", instantiate(family, params))])
 
 def _score(y_true: np.ndarray, y_prob: np.ndarray) -> Dict[str, float]:
     try:
@@ -37,17 +78,348 @@ def _score(y_true: np.ndarray, y_prob: np.ndarray) -> Dict[str, float]:
         f1 = 0.0
     return {"auc": float(auc), "f1": float(f1)}
 
-def train_genetic(run_id: str, df: pd.DataFrame, target: str, n_trials: int) -> Dict[str, Any]:
-    append_event(run_id, "ingest", {"rows": int(df.shape[0]), "cols": int(df.shape[1])})
+# Successive halving: rung r of R trains at fidelity ETA**(r-R) and keeps the
+# top 1/ETA. Tree families grow more trees on the same model (warm_start);
+# logreg is refitted on a larger row subsample.
+HALVING_ETA = 3
+WARM_START_FAMILIES = ("rf", "gb")
+
+# CV mode: a candidate whose mean AUC over the folds done so far is more than
+# CV_PRUNE_TOL below the best fully evaluated candidate stops there. This is
+# a heuristic (later folds could still pull it up), like a median pruner.
+CV_FOLDS = 5
+CV_PRUNE_TOL = float(os.getenv("NG1_CV_PRUNE_TOL", "0.0"))
+
+def _fit_candidate(family: str, params: Dict[str, Any], pre: Any, inner_jobs: int,
+                   Xtr: np.ndarray, ytr: np.ndarray, Xval: np.ndarray, yval: np.ndarray,
+                   fraction: float = 1.0, pipe: Pipeline = None, rows: np.ndarray = None):
+    # Xtr/Xval are already in the representation `pre` produces; the exported
+    # pipeline is pre + clf. Timings are taken inside whichever process fits.
+    timing = {}
+    fit_params = dict(params)
+    if "n_jobs" in fit_params:
+        fit_params["n_jobs"] = inner_jobs
+    warm = family in WARM_START_FAMILIES and (fraction < 1.0 or pipe is not None)
+    if warm:
+        fit_params["warm_start"] = True
+        fit_params["n_estimators"] = max(1, int(round(params["n_estimators"] * fraction)))
+    if pipe is not None:
+        pipe.named_steps["clf"].set_params(**fit_params)
+    else:
+        pipe = _make_pipeline(family, fit_params, pre)
+    clf = pipe.named_steps["clf"]
+    with Measure() as m:
+        if family not in WARM_START_FAMILIES and fraction < 1.0 and rows is not None:
+            idx = rows[:max(2, int(np.ceil(len(rows) * fraction)))]
+            if len(np.unique(ytr[idx])) < 2:
+                idx = rows
+            clf.fit(Xtr[idx], ytr[idx])
+        else:
+            clf.fit(Xtr, ytr)
+    timing["fit"] = m.as_dict()
+    if "n_jobs" in params:
+        clf.set_params(n_jobs=params["n_jobs"])  # artifact keeps the searched setting
+    if warm and fraction >= 1.0:
+        clf.set_params(warm_start=False)
+    prob = getattr(clf, "predict_proba", None)
+    with Measure() as m:
+        if prob is not None:
+            y_prob = clf.predict_proba(Xval)[:, 1]
+        else:
+            # Some models (GB) still expose decision_function; map to 0..1 via logistic
+            try:
+                raw = clf.decision_function(Xval)
+                y_prob = 1 / (1 + np.exp(-raw))
+            except Exception:
+                # Fallback to predictions as probs (bad but safe)
+                y_prob = clf.predict(Xval).astype(float)
+    timing["predict"] = m.as_dict()
+    with Measure() as m:
+        metrics = _score(yval, y_prob)
+    timing["score"] = m.as_dict()
+    return metrics, pipe, timing
+
+def _fit_fold(family: str, params: Dict[str, Any], scale: bool, inner_jobs: int,
+              Xtr: np.ndarray, ytr: np.ndarray, train_idx: np.ndarray, test_idx: np.ndarray):
+    # Slices are taken in the worker: only the index arrays travel per task.
+    Xf, Xt = Xtr[train_idx], Xtr[test_idx]
+    pre = "passthrough"
+    if scale:
+        # Fitted on the fold's training rows only, so the held-out rows do not leak into it.
+        pre = StandardScaler().fit(Xf)
+        Xf, Xt = pre.transform(Xf), pre.transform(Xt)
+    metrics, _, timing = _fit_candidate(family, params, pre, inner_jobs, Xf, ytr[train_idx], Xt, ytr[test_idx])
+    return metrics, timing
+
+def _run_jobs(jobs: list, n_tasks: int):
+    budget = core_budget()
+    workers = max(1, min(n_tasks, budget))
+    inner = max(1, budget // workers)
+    if workers == 1:
+        return [fn(*a, inner_jobs=inner, **kw) for fn, a, kw in jobs]
+    # Arrays above max_nbytes are dumped once per call and memory-mapped
+    # read-only in every worker.
+    return Parallel(n_jobs=workers, backend="loky", return_as="list", max_nbytes="1M", mmap_mode="r")(
+        (fn, a, dict(kw, inner_jobs=inner)) for fn, a, kw in jobs)
+
+class CandidateCache:
+    """
+    (family, canonical params, data fingerprint) -> (metrics, fitted pipeline).
+
+    Survivors, the duplicated fill and the final population all resolve here
+    instead of being refitted. retain() drops the pipelines of configs that left
+    the population (metrics are kept); such a config is refitted if it returns.
+    Candidates eliminated by successive halving are stored the same way, with
+    their partial-fidelity metrics and no pipeline.
+    """
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self._entries: Dict[Tuple[str, str, str], Tuple[Dict[str, float], Any]] = {}
+        self.fits = 0
+        self.hits = 0
+        # compute in full-fit units: one candidate at full fidelity = 1.0
+        self.budget_spent = 0.0
+        self.budget_full = 0.0
+
+    def key(self, family: str, params: Dict[str, Any]) -> Tuple[str, str, str]:
+        return (family, canonical_params(params), self.fingerprint)
+
+    def lookup(self, family: str, params: Dict[str, Any]):
+        return self._entries.get(self.key(family, params))
+
+    def get(self, family: str, params: Dict[str, Any]):
+        hit = self.lookup(family, params)
+        return hit if hit is not None and hit[1] is not None else None
+
+    def put(self, family: str, params: Dict[str, Any], metrics: Dict[str, float], pipe):
+        self._entries[self.key(family, params)] = (metrics, pipe)
+
+    def retain(self, population: List[Tuple[str, Dict[str, Any]]]):
+        keep = {self.key(fam, params) for fam, params in population}
+        for k, (metrics, pipe) in list(self._entries.items()):
+            if pipe is not None and k not in keep:
+                self._entries[k] = (metrics, None)
+
+    def compute_saved(self) -> float:
+        return 1.0 - self.budget_spent / self.budget_full if self.budget_full else 0.0
+
+MAX_GENERATIONS = 4
+
+def _search_shape(n_trials: int, search_mode: str) -> Tuple[int, int]:
+    """
+    (population size, generations). Full-fidelity modes stay small (8 x 4);
+    halving screens most candidates on a fraction of the data, so there the
+    population grows with n_trials and pop_size * gens ~= n_trials.
+    """
+    if search_mode == "halving":
+        gens = min(MAX_GENERATIONS, max(2, n_trials // 8))
+        return max(4, -(-n_trials // gens)), gens
+    pop_size = min(8, max(4, n_trials // 2))
+    return pop_size, min(MAX_GENERATIONS, max(2, n_trials // pop_size))
+
+def _rank_key(t):
+    # Full-fidelity results (those with a pipeline) outrank halving dropouts.
+    return (t[2] is not None, t[1]["auc"], t[1]["f1"])
 
-    if target not in df.columns:
+def _fit_full(todo, split: PreparedSplit, cache: CandidateCache):
+    jobs = [delayed(_fit_candidate)(fam, params, **split.arrays(fam)) for fam, params in todo.values()]
+    out = {}
+    for k, (metrics, pipe, timing) in zip(todo, _run_jobs(jobs, len(jobs))):
+        out[k] = (metrics, pipe, timing, 1.0)
+    cache.budget_spent += len(todo)
+    return out
+
+def _fit_halving(todo, split: PreparedSplit, cache: CandidateCache):
+    n = len(todo)
+    rungs = 0
+    while HALVING_ETA ** (rungs + 1) <= n:
+        rungs += 1
+    rows = np.random.default_rng(42).permutation(len(split.ytr))
+    alive = list(todo)
+    state = {k: (None, None, None, 0.0) for k in alive}   # metrics, pipe, timing, fraction
+    out = {}
+    for r in range(rungs + 1):
+        fraction = float(HALVING_ETA ** (r - rungs))
+        jobs = []
+        for k in alive:
+            fam, params = todo[k]
+            jobs.append(delayed(_fit_candidate)(fam, params, **split.arrays(fam),
+                                                fraction=fraction, rows=rows,
+                                                pipe=state[k][1] if fam in WARM_START_FAMILIES else None))
+        for k, (metrics, pipe, timing) in zip(alive, _run_jobs(jobs, len(jobs))):
+            fam = todo[k][0]
+            prev = state[k][3]
+            cache.budget_spent += fraction - prev if fam in WARM_START_FAMILIES else fraction
+            state[k] = (metrics, pipe, merge(state[k][2], timing), fraction)
+        if r == rungs:
+            break
+        alive.sort(key=lambda k: (state[k][0]["auc"], state[k][0]["f1"]), reverse=True)
+        keep = max(1, int(np.ceil(len(alive) / HALVING_ETA)))
+        for k in alive[keep:]:
+            metrics, _, timing, fraction_done = state[k]
+            out[k] = (metrics, None, timing, fraction_done)
+        alive = alive[:keep]
+    for k in alive:
+        out[k] = state[k]
+    return out
+
+def _candidate_timing(timing: Optional[Dict[str, Dict[str, float]]]) -> Dict[str, float]:
+    if not timing:
+        return {"fit_s": 0.0, "predict_s": 0.0, "score_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": 0.0}
+    out = {f"{stage}_s": m["wall_s"] for stage, m in timing.items()}
+    out["cpu_s"] = round(sum(m["cpu_s"] for m in timing.values()), 4)
+    out["peak_rss_mb"] = max(m["peak_rss_mb"] for m in timing.values())
+    return out
+
+def _fold_mean(scores: List[Dict[str, float]]) -> Dict[str, float]:
+    return {m: float(np.mean([s[m] for s in scores])) for m in scores[0]}
+
+def _fit_cv(todo, split: PreparedSplit, cache: CandidateCache, best_auc: Optional[float]):
+    """
+    k-fold evaluation in waves of one core budget's worth of fold fits,
+    taken candidate by candidate (all folds of the first, then the next).
+    After each wave the best fully evaluated mean AUC is raised by the
+    candidates that just completed, and candidates with folds done that
+    trail it are dropped with their partial mean. Candidates that finish all
+    folds are refitted on the whole training part (that model is what gets
+    exported) and carry their CV mean.
+    """
+    folds = split.folds
+    k = len(folds)
+    scores = {key: [] for key in todo}
+    timing = {key: None for key in todo}
+    pending = [(key, f) for key in todo for f in range(k)]
+    complete, out = [], {}
+    while pending:
+        wave, pending = pending[:core_budget()], pending[core_budget():]
+        jobs = [delayed(_fit_fold)(*todo[key], **split.fold_arrays(todo[key][0]),
+                                   train_idx=folds[f][0], test_idx=folds[f][1])
+                for key, f in wave]
+        for (key, _), (metrics, t) in zip(wave, _run_jobs(jobs, len(jobs))):
+            scores[key].append(metrics)
+            timing[key] = merge(timing[key], t)
+        cache.budget_spent += len(wave) / k
+        for key in dict.fromkeys(key for key, _ in wave):
+            if len(scores[key]) == k:
+                complete.append(key)
+                auc = _fold_mean(scores[key])["auc"]
+                best_auc = auc if best_auc is None else max(best_auc, auc)
+        if best_auc is None:
+            continue
+        dropped = set()
+        for key in dict.fromkeys(key for key, _ in pending):
+            partial = _fold_mean(scores[key]) if scores[key] else None
+            if partial is not None and partial["auc"] + CV_PRUNE_TOL < best_auc:
+                out[key] = (partial, None, timing[key], len(scores[key]) / k)
+                dropped.add(key)
+        pending = [(key, f) for key, f in pending if key not in dropped]
+    alive = complete
+    jobs = [delayed(_fit_candidate)(*todo[key], **split.arrays(todo[key][0])) for key in alive]
+    for key, (_, pipe, t) in zip(alive, _run_jobs(jobs, len(jobs))):
+        out[key] = (_fold_mean(scores[key]), pipe, merge(timing[key], t), 1.0)
+    return out
+
+def _evaluate_population(run_id: str, generation: Any, population: List[Tuple[str, Dict[str, Any]]],
+                         split: PreparedSplit,
+                         cache: CandidateCache, search_mode: str = "full",
+                         profile: Optional[RunProfile] = None) -> List[Tuple[Tuple[str, Dict[str, Any]], Dict[str, float], Pipeline]]:
+    """
+    Fit and score a population across processes. Only configs not already in
+    the cache (and not duplicated earlier in this population) are fitted, at
+    full fidelity, through successive halving or by k-fold CV. Results and
+    per-candidate events come back in population order regardless of which
+    fit finishes first.
+    """
+    todo: Dict[Tuple[str, str, str], Tuple[str, Dict[str, Any]]] = {}
+    for fam, params in population:
+        k = cache.key(fam, params)
+        if k not in todo and cache.get(fam, params) is None:
+            todo[k] = (fam, params)
+    fitted: Dict[Tuple[str, str, str], Tuple[Dict[str, Any], float]] = {}
+    if todo:
+        if search_mode == "cv" and split.folds:
+            # Survivors already evaluated in full set the bar for pruning.
+            done = [cache.get(fam, params) for fam, params in population]
+            best = max((hit[0]["auc"] for hit in done if hit is not None), default=None)
+            results = _fit_cv(todo, split, cache, best)
+        elif search_mode == "halving" and len(todo) >= HALVING_ETA:
+            results = _fit_halving(todo, split, cache)
+        else:
+            results = _fit_full(todo, split, cache)
+        cache.budget_full += len(todo)
+        for k, (metrics, pipe, timing, fraction) in results.items():
+            fam, params = todo[k]
+            cache.put(fam, params, metrics, pipe)
+            cache.fits += 1
+            fitted[k] = (timing, fraction)
+            CANDIDATE_FIT_SECONDS.labels(fam).observe(timing["fit"]["wall_s"])
+            if profile is not None:
+                for stage, m in timing.items():
+                    profile.add(stage, m)
+    scored = []
+    for i, (fam, params) in enumerate(population):
+        k = cache.key(fam, params)
+        metrics, pipe = cache.lookup(fam, params)
+        timing, fraction = fitted.pop(k, (None, 1.0))
+        if timing is None:
+            cache.hits += 1
+        append_event(run_id, "candidate", {"generation": generation, "index": i, "family": fam,
+                                           "params": params, "metrics": metrics,
+                                           **_candidate_timing(timing),
+                                           "cached": timing is None, "fidelity": fraction})
+        scored.append(((fam, params), metrics, pipe))
+    return scored
+
+def export_champion(mdir, manifest: Dict[str, Any], pipe: Pipeline, Xval: np.ndarray):
+    """Add the compiled artifact (when it reproduces pipe on Xval), register as champion, write manifest.json."""
+    compiled = compile_pipeline(pipe)
+    if compiled is not None:
+        diff = max_abs_diff(compiled, pipe, Xval)
+        if diff <= EXPORT_TOL:
+            compiled.save(mdir / "compiled")
+            manifest["artifacts"]["compiled"] = str(mdir / "compiled")
+            manifest["model"]["compiled"] = {"kind": compiled.kind, "max_abs_diff": diff}
+            # Artifacts that load as shared read-only memory maps.
+            manifest["mmap"] = ["compiled"]
+    publish(manifest)
+    (mdir / "manifest.json").write_text(json.dumps(manifest))
+
+def train_genetic(run_id: str, df: pd.DataFrame, target: str, n_trials: int,
+                  search_mode: str = "full", should_stop: Optional[Callable[[], bool]] = None,
+                  profile: bool = False, cv_folds: int = CV_FOLDS) -> Dict[str, Any]:
+    """
+    Every stage (ingest, prep, each generation, final, dump) and every
+    candidate fit/predict/score reports wall time, CPU time and peak RSS in
+    its event; the per-run totals are saved as profile.json next to the
+    model. With profile=True a stack sampler also runs for the whole search
+    and its output is saved as profile.stacks.txt.
+    """
+    sampler = StackSampler() if profile else None
+    if sampler is not None:
+        sampler.start()
+    try:
+        return _train_genetic(run_id, df, target, n_trials, search_mode, should_stop, sampler, cv_folds)
+    finally:
+        if sampler is not None:
+            sampler.stop()
+
+def _train_genetic(run_id: str, df: pd.DataFrame, target: str, n_trials: int, search_mode: str,
+                   should_stop: Optional[Callable[[], bool]], sampler: Optional[StackSampler],
+                   cv_folds: int = CV_FOLDS) -> Dict[str, Any]:
+    prof = RunProfile()
+    with prof.stage("ingest") as m:
+        missing = target not in df.columns
+        if not missing:
+            y = df[target].astype(int).values
+            X = df.drop(columns=[target])
+            numeric_cols = _infer_numeric(X)
+    append_event(run_id, "ingest", {"rows": int(df.shape[0]), "cols": int(df.shape[1]), **m.as_dict()})
+
+    if missing:
         set_status(run_id, "error")
         append_event(run_id, "error", {"msg": f"Target '{target}' not in columns"})
         return {"ok": False, "error": "target_missing"}
 
-    y = df[target].astype(int).values
-    X = df.drop(columns=[target])
-    numeric_cols = _infer_numeric(X)
     if not numeric_cols:
         set_status(run_id, "error")
         append_event(run_id, "error", {"msg": "No numeric features found"})
@@ -55,46 +427,45 @@ def train_genetic(run_id: str, df: pd.DataFrame, target: str, n_trials: int) ->
 
     # Hold-out split (class-aware, small-dataset safe)
     test_size = 0.2 if len(df) >= 50 else 0.5
-    try:
-        Xtr, Xval, ytr, yval = train_test_split(
-            X[numeric_cols].values, y, test_size=test_size, random_state=42, stratify=y if len(np.unique(y)) > 1 else None
-        )
-    except ValueError:
-        # If stratify fails due to tiny class counts
-        Xtr, Xval, ytr, yval = train_test_split(
-            X[numeric_cols].values, y, test_size=test_size, random_state=42
-        )
-    append_event(run_id, "prep", {"numeric_features": numeric_cols, "val_rows": int(len(yval))})
+    with prof.stage("prep") as m:
+        try:
+            Xtr, Xval, ytr, yval = train_test_split(
+                X[numeric_cols].values, y, test_size=test_size, random_state=42, stratify=y if len(np.unique(y)) > 1 else None
+            )
+        except ValueError:
+            # If stratify fails due to tiny class counts
+            Xtr, Xval, ytr, yval = train_test_split(
+                X[numeric_cols].values, y, test_size=test_size, random_state=42
+            )
+        fingerprint = hash_arrays(Xtr, ytr, Xval, yval)
+        split = PreparedSplit(Xtr, ytr, Xval, yval, cv_folds if search_mode == "cv" else 0)
+    append_event(run_id, "prep", {"numeric_features": numeric_cols, "val_rows": int(len(yval)), **m.as_dict()})
 
     # Genetic search (small + fast)
-    pop_size = min(8, max(4, n_trials // 2))
-    gens = min(4, max(2, n_trials // pop_size))
+    pop_size, gens = _search_shape(n_trials, search_mode)
     population = initial_population(pop_size)
     history = []
+    cache = CandidateCache(fingerprint)
+
+    def _cancelled(where) -> bool:
+        # Checked between generations: a running job stops at the next boundary.
+        if should_stop is None or not should_stop():
+            return False
+        set_status(run_id, "cancelled")
+        append_event(run_id, "cancelled", {"at": where})
+        return True
 
     for g in range(gens):
-        scored = []
-        for fam, params in population:
-            pipe = _make_pipeline(fam, params, list(range(len(numeric_cols))))
-            pipe.fit(Xtr, ytr)
-            prob = getattr(pipe.named_steps["clf"], "predict_proba", None)
-            if prob is not None:
-                y_prob = pipe.predict_proba(Xval)[:, 1]
-            else:
-                # Some models (GB) still expose decision_function; map to 0..1 via logistic
-                try:
-                    raw = pipe.decision_function(Xval)
-                    y_prob = 1 / (1 + np.exp(-raw))
-                except Exception:
-                    # Fallback to predictions as probs (bad but safe)
-                    y_prob = pipe.predict(Xval).astype(float)
-            metrics = _score(yval, y_prob)
-            scored.append(((fam, params), metrics, pipe))
+        if _cancelled(g):
+            return {"ok": False, "error": "cancelled"}
+        with prof.stage("generation") as m:
+            scored = _evaluate_population(run_id, g, population, split, cache, search_mode, prof)
         # sort by AUC then F1
-        scored.sort(key=lambda t: (t[1]["auc"], t[1]["f1"]), reverse=True)
+        scored.sort(key=_rank_key, reverse=True)
         best = scored[0]
         history.append({"gen": g, "best_metrics": best[1]})
-        append_event(run_id, "search", {"generation": g, "best": best[1]})
+        append_event(run_id, "search", {"generation": g, "best": best[1],
+                                        "compute_saved": round(cache.compute_saved(), 4), **m.as_dict()})
         # evolve
         population = [(fam, params) for (fam, params), _, _ in scored]
         population = [(fam, params) for (fam, params) in [p[0] for p in scored]]  # keep order
@@ -115,37 +486,51 @@ def train_genetic(run_id: str, df: pd.DataFrame, target: str, n_trials: int) ->
         population = [(fam, mutate(fam, params)) if i >= len(population)//2 else (fam, params)
                       for i, (fam, params) in enumerate(population)]
 
-    # Final best model = best of last generation scored above
-    # Rebuild scored for last population to get the best pipe object
-    final_scored = []
-    for fam, params in population:
-        pipe = _make_pipeline(fam, params, list(range(len(numeric_cols))))
-        pipe.fit(Xtr, ytr)
-        prob = getattr(pipe.named_steps["clf"], "predict_proba", None)
-        y_prob = pipe.predict_proba(Xval)[:, 1] if prob else (1 / (1 + np.exp(-pipe.decision_function(Xval))))
-        metrics = _score(yval, y_prob)
-        final_scored.append(((fam, params), metrics, pipe))
-    final_scored.sort(key=lambda t: (t[1]["auc"], t[1]["f1"]), reverse=True)
+        cache.retain(population)
+
+    if _cancelled("final"):
+        return {"ok": False, "error": "cancelled"}
+
+    # Final best model = best of the evolved population. Survivors come straight
+    # from the cache; only the newest mutants/randoms are actually fitted.
+    with prof.stage("final") as m:
+        final_scored = _evaluate_population(run_id, "final", population, split, cache, search_mode, prof)
+    final_scored.sort(key=_rank_key, reverse=True)
     (best_fam, best_params), best_metrics, best_pipe = final_scored[0]
 
-    append_event(run_id, "eval", {"metrics": best_metrics, "family": best_fam, "params": best_params})
+    append_event(run_id, "eval", {"metrics": best_metrics, "family": best_fam, "params": best_params,
+                                  "fits": cache.fits, "cache_hits": cache.hits, "search_mode": search_mode,
+                                  "compute_saved": round(cache.compute_saved(), 4), **m.as_dict()})
 
     # Save artifacts
     mdir = model_dir_for(run_id)
     pipe_path = mdir / "pipeline.joblib"
-    dump(best_pipe, pipe_path)
-
-    manifest = {
-        "run_id": run_id,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        "metrics": best_metrics,
-        "model": {"family": best_fam, "params": best_params},
-        "features": _infer_numeric(df.drop(columns=[target])),
-        "artifacts": {"pipeline": str(pipe_path)}
-    }
-    (mdir / "manifest.json").write_text(json.dumps(manifest))
-    save_champion(manifest)
-    append_event(run_id, "deploy", {"ok": True, "champion": True})
+    profile_path = mdir / "profile.json"
+    with prof.stage("dump") as m:
+        dump(best_pipe, pipe_path)
+
+        manifest = {
+            "run_id": run_id,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "metrics": best_metrics,
+            "model": {"family": best_fam, "params": best_params},
+            "search": {"mode": search_mode, "fits": cache.fits, "compute_saved": round(cache.compute_saved(), 4),
+                       **({"cv_folds": len(split.folds)} if split.folds else {})},
+            "features": _infer_numeric(df.drop(columns=[target])),
+            "artifacts": {"pipeline": str(pipe_path), "profile": str(profile_path)}
+        }
+        if sampler is not None:
+            sampler.stop()
+            manifest["artifacts"]["profile_stacks"] = str(mdir / "profile.stacks.txt")
+            sampler.save(mdir / "profile.stacks.txt")
+        # Last checkpoint before the champion changes (lease or cancel).
+        if _cancelled("export"):
+            return {"ok": False, "error": "cancelled"}
+        export_champion(mdir, manifest, best_pipe, split.Xval)
+    append_event(run_id, "deploy", {"ok": True, "champion": True, **m.as_dict()})
+    summary = prof.summary()
+    profile_path.write_text(json.dumps(summary))
+    append_event(run_id, "profile", summary)
 
     set_status(run_id, "done")
     return {"ok": True, "manifest": manifest}
\ No newline at end of file
@@ -1,22 +1,50 @@
 from __future__ import annotations
-import os, io, threading, traceback, uuid
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import os, asyncio, random, uuid
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Dict, Any, List
+from fastapi.responses import StreamingResponse, JSONResponse
+from typing import Dict, Any, List, Optional
 import orjson
-import pandas as pd
 import logging
-import uuid
-from .core.schemas import RunRequest
-from .storage import save_dataset, load_csv, new_run, append_event, set_status, get_status, load_champion
-from .core.training import train_genetic
+from .core.schemas import RunRequest, ExperimentRequest
+from .storage import (save_dataset_stream, new_run, append_event, set_status, get_status,
+                      read_status, run_index, METRICS_DIR)
+from .core import jobs, results, registry, experiments
+from .worker import start_workers, stop_workers
+from .core.serving import (
+    champion_cache, model_pool, load_version, rows_to_matrices, columns_to_matrix, decode_matrix, encode_preds,
+    score_artifact, NPY_MEDIA, RAW_MEDIA,
+)
+from .core import executor
+from .core.executor import run_io, run_cpu, LIMITS
+from .core.batching import batcher
+from .core.pubsub import hub
+from .core import telemetry
 
 # Set up logging for better visibility into what's happening
 logging.basicConfig(level=logging.INFO)
 
+# Training worker processes started alongside the API. Set to 0 when workers
+# run as their own service (`python -m app.worker N`) or with several uvicorn workers.
+EMBEDDED_WORKERS = int(os.getenv("NG1_EMBEDDED_WORKERS", "1"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    jobs.init_db()
+    # Snapshots left by workers of a previous deployment.
+    for f in METRICS_DIR.glob("*.json"):
+        f.unlink(missing_ok=True)
+    procs = start_workers(EMBEDDED_WORKERS) if EMBEDDED_WORKERS > 0 else []
+    yield
+    stop_workers(procs)
+    # Drop the I/O thread pool and any inference worker processes on shutdown.
+    executor.shutdown()
+
 # Initialize the FastAPI app with a default response class that allows for flexibility.
-app = FastAPI(title="NeuroGenX NG-1 v2")
+app = FastAPI(title="NeuroGenX NG-1 v2", lifespan=lifespan)
+
+app.add_middleware(telemetry.MetricsMiddleware)
 
 # Add middleware for CORS to allow cross-origin requests
 app.add_middleware(
@@ -40,78 +68,150 @@ async def root() -> Dict[str, str]:
 async def upload_dataset(file: UploadFile = File(...)) -> Dict[str, Any]:
     """
     Handles the upload of a CSV dataset, saves it, and returns a summary.
-    This version generates a unique ID and saves the file directly.
-    """
-    try:
-        logging.info(f"Received upload request for file: {file.filename}")
-        
-        # Generate a unique ID for the dataset
-        dataset_id = str(uuid.uuid4())
-
-        # Read the file contents directly from the upload stream
-        contents = await file.read()
-        
-        # Save the dataset directly using the new unique ID
-        dst = save_dataset(contents, dataset_id)
-        
-        # Create an in-memory text buffer to read the CSV
-        sio = io.StringIO(contents.decode('utf-8'))
-        
-        # Read a quick peek of the CSV to get columns and dtypes
-        df = pd.read_csv(sio, nrows=100)
-        cols = list(df.columns)
-        dtypes = {c: str(df[c].dtype) for c in cols}
-        
-        logging.info(f"Dataset {dataset_id} processed. Columns: {cols}")
-        return {"dataset_id": dataset_id, "columns": cols, "dtypes": dtypes}
-    except Exception as e:
-        logging.error(f"Error during dataset upload: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Failed to process the dataset: {str(e)}")
-
-
-def _background_train(run_id: str, req: RunRequest):
-    """
-    This function runs in the background to start the training process.
+    The upload is streamed to disk in chunks on the I/O pool; columns/dtypes
+    come from the first chunk, rows/bytes/content hash are computed on the way.
     """
-    try:
-        logging.info(f"Background training started for run_id: {run_id}")
-        df = load_csv(req.dataset_id)
-        res = train_genetic(run_id, df, req.target, req.n_trials)
-        if not res.get("ok"):
-            set_status(run_id, "error")
-            append_event(run_id, "error", {"msg": res.get("error", "unknown")})
-            logging.error(f"Training failed for run {run_id}: {res.get('error', 'unknown')}")
-        else:
-            logging.info(f"Training for run {run_id} completed successfully.")
-    except Exception as e:
-        logging.error(f"An unexpected error occurred during background training for run {run_id}", exc_info=True)
-        set_status(run_id, "error")
-        append_event(run_id, "error", {
-            "msg": str(e),
-            "trace": traceback.format_exc()[:5000]
-        })
+    async with LIMITS["upload"]:
+        try:
+            logging.info(f"Received upload request for file: {file.filename}")
+            
+            # Generate a unique ID for the dataset
+            dataset_id = str(uuid.uuid4())
+
+            # Copy the (already spooled) upload to DATA_DIR without reading it whole
+            summary = await run_io(save_dataset_stream, file.file, dataset_id)
+            
+            logging.info(f"Dataset {dataset_id} processed. Columns: {summary['columns']}")
+            return summary
+        except Exception as e:
+            logging.error(f"Error during dataset upload: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Failed to process the dataset: {str(e)}")
+
+
+def _enqueue_run(run_id: str, req: RunRequest) -> Optional[Dict[str, Any]]:
+    payload = req.model_dump()
+    # Status first: the first event of a run without one would publish it as "running".
+    set_status(run_id, "queued")
+    append_event(run_id, "start", payload)
+    manifest = results.reuse(run_id, payload)
+    if manifest is not None:
+        return manifest
+    jobs.enqueue(run_id, payload, priority=req.priority)
+    return None
 
 @app.post("/runs/start")
 async def runs_start(req: RunRequest):
     """
-    Launches a new model training run in a background thread.
+    Queues a new model training run. A training worker process picks it up;
+    the status moves from queued to running to done/error/cancelled.
+    If an identical run (same dataset content, target, search config and
+    training code) already finished, the run completes immediately with that
+    model (cached=true) unless force is set; the champion is not changed.
     """
     run_id = new_run()
-    append_event(run_id, "start", req.dict())
-    set_status(run_id, "running")
-    t = threading.Thread(target=_background_train, args=(run_id, req), daemon=True)
-    t.start()
-    logging.info(f"Model run started with run_id: {run_id}")
-    return {"run_id": run_id}
+    manifest = await run_io(_enqueue_run, run_id, req)
+    if manifest is not None:
+        logging.info(f"Run {run_id} answered from the results cache (run {manifest['run_id']}).")
+        return {"run_id": run_id, "cached": True, "manifest": manifest}
+    logging.info(f"Model run queued with run_id: {run_id}")
+    return {"run_id": run_id, "cached": False}
+
+@app.post("/runs/{run_id}/cancel")
+async def runs_cancel(run_id: str):
+    """
+    Cancels a queued run immediately, or asks a running one to stop at its
+    next generation boundary. Finished runs report their final status.
+    """
+    status = await run_io(jobs.request_cancel, run_id)
+    if status is None:
+        # Runs answered from the results cache finish without a queue entry.
+        status = await run_io(read_status, run_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail=f"Unknown run {run_id}.")
+    if status == "cancelled":
+        await run_io(set_status, run_id, "cancelled")
+    logging.info(f"Cancel requested for run {run_id} (job status: {status}).")
+    return {"run_id": run_id, "job_status": status}
+
+@app.get("/runs/queue")
+async def runs_queue():
+    """
+    Number of runs per job status (queued, running, done, ...).
+    """
+    return await run_io(jobs.queue_depth)
 
 @app.get("/runs/{run_id}/status")
-async def runs_status(run_id: str):
+async def runs_status(run_id: str, request: Request, since: int = Query(-1, ge=-1),
+                      limit: Optional[int] = Query(None, ge=1, le=10000)):
     """
-    Gets the live status of a model run.
+    Gets the live status of a model run. `since` returns only events with a
+    larger seq and `limit` caps how many; pass the returned last_seq back as
+    `since` to page forward. Unchanged runs answer If-None-Match with 304.
     """
-    status = get_status(run_id)
-    logging.info(f"Status requested for run {run_id}. Status: {status}")
-    return status
+    etag = await run_io(run_index.etag, run_id)
+    if etag is not None and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    status = await run_io(run_index.events, run_id, since, limit)
+    if status is None:
+        # Legacy single-file record, or unknown run.
+        return await run_io(get_status, run_id)
+    logging.info(f"Status requested for run {run_id}. Status: {status['status']}")
+    return JSONResponse(status, headers={"ETag": etag} if etag else None)
+
+SSE_KEEPALIVE_S = float(os.getenv("NG1_SSE_KEEPALIVE_S", "15"))
+
+def _sse_event(ev: Dict[str, Any]) -> bytes:
+    return b"id: %d\ndata: %s\n\n" % (ev["seq"], orjson.dumps(ev))
+
+@app.get("/runs/{run_id}/events")
+async def runs_events(run_id: str, request: Request, last_event_id: int = -1):
+    """
+    Streams a run's events as server-sent events (id = event seq). Reconnects
+    resume after the Last-Event-ID header (or ?last_event_id=). The stream
+    ends with an `event: status` message once the run is finished.
+    """
+    header = request.headers.get("last-event-id")
+    if header:
+        try:
+            last_event_id = int(header)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID must be an event seq.")
+    if await run_io(run_index.status, run_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown run {run_id}.")
+    # Subscribe before reading the backlog so nothing appended in between is
+    # lost; the overlap is dropped by seq.
+    sub = await hub.subscribe(run_id)
+
+    async def stream():
+        last = last_event_id
+        try:
+            yield b"retry: 1000\n\n"
+            backlog = (await run_io(run_index.events, run_id, last))["events"]
+            for ev in backlog:
+                if ev["seq"] > last:
+                    last = ev["seq"]
+                    yield _sse_event(ev)
+            while True:
+                if sub.overflowed and sub.queue.empty():
+                    break  # too slow; the client reconnects from `last`
+                try:
+                    item = await asyncio.wait_for(sub.queue.get(), SSE_KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if item is None:
+                    break
+                if "status" in item:
+                    yield b"event: status\ndata: %s\n\n" % orjson.dumps(item)
+                    break
+                if item["seq"] > last:
+                    last = item["seq"]
+                    yield _sse_event(item)
+        finally:
+            hub.unsubscribe(run_id, sub)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.get("/models/champion")
 async def champion():
@@ -119,41 +219,248 @@ async def champion():
     Returns the champion model if one exists.
     """
     try:
-        champion_data = load_champion()
+        async with LIMITS["champion"]:
+            champion_data = (await run_io(champion_cache.get)).manifest
         logging.info("Champion model loaded successfully.")
         return champion_data
     except FileNotFoundError:
         logging.info("No champion model found.")
         raise HTTPException(status_code=404, detail="No champion model has been found yet.")
 
+@app.get("/models")
+async def models_list(before: Optional[int] = Query(None, description="Versions older than this (paging cursor)"),
+                      limit: int = Query(50, ge=1, le=500)):
+    """
+    Registered model versions, newest first, with the current champion
+    version. Pass next_before as `before` for the next page.
+    """
+    return await run_io(registry.list_versions, before, limit)
+
+@app.post("/models/rollback")
+async def models_rollback():
+    """
+    Restores the champion that the current one replaced.
+    """
+    try:
+        manifest = await run_io(registry.rollback)
+    except KeyError as e:
+        raise HTTPException(status_code=409, detail=f"Previous champion version {e} has been garbage-collected.")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=f"Cannot roll back: {e}.")
+    if manifest is None:
+        raise HTTPException(status_code=409, detail="Nothing to roll back to.")
+    logging.info(f"Champion rolled back to version {manifest['version']}.")
+    return manifest
+
+@app.post("/models/gc")
+async def models_gc(keep: int = Query(20, ge=0), keep_best: Optional[int] = Query(None, ge=0)):
+    """
+    Deletes the artifacts of old versions, keeping the newest `keep`, the
+    `keep_best` (default `keep`) with the highest validation AUC, the
+    champion and its last `keep` rollback targets.
+    """
+    deleted = await run_io(registry.gc, keep, keep_best)
+    logging.info(f"Registry GC removed {len(deleted)} versions.")
+    return {"deleted": deleted}
+
+@app.get("/models/{version}")
+async def models_get(version: int):
+    """
+    Manifest of one registered model version.
+    """
+    manifest = await run_io(registry.get, version)
+    if manifest is None:
+        raise HTTPException(status_code=404, detail=f"Unknown model version {version}.")
+    return manifest
+
+@app.post("/models/{version}/promote")
+async def models_promote(version: int):
+    """
+    Makes a registered version the champion.
+    """
+    try:
+        manifest = await run_io(registry.promote, version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown or deleted model version {version}.")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=f"Cannot promote: {e}.")
+    logging.info(f"Model version {version} promoted to champion.")
+    return manifest
+
+def _pinned_model(version: Optional[int], run_id: Optional[str]):
+    """Model for ?version= / ?run_id= (KeyError if unknown or not servable)."""
+    if version is None:
+        version = registry.version_for_run(run_id)
+        if version is None:
+            raise KeyError(run_id)
+    return load_version(version)
+
+def _row_matrices(payload: List[Dict[str, Any]], models):
+    Xs = rows_to_matrices(payload, [m.manifest["features"] for m in models])
+    models[0].check_input(Xs[0])
+    return Xs
+
+def _champion_and_experiment():
+    return champion_cache.get(), experiments.experiment.get()
+
 @app.post("/predict")
-async def predict(payload: List[Dict[str, Any]]):
+async def predict(payload: List[Dict[str, Any]],
+                  version: Optional[int] = Query(None, description="Score with this registered model version"),
+                  run_id: Optional[str] = Query(None, description="Score with the model trained by this run")):
+    """
+    Makes a prediction using the champion model, or a pinned version/run.
+    The pipeline comes from the in-process champion cache, so it is only
+    deserialized again when a new champion is published. Concurrent requests
+    are coalesced by the micro-batcher into a single predict_proba call.
+    While an experiment is set (PUT /serving/experiment), unpinned requests
+    are split between champion and challenger, or the challenger is scored
+    in the background ("shadow") and compared with the champion's answer.
+    """
+    async with LIMITS["predict"]:
+        exp = None
+        if version is not None or run_id is not None:
+            try:
+                loaded = await run_io(_pinned_model, version, run_id)
+            except KeyError:
+                raise HTTPException(status_code=404, detail=f"No servable model for version={version} run_id={run_id}.")
+        else:
+            try:
+                loaded, exp = await run_io(_champion_and_experiment)
+            except FileNotFoundError:
+                logging.warning("Prediction requested but no champion model available.")
+                return {"preds": [], "message": "No champion available yet."}
+
+        if not payload:
+            return {"preds": []}
+
+        challenger = None
+        if exp is not None and exp["challenger"] != loaded.manifest.get("version"):
+            if exp["mode"] == "split":
+                if random.random() < exp["fraction"]:
+                    try:
+                        loaded = await run_io(model_pool.get, exp["challenger"])
+                    except KeyError:
+                        pass   # challenger no longer servable: the champion answers
+            else:
+                challenger = model_pool.peek(exp["challenger"])
+                if challenger is None:
+                    experiments.warm(exp["challenger"])   # this request goes unshadowed
+
+        models = [loaded] if challenger is None else [loaded, challenger]
+        try:
+            Xs = await run_io(_row_matrices, payload, models)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid rows: {e}")
+        preds = await batcher.submit(loaded, Xs[0])
+        if challenger is not None:
+            experiments.shadow(challenger, Xs[1], preds, loaded.manifest.get("version"))
+
+    logging.info(f"Prediction made for {len(payload)} items.")
+    return {"preds": preds.tolist(), "version": loaded.manifest.get("version")}
+
+@app.get("/serving/experiment")
+async def experiment_get():
+    """
+    Current experiment, shadow comparison totals and the loaded-model pool (this process).
+    """
+    return {"experiment": await run_io(experiments.experiment.get), "shadow": experiments.shadow_log.snapshot(),
+            "pool": model_pool.snapshot()}
+
+@app.put("/serving/experiment")
+async def experiment_set(req: ExperimentRequest):
     """
-    Makes a prediction using the champion model.
+    Starts (or replaces) an A/B experiment against the champion.
     """
     try:
-        champion_data = load_champion()
-    except FileNotFoundError:
-        logging.warning("Prediction requested but no champion model available.")
-        return {"preds": [], "message": "No champion available yet."}
-    
-    # Rest of the prediction logic (joblib, numpy)
-    from joblib import load
-    import numpy as np
-    pipe_path = champion_data["artifacts"]["pipeline"]
-    pipe = load(pipe_path)
-    feats = champion_data["features"]
-    
-    rows = [[row.get(f, 0.0) for f in feats] for row in payload]
-    X = np.array(rows)
-    
-    prob = getattr(pipe.named_steps["clf"], "predict_proba", None)
-    if prob:
-        preds = pipe.predict_proba(X)[:, 1].tolist()
+        await run_io(model_pool.get, req.challenger)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Model version {req.challenger} is not servable.")
+    await run_io(experiments.experiment.set, req.model_dump())
+    logging.info(f"Experiment started: version {req.challenger} in {req.mode} mode.")
+    return await experiment_get()
+
+@app.delete("/serving/experiment")
+async def experiment_clear():
+    await run_io(experiments.experiment.clear)
+    return {"experiment": None}
+
+@app.get("/predict/stats")
+async def predict_stats():
+    """
+    Micro-batching scheduler settings and metrics (batch size, queue latency).
+    """
+    return {"max_wait_ms": batcher.max_wait_ms, "max_batch_rows": batcher.max_rows,
+            **batcher.stats.snapshot()}
+
+def _collect_runtime():
+    depth = jobs.queue_depth()
+    yield ("ng1_queue_depth", "gauge", "Training jobs by status.",
+           [({"status": s}, n) for s, n in sorted(depth.items())])
+    yield ("ng1_active_runs", "gauge", "Runs being trained right now.", [({}, depth.get("running", 0))])
+    yield ("ng1_run_event_watchers", "gauge", "Open run event streams.", [({}, hub.watchers())])
+    yield ("ng1_inflight_requests", "gauge", "In-flight requests per concurrency-limited endpoint.",
+           [({"endpoint": name}, lim.active) for name, lim in LIMITS.items()])
+
+telemetry.register_collector(_collect_runtime)
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: request latency per route, predict batch sizes and
+    queue time, champion cache hits/reloads, queue depth, active runs,
+    candidate fit time per family (from the workers) and dataset parse
+    throughput.
+    """
+    text = await run_io(telemetry.render, METRICS_DIR)
+    return Response(content=text, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _batch_matrix(body: bytes, media_type: str, loaded):
+    # Parsing and conversion are O(payload): kept off the event loop.
+    feats = loaded.manifest["features"]
+    if media_type in (NPY_MEDIA, RAW_MEDIA):
+        X = decode_matrix(body, media_type, len(feats))
     else:
-        raw = pipe.decision_function(X)
-        preds = (1 / (1 + np.exp(-raw))).tolist()
-        
-    logging.info(f"Prediction made for {len(payload)} items.")
-    return {"preds": preds}
+        columns = orjson.loads(body)
+        if not isinstance(columns, dict):
+            raise ValueError("columnar JSON must be an object of feature -> array")
+        X = columns_to_matrix(columns, feats)
+    loaded.check_input(X)
+    return X
 
+@app.post("/predict/batch")
+async def predict_batch(request: Request, version: Optional[int] = Query(None), run_id: Optional[str] = Query(None)):
+    """
+    Bulk scoring against the champion model.
+
+    Accepts either columnar JSON ({"feature": [values, ...], ...}) or a binary
+    matrix in the manifest's feature order (application/x-npy, or raw
+    little-endian float64 as application/octet-stream). The response is JSON
+    {"preds": [...]} unless the Accept header asks for npy/raw bytes.
+    version/run_id score with that model instead of the champion.
+    """
+    async with LIMITS["predict_batch"]:
+        try:
+            if version is not None or run_id is not None:
+                loaded = await run_io(_pinned_model, version, run_id)
+            else:
+                loaded = await run_io(champion_cache.get)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="No champion available yet.")
+        except KeyError:
+            raise HTTPException(status_code=404, detail=f"No servable model for version={version} run_id={run_id}.")
+        media_type = request.headers.get("content-type", "application/json").split(";")[0].strip()
+        body = await request.body()
+        try:
+            X = await run_io(_batch_matrix, body, media_type, loaded)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid batch payload: {e}")
+
+        # Large batches go to the inference process pool (if configured);
+        # the rest score on the cached pipeline in a worker thread.
+        if executor.INFERENCE_PROCESSES > 0 and X.shape[0] >= executor.PROCESS_MIN_ROWS:
+            preds = await run_cpu(score_artifact, loaded.artifact_for(X.shape[0]), X)
+        else:
+            preds = await run_io(loaded.predict, X)
+        content, out_type = encode_preds(preds, request.headers.get("accept", ""))
+    logging.info(f"Batch prediction made for {X.shape[0]} rows.")
+    return Response(content=content, media_type=out_type)
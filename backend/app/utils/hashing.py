@@ -1,5 +1,18 @@
-import hashlib, pandas as pd
+import hashlib, json, pandas as pd
+import numpy as np
 
-def hash_df_head(df: pd.DataFrame, n=100) -> str:
-    s = df.head(n).to_csv(index=False).encode()
-    return hashlib.sha256(s).hexdigest()[:16]
\ No newline at end of file
+def hash_df(df: pd.DataFrame) -> str:
+    """Full-content fingerprint of a DataFrame: column names, dtypes and every value (vectorized, no CSV round trip)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([[str(c) for c in df.columns], [str(t) for t in df.dtypes]]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def hash_arrays(*arrays: np.ndarray) -> str:
+    """Content fingerprint of numpy arrays (dtype, shape and bytes)."""
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update(f"{a.dtype.str}{a.shape}".encode())
+        h.update(memoryview(a).cast("B"))
+    return h.hexdigest()
@@ -0,0 +1,173 @@
+from __future__ import annotations
+import os, sys, time, socket, logging, threading, traceback, multiprocessing
+from typing import List, Optional
+from .core import jobs, results
+from .core.schemas import RunRequest
+from .core.training import train_genetic
+from .core.streaming import train_streaming, use_streaming, STREAM_MEMORY_MB
+from .core.profiling import Measure, PROFILE_SAMPLER
+from .core import telemetry
+from .storage import load_training_frame, append_event, set_status, METRICS_DIR
+
+# Training workers run in their own processes, pulling runs from the durable
+# queue in app.core.jobs. Start them standalone with `python -m app.worker`
+# or let the API spawn NG1_EMBEDDED_WORKERS of them at startup.
+WORKERS = int(os.getenv("NG1_WORKERS", "1"))
+POLL_S = float(os.getenv("NG1_WORKER_POLL_S", "1.0"))
+HEARTBEAT_S = float(os.getenv("NG1_WORKER_HEARTBEAT_S", "5.0"))
+# Lower scheduling priority so training yields the CPU to the API/predict path.
+NICE = int(os.getenv("NG1_WORKER_NICE", "10"))
+
+class _Lease:
+    """
+    Heartbeats the claimed run from a side thread. Losing the lease (the run
+    was recovered as stale and claimed again) is not a cancellation: the run
+    now belongs to another worker, so this one stops without writing anything.
+    """
+    def __init__(self, run_id: str, worker: str):
+        self.run_id, self.worker = run_id, worker
+        self.lost = False
+        self._stop = threading.Event()
+        self._t = threading.Thread(target=self._beat, daemon=True)
+
+    def _beat(self):
+        while not self._stop.wait(HEARTBEAT_S):
+            try:
+                if not jobs.heartbeat(self.run_id, self.worker):
+                    self.lost = True
+                telemetry.flush(METRICS_DIR)
+            except Exception:
+                logging.warning(f"Heartbeat failed for run {self.run_id}", exc_info=True)
+
+    def check(self):
+        """Raise jobs.LeaseLost unless this worker still holds the run."""
+        if self.lost or not jobs.owns(self.run_id, self.worker):
+            self.lost = True
+            raise jobs.LeaseLost(self.run_id)
+
+    def should_stop(self) -> bool:
+        """Training checkpoint: LeaseLost if the lease is gone, True if a cancel was requested."""
+        self.check()
+        return jobs.cancel_requested(self.run_id)
+
+    def __enter__(self):
+        self._t.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._t.join()
+        return False
+
+def run_job(run_id: str, req: RunRequest, worker: str, lease: _Lease) -> Optional[str]:
+    """
+    Train one queued run under its lease. Returns the final job status, or
+    None if the lease was lost (nothing is written for the run then).
+    """
+    try:
+        lease.check()
+        set_status(run_id, "running")
+        logging.info(f"Worker {worker} started run_id: {run_id}")
+        # An identical run may have finished while this one was queued.
+        if results.reuse(run_id, req.model_dump()) is not None:
+            logging.info(f"Run {run_id} answered from the results cache.")
+            return "done"
+        if use_streaming(req.dataset_id, req.search_mode):
+            # Larger-than-memory path: the dataset is never loaded whole.
+            res = train_streaming(run_id, req.dataset_id, req.target, req.n_trials,
+                                  memory_mb=req.memory_mb or STREAM_MEMORY_MB, should_stop=lease.should_stop)
+        else:
+            with Measure() as m:
+                df = load_training_frame(req.dataset_id, req.target)
+            append_event(run_id, "load", {"dataset_id": req.dataset_id, **m.as_dict()})
+            res = train_genetic(run_id, df, req.target, req.n_trials, search_mode=req.search_mode,
+                                should_stop=lease.should_stop, profile=req.profile or PROFILE_SAMPLER,
+                                cv_folds=req.cv_folds)
+        if res.get("ok"):
+            key = results.result_key(req.model_dump())
+            if key is not None:
+                lease.check()
+                results.store(key, res["manifest"])
+            logging.info(f"Training for run {run_id} completed successfully.")
+            return "done"
+        if res.get("error") == "cancelled":
+            return "cancelled"
+        set_status(run_id, "error")
+        append_event(run_id, "error", {"msg": res.get("error", "unknown")})
+        logging.error(f"Training failed for run {run_id}: {res.get('error', 'unknown')}")
+        return "error"
+    except jobs.LeaseLost:
+        logging.warning(f"Worker {worker} lost the lease on run {run_id}; stopping without writing its status")
+        return None
+    except Exception as e:
+        logging.error(f"An unexpected error occurred during training for run {run_id}", exc_info=True)
+        set_status(run_id, "error")
+        append_event(run_id, "error", {
+            "msg": str(e),
+            "trace": traceback.format_exc()[:5000]
+        })
+        return "error"
+
+def _recover():
+    for run_id, status in jobs.recover_stale():
+        logging.warning(f"Recovered stale run {run_id} -> {status}")
+        set_status(run_id, status)
+        append_event(run_id, "recovered", {"status": status})
+
+def worker_main(index: int = 0):
+    logging.basicConfig(level=logging.INFO)
+    if NICE:
+        try:
+            os.nice(NICE)
+        except OSError:
+            pass
+    worker = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    jobs.init_db()
+    logging.info(f"Training worker {worker} polling {jobs.DB_PATH}")
+    failures = 0
+    while True:
+        try:
+            _recover()
+            job = jobs.claim(worker)
+            if job is None:
+                failures = 0
+                time.sleep(POLL_S)
+                continue
+            run_id = job["run_id"]
+            # The lease starts with the claim so it also covers loading the dataset.
+            with _Lease(run_id, worker) as lease:
+                status = run_job(run_id, RunRequest(**job["payload"]), worker, lease)
+            if status is not None and not jobs.finish(run_id, status, worker):
+                logging.warning(f"Run {run_id} was taken over by another worker; dropped status {status}")
+            telemetry.flush(METRICS_DIR)
+            failures = 0
+        except Exception:
+            # e.g. "database is locked": back off and keep polling rather than exit,
+            # since start_workers() does not respawn workers.
+            failures += 1
+            logging.error(f"Worker {worker} poll failed ({failures} in a row)", exc_info=True)
+            time.sleep(min(POLL_S * 2 ** failures, 60.0))
+
+def start_workers(n: int = WORKERS) -> List[multiprocessing.Process]:
+    ctx = multiprocessing.get_context("spawn")
+    procs = []
+    for i in range(n):
+        p = ctx.Process(target=worker_main, args=(i,), name=f"ng1-worker-{i}")
+        p.start()
+        procs.append(p)
+    return procs
+
+def stop_workers(procs: List[multiprocessing.Process], timeout: float = 5.0):
+    # In-flight runs are left 'running' and picked up again by recover_stale().
+    for p in procs:
+        p.terminate()
+    for p in procs:
+        p.join(timeout)
+
+if __name__ == "__main__":
+    procs = start_workers(int(sys.argv[1]) if len(sys.argv) > 1 else WORKERS)
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        stop_workers(procs)
@@ -0,0 +1,176 @@
+"""
+Offline benchmarks for the upload, training and prediction paths.
+
+    cd backend
+    python -m benchmarks.run                        # run, write benchmarks/results.json
+    python -m benchmarks.run --save-baseline        # ...and record it as benchmarks/baseline.json
+    python -m benchmarks.run --threshold 0.25       # exit 1 if anything is >25% worse than baseline
+                                                    # (or if there is no baseline to compare with)
+
+Everything runs in-process against a throwaway runtime dir: the API is
+driven through its ASGI app, training calls train_genetic directly.
+"""
+from __future__ import annotations
+import os, sys, json, time, random, argparse, platform, tempfile, subprocess
+from pathlib import Path
+from typing import Any, Dict, List
+import numpy as np
+
+HERE = Path(__file__).resolve().parent
+RESULTS = HERE / "results.json"
+BASELINE = HERE / "baseline.json"
+DEFAULT_THRESHOLD = 0.25
+
+def _result(value: float, unit: str, better: str = "lower") -> Dict[str, Any]:
+    return {"value": round(float(value), 6), "unit": unit, "better": better}
+
+def _percentiles(samples_ms: List[float], prefix: str) -> Dict[str, Dict[str, Any]]:
+    a = np.asarray(samples_ms)
+    return {f"{prefix}.p{p}_ms": _result(np.percentile(a, p), "ms") for p in (50, 95, 99)}
+
+def bench_upload(client, csv: bytes, repeats: int) -> Dict[str, Any]:
+    best = float("inf")
+    for _ in range(repeats):
+        t = time.perf_counter()
+        r = client.post("/datasets/upload", files={"file": ("bench.csv", csv)})
+        best = min(best, time.perf_counter() - t)
+        r.raise_for_status()
+    return {"upload.throughput_mb_s": _result(len(csv) / best / 1e6, "MB/s", "higher"),
+            "dataset_id": r.json()["dataset_id"]}
+
+def bench_parse(dataset_id: str, target: str, rows: int) -> Dict[str, Any]:
+    from app.storage import load_training_frame, DATA_DIR
+    import shutil
+    shutil.rmtree(DATA_DIR / f"{dataset_id}.cols", ignore_errors=True)
+    t = time.perf_counter()
+    load_training_frame(dataset_id, target)  # cold: CSV parse + column cache build
+    cold = time.perf_counter() - t
+    t = time.perf_counter()
+    load_training_frame(dataset_id, target)  # warm: memory-mapped columns
+    warm = time.perf_counter() - t
+    return {"parse.cold_rows_s": _result(rows / cold, "rows/s", "higher"),
+            "parse.warm_s": _result(warm, "s")}
+
+def bench_training(dataset_id: str, target: str, n_trials: int, search_mode: str, seed: int) -> Dict[str, Any]:
+    from app.storage import new_run, load_training_frame, read_events
+    from app.core.training import train_genetic
+    random.seed(seed)
+    np.random.seed(seed)
+    run_id = new_run()
+    t = time.perf_counter()
+    res = train_genetic(run_id, load_training_frame(dataset_id, target), target, n_trials, search_mode=search_mode)
+    total = time.perf_counter() - t
+    if not res.get("ok"):
+        raise RuntimeError(f"benchmark run failed: {res}")
+    events = read_events(run_id)[0]
+    marks = [e["ts"] for e in events if e["stage"] in ("prep", "search")]
+    gens = np.diff(marks)
+    ev = next(e for e in events if e["stage"] == "eval")["data"]
+    return {"train.end_to_end_s": _result(total, "s"),
+            "train.generation_mean_s": _result(gens.mean(), "s"),
+            "train.generation_max_s": _result(gens.max(), "s"),
+            "train.fits": _result(ev["fits"], "fits"),
+            "train.auc": _result(ev["metrics"]["auc"], "auc", "higher")}
+
+def bench_predict(client, df, target: str, sizes: List[int], repeats: int) -> Dict[str, Any]:
+    feats = df.drop(columns=[target])
+    out: Dict[str, Any] = {}
+    for n in sizes:
+        rows = feats.sample(n=n, replace=n > len(feats), random_state=n).to_dict(orient="records")
+        client.post("/predict", json=rows).raise_for_status()  # warm the champion cache
+        samples = []
+        for _ in range(max(5, repeats if n <= 100 else repeats // 10)):
+            t = time.perf_counter()
+            r = client.post("/predict", json=rows)
+            samples.append((time.perf_counter() - t) * 1000.0)
+            r.raise_for_status()
+        out.update(_percentiles(samples, f"predict.rows_{n}"))
+    return out
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Names (with numbers) of results that are worse than baseline by more than `threshold`."""
+    regressions = []
+    for name, cur in results["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base["value"]:
+            continue
+        ratio = cur["value"] / base["value"]
+        worse = ratio > 1 + threshold if cur["better"] == "lower" else ratio < 1 / (1 + threshold)
+        if worse:
+            regressions.append(f"{name}: {cur['value']:.4g} vs baseline {base['value']:.4g} {cur['unit']}")
+    return regressions
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--cols", type=int, default=20)
+    ap.add_argument("--balance", type=float, default=0.3, help="fraction of positive rows")
+    ap.add_argument("--trials", type=int, default=16)
+    ap.add_argument("--search-mode", default="full", choices=["full", "halving"])
+    ap.add_argument("--predict-sizes", default="1,100,10000")
+    ap.add_argument("--repeats", type=int, default=50, help="requests per /predict size (1/10th for large sizes)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", type=Path, default=RESULTS)
+    ap.add_argument("--baseline", type=Path, default=BASELINE)
+    ap.add_argument("--threshold", type=float, default=None,
+                    help=f"allowed relative regression (default {DEFAULT_THRESHOLD}); "
+                         "when given, a missing baseline is an error")
+    ap.add_argument("--save-baseline", action="store_true")
+    args = ap.parse_args(argv)
+
+    # The app reads its runtime dir and worker settings at import time.
+    os.environ["NG1_RUNTIME_DIR"] = tempfile.mkdtemp(prefix="ng1-bench-")
+    os.environ["NG1_EMBEDDED_WORKERS"] = "0"
+    sys.path.insert(0, str(HERE.parent))
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from .synthetic import make_dataset, to_csv_bytes
+
+    target = "target"
+    df = make_dataset(args.rows, args.cols, args.balance, args.seed, target)
+    csv = to_csv_bytes(df)
+    results: Dict[str, Any] = {}
+    with TestClient(app) as client:
+        up = bench_upload(client, csv, repeats=3)
+        dataset_id = up.pop("dataset_id")
+        results.update(up)
+        results.update(bench_parse(dataset_id, target, args.rows))
+        results.update(bench_training(dataset_id, target, args.trials, args.search_mode, args.seed))
+        sizes = [int(s) for s in args.predict_sizes.split(",") if s]
+        results.update(bench_predict(client, df, target, sizes, args.repeats))
+
+    report = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "git_rev": _git_rev(),
+                 "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+                 "rows": args.rows, "cols": args.cols, "balance": args.balance, "trials": args.trials,
+                 "search_mode": args.search_mode, "seed": args.seed},
+        "results": results,
+    }
+    args.out.write_text(json.dumps(report, indent=2))
+    for name, r in results.items():
+        print(f"{name:32s} {r['value']:>14.4f} {r['unit']}")
+    print(f"wrote {args.out}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"saved baseline {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        # A regression gate (CI) without a baseline would pass unchecked.
+        print(f"no baseline at {args.baseline} to compare against (run with --save-baseline)")
+        return 1 if args.threshold is not None else 0
+    threshold = DEFAULT_THRESHOLD if args.threshold is None else args.threshold
+    regressions = compare(report, json.loads(args.baseline.read_text()), threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
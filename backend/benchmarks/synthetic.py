@@ -0,0 +1,20 @@
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+from sklearn.datasets import make_classification
+
+def make_dataset(rows: int = 10000, cols: int = 20, balance: float = 0.5, seed: int = 0,
+                 target: str = "target") -> pd.DataFrame:
+    """
+    Binary classification frame with `cols` numeric features and a `balance`
+    fraction of positives. Deterministic for a given seed.
+    """
+    informative = max(2, cols // 2)
+    X, y = make_classification(n_samples=rows, n_features=cols, n_informative=min(informative, cols),
+                               n_redundant=0, weights=[1.0 - balance], flip_y=0.01, random_state=seed)
+    df = pd.DataFrame(X.astype(np.float32), columns=[f"f{i}" for i in range(cols)])
+    df[target] = y
+    return df
+
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    return df.to_csv(index=False).encode()
@@ -0,0 +1,9 @@
+from __future__ import annotations
+import os, sys, tempfile
+from pathlib import Path
+
+# The app reads its runtime dir at import time: point it at a throwaway one
+# before any app module is imported, and keep training workers out of tests.
+os.environ["NG1_RUNTIME_DIR"] = tempfile.mkdtemp(prefix="ng1-tests-")
+os.environ.setdefault("NG1_EMBEDDED_WORKERS", "0")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
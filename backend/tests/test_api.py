@@ -0,0 +1,176 @@
+from __future__ import annotations
+import io, uuid
+import numpy as np
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from joblib import dump
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from app.core import jobs, registry
+from app.core.storage import append_event, champion_file, model_dir_for, set_status
+
+FEATURES = ["a", "b", "c"]
+
+@pytest.fixture(autouse=True)
+def fresh_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "DB_PATH", tmp_path / "jobs.db")
+    monkeypatch.setattr(registry, "DB_PATH", tmp_path / "registry.db")
+    monkeypatch.setattr(registry, "_ready", False)
+    champion_file().unlink(missing_ok=True)
+    jobs.init_db()
+
+@pytest.fixture
+def client():
+    from app.main import app
+    with TestClient(app) as c:
+        yield c
+
+def _publish(seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(200, 3))
+    y = (X[:, seed % 3] > 0).astype(int)
+    pipe = Pipeline([("pre", StandardScaler()), ("clf", LogisticRegression())]).fit(X, y)
+    run_id = uuid.uuid4().hex[:12]
+    path = model_dir_for(run_id) / "pipeline.joblib"
+    dump(pipe, path)
+    manifest = registry.publish({"run_id": run_id, "metrics": {"auc": 0.9}, "model": {"family": "logreg"},
+                                 "features": FEATURES, "artifacts": {"pipeline": str(path)}})
+    return manifest["version"], pipe
+
+X = np.random.default_rng(9).normal(size=(5, 3))
+
+def test_batch_formats_agree_with_the_pipeline(client):
+    _, pipe = _publish()
+    expected = pipe.predict_proba(X)[:, 1]
+    columnar = client.post("/predict/batch", content=orjson.dumps({f: X[:, j].tolist() for j, f in enumerate(FEATURES)}),
+                           headers={"content-type": "application/json"})
+    np.testing.assert_allclose(columnar.json()["preds"], expected, rtol=1e-9)
+
+    buf = io.BytesIO()
+    np.save(buf, X.astype(np.float32), allow_pickle=False)       # any float dtype, scored as float64
+    npy = client.post("/predict/batch", content=buf.getvalue(),
+                      headers={"content-type": "application/x-npy", "accept": "application/x-npy"})
+    assert npy.headers["content-type"] == "application/x-npy"
+    expected32 = pipe.predict_proba(X.astype(np.float32).astype(np.float64))[:, 1]
+    np.testing.assert_allclose(np.load(io.BytesIO(npy.content)), expected32, rtol=1e-9)
+
+    raw = client.post("/predict/batch", content=X.astype("<f8").tobytes(),
+                      headers={"content-type": "application/octet-stream", "accept": "application/octet-stream"})
+    np.testing.assert_allclose(np.frombuffer(raw.content, dtype="<f8"), expected, rtol=1e-9)
+
+def test_batch_scores_a_pinned_version(client):
+    old, old_pipe = _publish(0)
+    _, new_pipe = _publish(1)
+    body = X.astype("<f8").tobytes()
+    headers = {"content-type": "application/octet-stream"}
+    champion = client.post("/predict/batch", content=body, headers=headers).json()["preds"]
+    pinned = client.post(f"/predict/batch?version={old}", content=body, headers=headers).json()["preds"]
+    np.testing.assert_allclose(champion, new_pipe.predict_proba(X)[:, 1], rtol=1e-9)
+    np.testing.assert_allclose(pinned, old_pipe.predict_proba(X)[:, 1], rtol=1e-9)
+    assert client.post("/predict/batch?version=999", content=body, headers=headers).status_code == 404
+
+@pytest.mark.parametrize("content_type, body", [
+    ("application/octet-stream", np.zeros(7, dtype="<f8").tobytes()),            # not whole 3-feature rows
+    ("application/json", b"[1, 2, 3]"),                                          # not an object
+    ("application/json", b'{"x": [1, 2]}'),                                      # none of the features
+    ("application/json", b'{"a": [1, NaN]}'),                                    # not JSON
+    ("application/octet-stream", np.array([[1.0, np.nan, 0.0]]).tobytes()),      # NaN for a pipeline without imputation
+])
+def test_bad_batch_payloads_are_422(client, content_type, body):
+    _publish()
+    r = client.post("/predict/batch", content=body, headers={"content-type": content_type})
+    assert r.status_code == 422, r.text
+
+def test_batch_without_a_champion_is_404(client):
+    assert client.post("/predict/batch", content=b"{}", headers={"content-type": "application/json"}).status_code == 404
+
+def _rows(X: np.ndarray):
+    return [dict(zip(FEATURES, map(float, row))) for row in X]
+
+def test_predict_rows_score_the_champion_or_a_pinned_model(client):
+    assert client.post("/predict", json=_rows(X)).json()["preds"] == []      # no champion yet
+    old, old_pipe = _publish(0)
+    new, new_pipe = _publish(1)
+    out = client.post("/predict", json=_rows(X)).json()
+    assert out["version"] == new
+    np.testing.assert_allclose(out["preds"], new_pipe.predict_proba(X)[:, 1], rtol=1e-9)
+    run_id = registry.get(old)["run_id"]
+    for query in (f"version={old}", f"run_id={run_id}"):
+        out = client.post(f"/predict?{query}", json=_rows(X)).json()
+        assert out["version"] == old
+        np.testing.assert_allclose(out["preds"], old_pipe.predict_proba(X)[:, 1], rtol=1e-9)
+    assert client.post("/predict?version=999", json=_rows(X)).status_code == 404
+
+def test_missing_features_default_to_zero(client):
+    _, pipe = _publish()
+    out = client.post("/predict", json=[{"a": 1.0}]).json()
+    np.testing.assert_allclose(out["preds"], pipe.predict_proba([[1.0, 0.0, 0.0]])[:, 1], rtol=1e-9)
+
+@pytest.mark.parametrize("rows", [[{"a": "x"}], [{"a": [1, 2]}], [{"a": None}]])
+def test_bad_rows_are_422(client, rows):
+    _publish()
+    r = client.post("/predict", json=rows)
+    assert r.status_code == 422 and "Invalid rows" in r.json()["detail"]
+
+def test_upload_endpoint_streams_the_file(client):
+    data = b"a,b,y\n1,2,0\n3,4,1\n"
+    meta = client.post("/datasets/upload", files={"file": ("d.csv", data, "text/csv")}).json()
+    assert meta["rows"] == 2 and meta["columns"] == ["a", "b", "y"] and meta["bytes"] == len(data)
+    assert client.post("/datasets/upload", files={"file": ("e.csv", b"", "text/csv")}).status_code == 500
+
+def test_status_pages_by_cursor_and_revalidates_with_etag(client):
+    run_id = uuid.uuid4().hex[:12]
+    set_status(run_id, "running")
+    for i in range(5):
+        append_event(run_id, "candidate", {"i": i})
+    first = client.get(f"/runs/{run_id}/status?limit=2")
+    page = first.json()
+    assert [e["data"]["i"] for e in page["events"]] == [0, 1]
+    rest = client.get(f"/runs/{run_id}/status?since={page['last_seq']}").json()
+    assert [e["data"]["i"] for e in rest["events"]] == [2, 3, 4]
+
+    etag = first.headers["etag"]
+    assert client.get(f"/runs/{run_id}/status", headers={"if-none-match": etag}).status_code == 304
+    append_event(run_id, "candidate", {"i": 5})
+    changed = client.get(f"/runs/{run_id}/status", headers={"if-none-match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+def _sse(text: str):
+    return [block for block in text.split("\n\n") if block.startswith(("id:", "event:"))]
+
+def test_event_stream_replays_resumes_and_ends_with_the_status(client):
+    run_id = uuid.uuid4().hex[:12]
+    for i in range(3):
+        append_event(run_id, "candidate", {"i": i})
+    set_status(run_id, "done")
+    blocks = _sse(client.get(f"/runs/{run_id}/events").text)
+    assert [b.split("\n")[0] for b in blocks[:3]] == ["id: 0", "id: 1", "id: 2"]
+    assert blocks[-1].startswith("event: status") and '"done"' in blocks[-1]
+    resumed = _sse(client.get(f"/runs/{run_id}/events", headers={"last-event-id": "1"}).text)
+    assert [b.split("\n")[0] for b in resumed] == ["id: 2", "event: status"]
+    assert client.get("/runs/no-such-run/events").status_code == 404
+
+def _samples(text: str):
+    return dict(line.rsplit(" ", 1) for line in text.splitlines() if line and not line.startswith("#"))
+
+def test_metrics_report_requests_batches_and_queue_depth(client):
+    _publish()
+    client.post("/predict", json=_rows(X))
+    jobs.enqueue(uuid.uuid4().hex[:12], {}, priority=0)
+    r = client.get("/metrics")
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = _samples(r.text)
+    assert float(samples['ng1_http_request_duration_seconds_count{route="/predict",method="POST"}']) >= 1
+    assert float(samples['ng1_predict_batch_rows_bucket{le="+Inf"}']) >= 1
+    assert float(samples['ng1_queue_depth{status="queued"}']) == 1
+
+def test_metrics_merge_worker_snapshots(tmp_path):
+    from app.core import telemetry
+    before = _samples(telemetry.render())
+    key = 'ng1_candidate_fit_seconds_count{family="rf"}'
+    series = {'["rf"]': [[1] + [0] * len(telemetry.FIT_BUCKETS), 0.005]}
+    (tmp_path / "999999.json").write_text(orjson.dumps({"ng1_candidate_fit_seconds": series}).decode())
+    merged = _samples(telemetry.render(tmp_path))
+    assert float(merged[key]) == float(before.get(key, 0)) + 1
@@ -0,0 +1,50 @@
+from __future__ import annotations
+import asyncio
+import numpy as np
+from app.core.batching import MicroBatcher
+
+class _Model:
+    """Stands in for a LoadedChampion: scores a row as its first feature."""
+    def __init__(self, key, fail: bool = False):
+        self.key, self.fail, self.calls = key, fail, []
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        self.calls.append(X.shape[0])
+        if self.fail:
+            raise RuntimeError("boom")
+        return X[:, 0].copy()
+
+def _rows(start: int, n: int = 1) -> np.ndarray:
+    return np.arange(start, start + n, dtype=np.float64)[:, None].repeat(3, axis=1)
+
+def _gather(batcher: MicroBatcher, calls):
+    async def main():
+        return await asyncio.gather(*(batcher.submit(m, X) for m, X in calls), return_exceptions=True)
+    return asyncio.run(main())
+
+def test_concurrent_requests_share_one_predict_call():
+    model, batcher = _Model("v1"), MicroBatcher(max_wait_ms=20, max_rows=1000)
+    out = _gather(batcher, [(model, _rows(i * 10, n)) for i, n in enumerate([1, 3, 2])])
+    assert model.calls == [6]
+    for i, (n, preds) in enumerate(zip([1, 3, 2], out)):
+        np.testing.assert_array_equal(preds, np.arange(i * 10, i * 10 + n))
+    assert batcher.stats.snapshot()["batches"] == 1 and batcher.stats.requests == 3
+
+def test_full_batch_flushes_before_the_deadline():
+    model, batcher = _Model("v1"), MicroBatcher(max_wait_ms=10_000, max_rows=4)
+    out = _gather(batcher, [(model, _rows(i, 2)) for i in range(4)])
+    assert model.calls == [4, 4]
+    assert [len(p) for p in out] == [2, 2, 2, 2]
+
+def test_requests_are_grouped_by_model():
+    old, new = _Model("v1"), _Model("v2")
+    batcher = MicroBatcher(max_wait_ms=20, max_rows=1000)
+    out = _gather(batcher, [(old, _rows(0)), (new, _rows(1)), (old, _rows(2))])
+    assert old.calls == [2] and new.calls == [1]
+    assert [p.tolist() for p in out] == [[0.0], [1.0], [2.0]]
+
+def test_errors_reach_every_caller_in_the_batch():
+    model, batcher = _Model("v1", fail=True), MicroBatcher(max_wait_ms=20, max_rows=1000)
+    out = _gather(batcher, [(model, _rows(0)), (model, _rows(1))])
+    assert model.calls == [2]
+    assert all(isinstance(e, RuntimeError) for e in out)
@@ -0,0 +1,34 @@
+from __future__ import annotations
+import json
+import pytest
+from app.core import registry
+from app.core.storage import champion_file
+from benchmarks import run
+
+def _report(**values) -> dict:
+    return {"results": {name: {"value": v, "unit": "ms", "better": "lower" if name.endswith("_ms") else "higher"}
+                        for name, v in values.items()}}
+
+def test_compare_flags_only_regressions_beyond_the_threshold():
+    baseline = _report(p50_ms=10.0, rows_per_s=1000.0, new_ms=5.0)
+    assert run.compare(_report(p50_ms=12.0, rows_per_s=900.0), baseline, 0.25) == []
+    slow = run.compare(_report(p50_ms=13.0, rows_per_s=700.0, unknown_ms=1.0), baseline, 0.25)
+    assert [line.split(":")[0] for line in slow] == ["p50_ms", "rows_per_s"]
+
+@pytest.fixture
+def tiny_run(tmp_path, monkeypatch):
+    # main() points NG1_RUNTIME_DIR at a fresh temp dir; keep that out of the other tests.
+    monkeypatch.setenv("NG1_RUNTIME_DIR", str(tmp_path))
+    monkeypatch.setattr(registry, "DB_PATH", tmp_path / "registry.db")
+    monkeypatch.setattr(registry, "_ready", False)
+    args = ["--rows", "300", "--cols", "4", "--trials", "4", "--predict-sizes", "1", "--repeats", "2",
+            "--out", str(tmp_path / "results.json"), "--baseline", str(tmp_path / "baseline.json")]
+    yield lambda *extra: run.main(args + list(extra))
+    champion_file().unlink(missing_ok=True)
+
+def test_missing_baseline_fails_only_an_explicit_gate(tiny_run, tmp_path):
+    assert tiny_run() == 0
+    assert tiny_run("--threshold", "0.25") == 1
+    assert tiny_run("--save-baseline") == 0
+    report = json.loads((tmp_path / "baseline.json").read_text())
+    assert report["meta"]["rows"] == 300 and "predict.rows_1.p50_ms" in report["results"]
@@ -0,0 +1,72 @@
+from __future__ import annotations
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from app.core.compiled import CompiledModel, _sigmoid, compile_pipeline, max_abs_diff
+
+def _data(n: int = 600, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 5)) * [1, 10, 0.1, 3, 1] + [0, 5, 0, -2, 1]
+    y = ((X[:, 0] + X[:, 1] / 10 - X[:, 3] / 3 + rng.normal(size=n) * 0.5) > 0).astype(int)
+    return X, y
+
+PIPELINES = {
+    "logreg": lambda: Pipeline([("pre", StandardScaler()), ("clf", LogisticRegression(max_iter=1000))]),
+    "sgd": lambda: Pipeline([("pre", StandardScaler()), ("clf", SGDClassifier(loss="log_loss", random_state=0))]),
+    "rf": lambda: Pipeline([("pre", "passthrough"), ("clf", RandomForestClassifier(30, max_depth=8, random_state=0))]),
+    "gb": lambda: Pipeline([("pre", "passthrough"), ("clf", GradientBoostingClassifier(n_estimators=40, random_state=0))]),
+    "gb-zero-init": lambda: Pipeline([("pre", "passthrough"),
+                                      ("clf", GradientBoostingClassifier(n_estimators=40, init="zero", random_state=0))]),
+}
+
+@pytest.mark.parametrize("name", sorted(PIPELINES))
+def test_compiled_matches_sklearn(name, tmp_path):
+    X, y = _data()
+    pipe = PIPELINES[name]().fit(X, y)
+    compiled = compile_pipeline(pipe)
+    assert compiled is not None
+    Xtest, _ = _data(300, seed=1)
+    assert max_abs_diff(compiled, pipe, Xtest) < 1e-9
+    # Saved as .npy arrays and memory-mapped back: same scores.
+    compiled.save(tmp_path / "compiled")
+    loaded = CompiledModel.load(tmp_path / "compiled", mmap=True)
+    np.testing.assert_array_equal(loaded.predict_positive(Xtest), compiled.predict_positive(Xtest))
+
+def test_imputer_step_is_compiled():
+    X, y = _data()
+    means = X.mean(axis=0)
+    pipe = Pipeline([("impute", SimpleImputer(strategy="mean").fit(means[None, :])),
+                     ("pre", StandardScaler()), ("clf", SGDClassifier(loss="log_loss", random_state=0))]).fit(X, y)
+    compiled = compile_pipeline(pipe)
+    Xtest, _ = _data(50, seed=2)
+    Xtest[::3, 1] = np.nan
+    p = compiled.predict_positive(Xtest)
+    assert np.isfinite(p).all()
+    np.testing.assert_allclose(p, pipe.predict_proba(Xtest)[:, 1], atol=1e-9)
+
+def test_unsupported_models_are_not_compiled():
+    X, y = _data()
+    pipe = Pipeline([("pre", "passthrough"), ("clf", SGDClassifier(loss="hinge", random_state=0))]).fit(X, y)
+    assert compile_pipeline(pipe) is None
+
+def test_feature_dependent_boosting_init_is_not_compiled():
+    X, y = _data()
+    clf = GradientBoostingClassifier(n_estimators=10, init=LogisticRegression(), random_state=0)
+    assert compile_pipeline(Pipeline([("pre", "passthrough"), ("clf", clf)]).fit(X, y)) is None
+
+def test_sigmoid_is_stable_at_the_extremes():
+    z = np.array([-1000.0, -40.0, 0.0, 40.0, 1000.0])
+    with np.errstate(over="raise", invalid="raise", divide="raise"):
+        p = _sigmoid(z)
+    assert p[0] == 0.0 and p[2] == 0.5 and p[4] == 1.0
+    np.testing.assert_allclose(p[1:4], 1 / (1 + np.exp(-z[1:4])), rtol=1e-12)
+
+def test_wrong_width_is_rejected():
+    X, y = _data()
+    compiled = compile_pipeline(PIPELINES["logreg"]().fit(X, y))
+    with pytest.raises(ValueError):
+        compiled.predict_positive(X[:, :3])
@@ -0,0 +1,108 @@
+from __future__ import annotations
+import uuid
+import numpy as np
+import pandas as pd
+import pytest
+from app import worker
+from app.core import jobs, registry, training
+from app.core.schemas import RunRequest
+from app.core.storage import DATA_DIR, RunIndex, champion_file
+
+@pytest.fixture(autouse=True)
+def fresh_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "DB_PATH", tmp_path / "jobs.db")
+    monkeypatch.setattr(registry, "DB_PATH", tmp_path / "registry.db")
+    monkeypatch.setattr(registry, "_ready", False)
+    champion_file().unlink(missing_ok=True)
+    jobs.init_db()
+
+def _enqueue(priority: int = 0, payload=None) -> str:
+    run_id = uuid.uuid4().hex[:12]
+    jobs.enqueue(run_id, payload or {}, priority)
+    return run_id
+
+def test_claim_takes_highest_priority_then_oldest():
+    low, first, second = _enqueue(0), _enqueue(5), _enqueue(5)
+    assert [jobs.claim("w")["run_id"] for _ in range(3)] == [first, second, low]
+    assert jobs.claim("w") is None
+
+def test_heartbeat_and_finish_are_fenced_by_worker():
+    run_id = _enqueue()
+    jobs.claim("a")
+    assert jobs.heartbeat(run_id, "a") and jobs.owns(run_id, "a")
+    assert not jobs.heartbeat(run_id, "b") and not jobs.owns(run_id, "b")
+    assert not jobs.finish(run_id, "done", "b")
+    assert jobs.finish(run_id, "done", "a")
+    assert jobs.get_job(run_id)["status"] == "done"
+
+def test_stale_runs_are_requeued_then_failed():
+    run_id = _enqueue()
+    for attempt in range(1, jobs.MAX_ATTEMPTS + 1):
+        assert jobs.claim(f"w{attempt}")["attempt"] == attempt
+        expected = "queued" if attempt < jobs.MAX_ATTEMPTS else "error"
+        assert jobs.recover_stale(stale_after=-1) == [(run_id, expected)]
+    assert jobs.get_job(run_id)["worker"] is None
+
+def test_live_runs_are_not_recovered():
+    _enqueue()
+    jobs.claim("w")
+    assert jobs.recover_stale(stale_after=60) == []
+
+def test_cancel_queued_and_running():
+    queued, running = _enqueue(), _enqueue(1)
+    jobs.claim("w")
+    assert jobs.request_cancel(queued) == "cancelled"
+    assert jobs.claim("w2") is None
+    assert jobs.request_cancel(running) == "running"
+    assert jobs.cancel_requested(running)
+    # A cancel request is not a lost lease: the worker keeps heartbeating until it stops.
+    assert jobs.heartbeat(running, "w")
+    assert jobs.request_cancel("no-such-run") is None
+
+@pytest.fixture
+def dataset_id():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 3))
+    df = pd.DataFrame(X, columns=["a", "b", "c"])
+    df["y"] = (X[:, 0] + rng.normal(size=300) * 0.5 > 0).astype(int)
+    dataset_id = f"{uuid.uuid4().hex}.csv"
+    df.to_csv(DATA_DIR / dataset_id, index=False)
+    return dataset_id
+
+def _steal(run_id: str):
+    """Another worker recovers the run as stale and claims it."""
+    assert jobs.recover_stale(stale_after=-1) == [(run_id, "queued")]
+    assert jobs.claim("b")["run_id"] == run_id
+
+@pytest.mark.parametrize("stolen_at", ["claim", "eval"])
+def test_stale_worker_writes_nothing_after_losing_its_lease(dataset_id, monkeypatch, stolen_at):
+    req = RunRequest(dataset_id=dataset_id, target="y", n_trials=4)
+    run_id = _enqueue(payload=req.model_dump())
+    jobs.claim("a")
+    if stolen_at == "claim":
+        _steal(run_id)
+    else:
+        # Lease taken over after the search, just before the model would be published.
+        real_append = training.append_event
+        def append_event(rid, kind, data):
+            real_append(rid, kind, data)
+            if kind == "eval":
+                _steal(rid)
+        monkeypatch.setattr(training, "append_event", append_event)
+    lease = worker._Lease(run_id, "a")
+    assert worker.run_job(run_id, req, "a", lease) is None
+    assert lease.lost
+    assert registry.champion_version() is None
+    events = RunIndex().events(run_id)
+    if stolen_at == "claim":
+        assert events is None
+    else:
+        assert events["status"] == "running"
+        assert not {"cancelled", "deploy", "error"} & {e["stage"] for e in events["events"]}
+    assert jobs.get_job(run_id)["worker"] == "b"
+
+    # The new owner trains and publishes normally.
+    monkeypatch.setattr(training, "append_event", worker.append_event)
+    assert worker.run_job(run_id, req, "b", worker._Lease(run_id, "b")) == "done"
+    assert jobs.finish(run_id, "done", "b")
+    assert registry.get(registry.champion_version())["run_id"] == run_id
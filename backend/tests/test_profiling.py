@@ -0,0 +1,47 @@
+from __future__ import annotations
+import time
+import numpy as np
+from app.core.profiling import Measure, RunProfile, StackSampler, merge
+
+def test_nested_measures_credit_inner_peaks_to_the_outer_block():
+    with Measure() as outer:
+        with Measure() as inner:
+            block = np.ones(32 * 1024 * 1024 // 8)      # ~32 MB touched inside the inner block
+            del block
+    assert inner.peak_rss_mb > 0
+    assert outer.peak_rss_mb >= inner.peak_rss_mb
+    assert outer.wall_s >= inner.wall_s
+
+def test_run_profile_accumulates_stages():
+    prof = RunProfile()
+    for _ in range(2):
+        with prof.stage("fit"):
+            time.sleep(0.01)
+    with prof.stage("dump"):
+        pass
+    summary = prof.summary()
+    assert summary["stages"]["fit"]["count"] == 2 and summary["stages"]["fit"]["wall_s"] >= 0.02
+    assert summary["peak_rss_mb"] == round(max(s["peak_rss_mb"] for s in summary["stages"].values()), 1)
+
+def test_merge_adds_times_and_keeps_the_peak():
+    a = {"fit": {"wall_s": 1.0, "cpu_s": 0.5, "peak_rss_mb": 100.0}}
+    b = {"fit": {"wall_s": 2.0, "cpu_s": 1.5, "peak_rss_mb": 80.0}, "score": {"wall_s": 0.1, "cpu_s": 0.1, "peak_rss_mb": 10.0}}
+    out = merge(a, b)
+    assert out["fit"] == {"wall_s": 3.0, "cpu_s": 2.0, "peak_rss_mb": 100.0}
+    assert out["score"]["wall_s"] == 0.1 and a["fit"]["wall_s"] == 1.0
+
+def _busy(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def test_stack_sampler_writes_collapsed_stacks(tmp_path):
+    sampler = StackSampler(interval=0.001)
+    sampler.start()
+    _busy(0.1)
+    sampler.stop()
+    sampler.save(tmp_path / "stacks.txt")
+    lines = (tmp_path / "stacks.txt").read_text().splitlines()
+    assert lines and any("test_profiling.py:_busy" in line for line in lines)
+    stack, n = lines[0].rsplit(" ", 1)
+    assert int(n) >= 1 and ";" in stack
@@ -0,0 +1,87 @@
+from __future__ import annotations
+import json, uuid
+import pytest
+from app.core import registry
+from app.core.storage import champion_file, model_dir_for
+
+@pytest.fixture(autouse=True)
+def fresh_registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, "DB_PATH", tmp_path / "registry.db")
+    monkeypatch.setattr(registry, "_ready", False)
+    champion_file().unlink(missing_ok=True)
+
+def _manifest(auc: float = 0.8) -> dict:
+    run_id = uuid.uuid4().hex[:12]
+    model_dir_for(run_id)
+    return {"run_id": run_id, "metrics": {"auc": auc}, "model": {"family": "logreg"},
+            "features": ["a", "b"], "artifacts": {"pipeline": f"run_{run_id}/pipeline.joblib"}}
+
+def _published() -> int:
+    return json.loads(champion_file().read_text())["version"]
+
+def test_publish_registers_and_promotes():
+    m = registry.publish(_manifest())
+    assert m["version"] == registry.champion_version() == _published()
+    assert registry.get(m["version"])["run_id"] == m["run_id"]
+
+def test_rollback_walks_the_promotion_chain():
+    v1 = registry.publish(_manifest())["version"]
+    v2 = registry.publish(_manifest())["version"]
+    v3 = registry.publish(_manifest())["version"]
+    registry.promote(v1)
+    assert registry.champion_version() == v1
+    assert registry.rollback()["version"] == v3
+    assert registry.rollback()["version"] == v2
+    assert registry.rollback()["version"] == v1
+    assert registry.rollback() is None
+    assert registry.champion_version() == _published() == v1
+
+def test_promote_unknown_version():
+    with pytest.raises(KeyError):
+        registry.promote(12345)
+
+def test_agent_versions_cannot_be_promoted():
+    champion = registry.publish(_manifest())["version"]
+    agents = registry.register({"run_id": "agents-run", "source": "agents", "metrics": {}, "artifacts": {}})
+    with pytest.raises(ValueError):
+        registry.promote(agents)
+    assert registry.champion_version() == champion
+
+def test_versions_without_features_cannot_be_promoted():
+    m = _manifest()
+    del m["features"]
+    version = registry.register(m)
+    with pytest.raises(ValueError):
+        registry.promote(version)
+
+def test_gc_keeps_newest_champion_and_rollback_targets():
+    versions = [registry.publish(_manifest())["version"] for _ in range(6)]
+    registry.promote(versions[0])   # champion is the oldest; its rollback target is the newest
+    deleted = registry.gc(keep=1)
+    kept = {v for v in versions if v not in deleted}
+    assert kept == {versions[0], versions[-1]}
+    statuses = {i["version"]: i["status"] for i in registry.list_versions()["items"]}
+    assert {v for v, s in statuses.items() if s == "deleted"} == set(deleted)
+    for v in deleted:
+        assert not (champion_file().parent / f"run_{registry.get(v)['run_id']}").exists()
+        with pytest.raises(KeyError):
+            registry.promote(v)
+    assert registry.rollback()["version"] == versions[-1]
+
+def test_list_versions_pages_newest_first():
+    versions = [registry.publish(_manifest())["version"] for _ in range(5)]
+    page = registry.list_versions(limit=2)
+    assert [i["version"] for i in page["items"]] == versions[::-1][:2]
+    rest = registry.list_versions(before=page["next_before"], limit=10)
+    assert [i["version"] for i in rest["items"]] == versions[::-1][2:]
+    assert rest["next_before"] is None
+
+def test_gc_keeps_the_best_scoring_versions():
+    aucs = [0.70, 0.95, 0.60, 0.90, 0.65, 0.75]
+    versions = [registry.publish(_manifest(auc))["version"] for auc in aucs]
+    deleted = registry.gc(keep=1, keep_best=2)
+    kept = {v for v in versions if v not in deleted}
+    # Newest (the champion), its rollback target, and the two best by AUC.
+    assert kept == {versions[-1], versions[-2], versions[1], versions[3]}
+    listed = {i["version"]: i["auc"] for i in registry.list_versions()["items"]}
+    assert [listed[v] for v in versions] == aucs
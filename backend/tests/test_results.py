@@ -0,0 +1,94 @@
+from __future__ import annotations
+import io, uuid
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.core import jobs, registry, results
+from app.core.storage import RunIndex, champion_file, model_dir_for, save_dataset_stream
+
+@pytest.fixture(autouse=True)
+def fresh_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "DB_PATH", tmp_path / "jobs.db")
+    monkeypatch.setattr(registry, "DB_PATH", tmp_path / "registry.db")
+    monkeypatch.setattr(registry, "_ready", False)
+    monkeypatch.setattr(results, "RESULTS_DIR", tmp_path)
+    champion_file().unlink(missing_ok=True)
+    jobs.init_db()
+
+def _upload(data: bytes) -> str:
+    dataset_id = f"{uuid.uuid4().hex}.csv"
+    save_dataset_stream(io.BytesIO(data), dataset_id)
+    return dataset_id
+
+def _csv(seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.normal(size=(50, 2)), columns=["a", "b"])
+    df["y"] = rng.integers(0, 2, 50)
+    return df.to_csv(index=False).encode()
+
+def _request(dataset_id: str, **kw) -> dict:
+    return {"dataset_id": dataset_id, "target": "y", "n_trials": 12, "search_mode": "full",
+            "cv_folds": 5, "memory_mb": None, "priority": 0, "profile": False, "force": False, **kw}
+
+def _published(auc: float = 0.8) -> dict:
+    run_id = uuid.uuid4().hex[:12]
+    path = model_dir_for(run_id) / "pipeline.joblib"
+    path.write_bytes(b"")
+    return registry.publish({"run_id": run_id, "metrics": {"auc": auc}, "model": {"family": "logreg"},
+                             "features": ["a", "b"], "artifacts": {"pipeline": str(path)}})
+
+def test_result_key_follows_content_and_search_config():
+    dataset_id = _upload(_csv(0))
+    key = results.result_key(_request(dataset_id))
+    assert key is not None
+    assert results.result_key(_request(_upload(_csv(0)))) == key     # same bytes, new upload
+    assert results.result_key(_request(dataset_id, priority=5, profile=True)) == key
+    assert results.result_key(_request(dataset_id, cv_folds=3)) == key  # only used in cv mode
+    assert results.result_key(_request(dataset_id, n_trials=20)) != key
+    assert results.result_key(_request(dataset_id, search_mode="cv", cv_folds=3)) != \
+        results.result_key(_request(dataset_id, search_mode="cv", cv_folds=5))
+    assert results.result_key(_request(_upload(_csv(1)))) != key
+    assert results.result_key(_request("never-uploaded.csv")) is None
+
+def test_reuse_finishes_the_run_without_touching_the_champion():
+    dataset_id = _upload(_csv())
+    req = _request(dataset_id)
+    cached = _published(auc=0.7)
+    results.store(results.result_key(req), cached)
+    champion = _published(auc=0.9)["version"]
+
+    run_id = uuid.uuid4().hex[:12]
+    assert results.reuse(run_id, {**req, "force": True}) is None
+    manifest = results.reuse(run_id, req)
+    assert manifest["version"] == cached["version"]
+    assert registry.champion_version() == champion
+    status = RunIndex().events(run_id)
+    assert status["status"] == "done"
+    hit = status["events"][-1]
+    assert hit["stage"] == "cache_hit" and hit["data"]["version"] == cached["version"]
+    assert hit["data"]["champion"] is False
+
+def test_results_with_missing_artifacts_are_dropped():
+    req = _request(_upload(_csv()))
+    key = results.result_key(req)
+    cached = _published()
+    results.store(key, cached)
+    (model_dir_for(cached["run_id"]) / "pipeline.joblib").unlink()
+    assert results.reuse(uuid.uuid4().hex[:12], req) is None
+    assert not (results.RESULTS_DIR / f"{key}.json").exists()
+
+def test_cached_run_completes_at_start_and_reports_done_on_cancel():
+    from app.main import app
+    req = _request(_upload(_csv()))
+    cached = _published(auc=0.7)
+    results.store(results.result_key(req), cached)
+    champion = _published(auc=0.9)["version"]
+    with TestClient(app) as c:
+        out = c.post("/runs/start", json=req).json()
+        assert out["cached"] and out["manifest"]["run_id"] == cached["run_id"]
+        assert c.get(f"/runs/{out['run_id']}/status").json()["status"] == "done"
+        r = c.post(f"/runs/{out['run_id']}/cancel")
+        assert r.status_code == 200 and r.json()["job_status"] == "done"
+        assert c.post("/runs/no-such-run/cancel").status_code == 404
+    assert registry.champion_version() == champion
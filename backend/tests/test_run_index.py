@@ -0,0 +1,79 @@
+from __future__ import annotations
+import multiprocessing, threading, uuid
+from app.core.storage import RunIndex, append_event, read_status, set_status
+
+def _run(n_events: int) -> str:
+    run_id = uuid.uuid4().hex[:12]
+    set_status(run_id, "queued")
+    for i in range(n_events):
+        append_event(run_id, "step", {"i": i})
+    return run_id
+
+def test_since_returns_only_newer_events():
+    run_id = _run(5)
+    out = RunIndex().events(run_id, since=2)
+    assert [e["seq"] for e in out["events"]] == [3, 4]
+    assert out["last_seq"] == 4
+    assert out["status"] == "queued"
+
+def test_limit_pages_forward_without_gaps():
+    run_id = _run(7)
+    index = RunIndex()
+    seen, since = [], -1
+    while True:
+        page = index.events(run_id, since=since, limit=3)
+        if not page["events"]:
+            break
+        assert len(page["events"]) <= 3
+        seen += [e["data"]["i"] for e in page["events"]]
+        since = page["last_seq"]
+    assert seen == list(range(7))
+    assert since == 6
+
+def test_events_appended_after_a_read_are_picked_up():
+    run_id = _run(2)
+    index = RunIndex()
+    first = index.events(run_id)
+    append_event(run_id, "step", {"i": 2})
+    set_status(run_id, "done")
+    more = index.events(run_id, since=first["last_seq"])
+    assert [e["data"]["i"] for e in more["events"]] == [2]
+    assert more["status"] == "done"
+
+def test_empty_page_keeps_the_cursor():
+    run_id = _run(3)
+    out = RunIndex().events(run_id, since=2, limit=10)
+    assert out["events"] == [] and out["last_seq"] == 2
+
+def test_unknown_run():
+    assert RunIndex().events("no-such-run") is None
+
+def _append_many(run_id: str, n: int, tag: str):
+    for i in range(n):
+        append_event(run_id, tag, {"i": i})
+
+def test_concurrent_appends_get_unique_consecutive_seqs():
+    run_id = _run(1)
+    threads = [threading.Thread(target=_append_many, args=(run_id, 50, f"t{k}")) for k in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # Another process appends to the same log; this one must recount, not reuse its cached seq.
+    child = multiprocessing.get_context("fork").Process(target=_append_many, args=(run_id, 20, "child"))
+    child.start()
+    child.join()
+    append_event(run_id, "step", {"i": "last"})
+    events = RunIndex().events(run_id)["events"]
+    assert [e["seq"] for e in events] == list(range(1 + 200 + 20 + 1))
+    for k in range(4):
+        assert [e["data"]["i"] for e in events if e["stage"] == f"t{k}"] == list(range(50))
+    assert events[-1]["data"]["i"] == "last"
+
+def test_first_event_without_a_status_marks_the_run_running():
+    run_id = uuid.uuid4().hex[:12]
+    append_event(run_id, "start", {})
+    assert read_status(run_id) == "running"
+    queued = _run(0)
+    append_event(queued, "start", {})
+    assert read_status(queued) == "queued"
@@ -0,0 +1,29 @@
+from __future__ import annotations
+import uuid
+import numpy as np
+import pandas as pd
+import pytest
+from app.agents import search_optuna
+from app.agents.prep_basic import PrepBasic
+from app.agents.search_optuna import SearchOptuna
+
+@pytest.fixture
+def ctx(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_optuna, "OPTUNA_DB", tmp_path / "optuna.db")
+    monkeypatch.setattr(search_optuna, "OPTUNA_FOLDS", 2)
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(120, 3))
+    df = pd.DataFrame(X, columns=["a", "b", "c"])
+    df["y"] = (X[:, 0] + rng.normal(size=120) * 0.5 > 0).astype(int)
+    return lambda: PrepBasic().run({"df": df, "target": "y", "dataset_hash": uuid.uuid4().hex, "n_trials": 2})
+
+def test_repeated_search_runs_new_trials(ctx):
+    first = ctx()
+    summary = SearchOptuna().run(first)["search_summary"]
+    assert summary["prior_trials"] == 0 and summary["trials"] == 2
+    assert summary["study"].endswith(f"-k2-s{search_optuna.SEARCH_SPACE_VERSION}")
+    # Same data and target: the study is reused and tops up n_trials more.
+    again = {**ctx(), "dataset_hash": first["dataset_hash"]}
+    summary = SearchOptuna().run(again)["search_summary"]
+    assert summary["prior_trials"] == 2 and summary["trials"] == 4
+    assert again["fitted_pipeline"].predict_proba(again["X"]).shape == (120, 2)
@@ -0,0 +1,112 @@
+from __future__ import annotations
+import threading, uuid
+import numpy as np
+import pytest
+from joblib import dump
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from app.core import registry, serving
+from app.core.serving import ChampionCache, ModelPool
+from app.core.storage import champion_file, model_dir_for, save_champion
+
+@pytest.fixture(autouse=True)
+def fresh_registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, "DB_PATH", tmp_path / "registry.db")
+    monkeypatch.setattr(registry, "_ready", False)
+    champion_file().unlink(missing_ok=True)
+
+def _version(seed: int = 0) -> int:
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(200, 3))
+    y = (X[:, 0] > 0).astype(int)
+    pipe = Pipeline([("pre", StandardScaler()), ("clf", LogisticRegression())]).fit(X, y)
+    run_id = uuid.uuid4().hex[:12]
+    path = model_dir_for(run_id) / "pipeline.joblib"
+    dump(pipe, path)
+    return registry.register({"run_id": run_id, "metrics": {"auc": 0.9}, "model": {"family": "logreg"},
+                              "features": ["a", "b", "c"], "artifacts": {"pipeline": str(path)}})
+
+def _resident_bytes(pool: ModelPool) -> int:
+    return sum(size for _, size in pool._models.values())
+
+def test_concurrent_gets_load_each_version_once(monkeypatch):
+    versions = [_version(i) for i in range(3)]
+    loads = []
+    real_load = serving.load_artifact
+    monkeypatch.setattr(serving, "load_artifact", lambda path: loads.append(path) or real_load(path))
+    pool = ModelPool(max_models=8, max_mb=64)
+    start = threading.Barrier(12)
+
+    def worker(i):
+        start.wait()
+        for _ in range(20):
+            pool.get(versions[i % 3])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(loads) == 3
+    assert set(pool._models) == set(versions)
+    assert pool._bytes == _resident_bytes(pool)
+    assert not pool._loading
+
+def test_eviction_keeps_byte_count_in_step():
+    versions = [_version(i) for i in range(5)]
+    pool = ModelPool(max_models=2, max_mb=64)
+    for v in versions + versions[:2]:
+        pool.get(v)
+    assert list(pool._models) == versions[:2]
+    assert pool._bytes == _resident_bytes(pool)
+
+def test_unknown_version_is_a_key_error():
+    pool = ModelPool()
+    with pytest.raises(KeyError):
+        pool.get(9999)
+    assert pool._bytes == 0 and not pool._loading
+
+def test_champion_cache_reloads_only_when_the_champion_changes(monkeypatch):
+    v1, v2 = _version(0), _version(1)
+    loads = []
+    real_load = serving.load_artifact
+    monkeypatch.setattr(serving, "load_artifact", lambda path: loads.append(path) or real_load(path))
+    cache = ChampionCache()
+    with pytest.raises(FileNotFoundError):
+        cache.get()
+    save_champion({**registry.get(v1), "version": v1})
+    first = cache.get()
+    assert cache.get() is first and len(loads) == 1
+    save_champion({**registry.get(v2), "version": v2})
+    second = cache.get()
+    assert second.manifest["version"] == v2 and len(loads) == 2
+    # Callers holding the old champion keep a working model.
+    X = np.zeros((2, 3))
+    assert first.predict(X).shape == second.predict(X).shape == (2,)
+    # Rewriting the same champion swaps the manifest but keeps the loaded pipeline.
+    save_champion({**registry.get(v2), "version": v2, "note": "re-published"})
+    third = cache.get()
+    assert third.pipeline is second.pipeline and len(loads) == 2
+
+def test_compiled_champion_is_served_from_memory_maps(monkeypatch):
+    from app.core.compiled import CompiledModel
+    from app.core.training import export_champion
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 3))
+    pipe = Pipeline([("pre", StandardScaler()), ("clf", LogisticRegression())]).fit(X, (X[:, 0] > 0).astype(int))
+    run_id = uuid.uuid4().hex[:12]
+    mdir = model_dir_for(run_id)
+    dump(pipe, mdir / "pipeline.joblib")
+    manifest = {"run_id": run_id, "metrics": {"auc": 0.9}, "model": {"family": "logreg"}, "features": ["a", "b", "c"],
+                "artifacts": {"pipeline": str(mdir / "pipeline.joblib")}}
+    export_champion(mdir, manifest, pipe, X)
+    assert manifest["mmap"] == ["compiled"]
+
+    loaded = ChampionCache().get()
+    assert isinstance(loaded.pipeline, CompiledModel)
+    assert all(isinstance(a, np.memmap) for a in loaded.pipeline.arrays.values() if a.ndim)
+    np.testing.assert_allclose(loaded.predict(X), pipe.predict_proba(X)[:, 1], rtol=1e-9)
+    monkeypatch.setattr(serving, "MMAP_ARTIFACTS", False)
+    copied = serving.load_artifact(manifest["artifacts"]["compiled"])
+    assert not any(isinstance(a, np.memmap) for a in copied.arrays.values())
@@ -0,0 +1,88 @@
+from __future__ import annotations
+import hashlib, io, threading, uuid
+import numpy as np
+import pandas as pd
+import pytest
+from app.core import storage
+from app.core.storage import (DATA_DIR, column_cache_dir, load_columns, load_dataset_meta,
+                              load_training_frame, save_dataset_stream)
+
+def _upload(data: bytes, chunk_size: int) -> dict:
+    return save_dataset_stream(io.BytesIO(data), f"{uuid.uuid4().hex}.csv", chunk_size=chunk_size)
+
+CSVS = {
+    "plain": b"a,b,y\n1,2,0\n3,4,1\n5,6,0\n",
+    "no-trailing-newline": b"a,b,y\n1,2,0\n3,4,1",
+    "crlf": b"a,b,y\r\n1,2,0\r\n3,4,1\r\n",
+    "quoted-newlines": b'a,note,y\n1,"two\nlines",0\n2,"three\r\nline\nnote",1\n3,plain,0\n',
+    "blank-lines": b"a,b,y\n1,2,0\n\n3,4,1\n\n",
+    "utf8": "a,label,y\n1,café über,0\n2,日本,1\n".encode(),
+}
+
+@pytest.mark.parametrize("name", sorted(CSVS))
+@pytest.mark.parametrize("chunk_size", [1, 5, 1 << 20])
+def test_upload_counts_csv_records(name, chunk_size):
+    data = CSVS[name]
+    meta = _upload(data, chunk_size)
+    assert meta["rows"] == len(pd.read_csv(io.BytesIO(data)))
+    assert meta["bytes"] == len(data)
+    assert meta["content_hash"] == hashlib.blake2b(data, digest_size=16).hexdigest()
+    assert (DATA_DIR / meta["dataset_id"]).read_bytes() == data
+    assert load_dataset_meta(meta["dataset_id"]) == meta
+
+def test_upload_sniffs_the_schema_from_the_first_chunk():
+    meta = _upload(CSVS["quoted-newlines"], 1 << 20)
+    assert meta["columns"] == ["a", "note", "y"]
+    assert meta["dtypes"]["a"] == "int64" and meta["dtypes"]["note"] != "int64"
+
+def test_empty_upload_leaves_nothing_behind():
+    dataset_id = f"{uuid.uuid4().hex}.csv"
+    with pytest.raises(ValueError):
+        save_dataset_stream(io.BytesIO(b""), dataset_id)
+    assert not (DATA_DIR / dataset_id).exists()
+    assert not list(DATA_DIR.glob(f".{dataset_id}*"))
+
+@pytest.fixture
+def dataset_id():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"a": rng.normal(size=200), "name": [f"r{i}" for i in range(200)],
+                       "b": rng.integers(0, 9, 200), "y": rng.integers(0, 2, 200)})
+    dataset_id = f"{uuid.uuid4().hex}.csv"
+    df.to_csv(DATA_DIR / dataset_id, index=False)
+    return dataset_id
+
+def test_training_frame_comes_from_memory_mapped_columns(dataset_id):
+    expected = pd.read_csv(DATA_DIR / dataset_id)[["a", "b", "y"]]
+    frame = load_training_frame(dataset_id, "y")
+    assert list(frame.columns) == ["a", "b", "y"]
+    for c in frame.columns:
+        np.testing.assert_array_equal(frame[c].to_numpy(), expected[c].to_numpy())
+    assert (column_cache_dir(dataset_id) / "index.json").exists()
+    assert isinstance(load_training_frame(dataset_id, "y")["a"].values.base, np.memmap)
+    # Non-numeric columns are not cached and come from the CSV.
+    assert list(load_columns(dataset_id, ["name", "a"])["name"][:2]) == ["r0", "r1"]
+
+def test_concurrent_first_loads_parse_once(dataset_id, monkeypatch):
+    builds = []
+    real_build = storage._build_column_cache
+    monkeypatch.setattr(storage, "_build_column_cache", lambda d: builds.append(d) or real_build(d))
+    start = threading.Barrier(6)
+    frames = []
+
+    def load():
+        start.wait()
+        frames.append(load_training_frame(dataset_id, "y"))
+
+    threads = [threading.Thread(target=load) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert builds == [dataset_id]
+    assert len(frames) == 6 and all(f.shape == (200, 3) for f in frames)
+
+def test_rewritten_dataset_invalidates_the_cache(dataset_id):
+    load_training_frame(dataset_id, "y")
+    pd.DataFrame({"a": [1.0, 2.0], "b": [3, 4], "y": [0, 1]}).to_csv(DATA_DIR / dataset_id, index=False)
+    assert load_training_frame(dataset_id, "y")["a"].tolist() == [1.0, 2.0]
+    assert not [p for p in DATA_DIR.glob(f".{dataset_id}.cols.*") if p.is_dir()]   # no temp or stale dirs left
@@ -0,0 +1,122 @@
+from __future__ import annotations
+import uuid
+import numpy as np
+import pandas as pd
+import pytest
+from joblib import load
+from sklearn.linear_model import SGDClassifier
+from app.core import streaming
+from app.core.compiled import CompiledModel
+from app.core.streaming import Reservoir, StratifiedReservoir, _drop_columns, plan_budget, train_streaming
+from app.core.storage import DATA_DIR
+
+def _stream(sampler, X, y, chunk: int = 97):
+    for s in range(0, len(y), chunk):
+        sampler.add(X[s:s + chunk], y[s:s + chunk])
+    return sampler.arrays()
+
+def test_reservoir_keeps_capacity_and_only_stream_rows():
+    n = 10000
+    X = np.arange(n, dtype=np.float64)[:, None]
+    Xs, ys = _stream(Reservoir(500, 1, np.random.default_rng(0)), X, np.zeros(n, dtype=np.int64))
+    assert len(ys) == 500
+    assert len(np.unique(Xs[:, 0])) == 500
+    # Uniform over the stream: the sample mean of row ids sits near the middle.
+    assert abs(Xs[:, 0].mean() - n / 2) < n * 0.05
+
+def test_reservoir_shorter_stream_keeps_everything():
+    X = np.arange(30, dtype=np.float64)[:, None]
+    Xs, _ = _stream(Reservoir(100, 1, np.random.default_rng(0)), X, np.zeros(30, dtype=np.int64))
+    assert sorted(Xs[:, 0]) == list(range(30))
+
+def test_stratified_reservoir_balances_classes_and_keeps_rare_ones():
+    n = 20000
+    y = (np.arange(n) % 100 == 0).astype(np.int64)        # 200 positives
+    X = np.c_[np.arange(n), y].astype(np.float64)
+    sampler = StratifiedReservoir(1000, 2, np.random.default_rng(0))
+    Xs, ys = _stream(sampler, X, y)
+    assert (ys == 1).sum() == 200                          # every rare row kept
+    assert (ys == 0).sum() == 500                          # the other class fills its share
+    assert (Xs[:, 1] == ys).all()                          # rows stay aligned with their labels
+    assert np.shares_memory(Xs, sampler.X)                 # compacted in place, no copy
+
+def test_plan_budget_grows_with_memory():
+    small, big = plan_budget(64, 11, 10), plan_budget(1024, 11, 10)
+    assert all(big[k] >= small[k] for k in small)
+    assert small["sample_rows"] >= 1000
+
+@pytest.fixture
+def nan_dataset():
+    rng = np.random.default_rng(0)
+    n = 6000
+    X = rng.normal(size=(n, 4))
+    y = (X[:, 0] + rng.normal(size=n) * 0.3 > 0.5).astype(int)
+    X[rng.random((n, 4)) < 0.05] = np.nan
+    df = pd.DataFrame(X, columns=list("abcd"))
+    df["y"] = y
+    dataset_id = f"{uuid.uuid4().hex}.csv"
+    df.to_csv(DATA_DIR / dataset_id, index=False)
+    return dataset_id
+
+class _ChanceSGD(SGDClassifier):
+    def predict_proba(self, X):
+        return np.full((len(X), 2), 0.5)
+
+@pytest.mark.parametrize("hgb", [False, True])
+def test_streaming_imputes_missing_values_when_serving(nan_dataset, monkeypatch, hgb):
+    if hgb:
+        # SGD candidates that score no better than chance, so HistGB wins.
+        monkeypatch.setattr(streaming, "SGDClassifier", _ChanceSGD)
+    else:
+        monkeypatch.setattr(streaming, "_hgb_candidates", lambda n: [])
+    run_id = uuid.uuid4().hex[:12]
+    out = train_streaming(run_id, nan_dataset, "y", 4, memory_mb=8, sample_policy="stratified", epochs=1)
+    assert out["ok"]
+    m = out["manifest"]
+    assert m["model"]["family"] == ("hgb" if hgb else "sgd")
+    assert m["streaming"]["sample_policy"] == "stratified"
+    assert m["streaming"]["train_rows"] + m["streaming"]["val_rows"] == 6000
+    X = np.array([[np.nan, 1.0, np.nan, 0.0], [2.0, np.nan, 0.5, np.nan]])
+    pipe = load(m["artifacts"]["pipeline"])
+    assert pipe.steps[0][0] == "impute"
+    assert np.isfinite(pipe.predict_proba(X)[:, 1]).all()
+    if "compiled" in m["artifacts"]:
+        p = CompiledModel.load(m["artifacts"]["compiled"]).predict_positive(X)
+        np.testing.assert_allclose(p, pipe.predict_proba(X)[:, 1], atol=1e-9)
+
+def _write(df: pd.DataFrame) -> str:
+    dataset_id = f"{uuid.uuid4().hex}.csv"
+    df.to_csv(DATA_DIR / dataset_id, index=False)
+    return dataset_id
+
+def test_drop_columns_compacts_in_place():
+    X = np.arange(10007 * 5, dtype=np.float64).reshape(10007, 5)
+    expected = X[:, [0, 2, 3]].copy()
+    out = _drop_columns(X, np.array([True, False, True, True, False]), block=1000)
+    np.testing.assert_array_equal(out, expected)
+    assert np.shares_memory(out, X)
+
+def test_all_nan_feature_columns_are_dropped():
+    rng = np.random.default_rng(1)
+    n = 3000
+    df = pd.DataFrame({"a": rng.normal(size=n), "empty": np.nan, "b": rng.normal(size=n)})
+    df["y"] = (df["a"] + rng.normal(size=n) * 0.3 > 0).astype(int)
+    out = train_streaming(uuid.uuid4().hex[:12], _write(df), "y", 4, memory_mb=8, epochs=1)
+    assert out["ok"]
+    m = out["manifest"]
+    assert m["features"] == ["a", "b"]
+    assert m["streaming"]["dropped_features"] == ["empty"]
+    pipe = load(m["artifacts"]["pipeline"])
+    X = np.array([[0.5, np.nan], [-1.0, 2.0]])
+    assert np.isfinite(pipe.predict_proba(X)[:, 1]).all()
+
+def test_only_empty_features_is_an_error():
+    df = pd.DataFrame({"empty": [np.nan] * 100, "y": [0, 1] * 50})
+    out = train_streaming(uuid.uuid4().hex[:12], _write(df), "y", 4, memory_mb=8, epochs=1)
+    assert out == {"ok": False, "error": "no_numeric_features"}
+
+@pytest.mark.parametrize("y", [[0, 1, 2], [0.0, 0.5, 1.0], [-1, 0, 1]])
+def test_non_binary_target_is_rejected(y):
+    df = pd.DataFrame({"a": np.arange(300, dtype=float), "y": y * 100})
+    with pytest.raises(ValueError, match="must be 0/1"):
+        train_streaming(uuid.uuid4().hex[:12], _write(df), "y", 4, memory_mb=8, epochs=1)
@@ -0,0 +1,147 @@
+from __future__ import annotations
+import uuid
+import numpy as np
+import pandas as pd
+import pytest
+from app.core import registry, training
+from app.core.storage import RunIndex, champion_file
+from app.core.training import CandidateCache, PreparedSplit, _evaluate_population, _search_shape, train_genetic
+
+@pytest.fixture(autouse=True)
+def fresh_registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, "DB_PATH", tmp_path / "registry.db")
+    monkeypatch.setattr(registry, "_ready", False)
+    champion_file().unlink(missing_ok=True)
+
+@pytest.fixture(scope="module")
+def frame() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 4))
+    df = pd.DataFrame(X, columns=list("abcd"))
+    df["y"] = (X[:, 0] - X[:, 1] + rng.normal(size=400) * 0.5 > 0).astype(int)
+    return df
+
+def _events(run_id: str, stage: str):
+    return [e["data"] for e in RunIndex().events(run_id)["events"] if e["stage"] == stage]
+
+def test_halving_population_grows_with_n_trials():
+    assert _search_shape(200, "full") == (8, 4)
+    for n in (24, 64, 200):
+        pop_size, gens = _search_shape(n, "halving")
+        assert n <= pop_size * gens < n + gens
+    assert _search_shape(200, "halving")[0] > _search_shape(64, "halving")[0] > 8
+
+def test_halving_search_screens_the_whole_population(frame):
+    run_id = uuid.uuid4().hex[:12]
+    out = train_genetic(run_id, frame, "y", 24, search_mode="halving")
+    assert out["ok"]
+    pop_size, gens = _search_shape(24, "halving")
+    candidates = _events(run_id, "candidate")
+    for g in range(gens):
+        assert len([c for c in candidates if c["generation"] == g]) == pop_size
+    # Some candidates were dropped before a full-fidelity fit.
+    assert any(c["fidelity"] < 1 for c in candidates if not c["cached"])
+    assert out["manifest"]["search"]["mode"] == "halving"
+    assert registry.champion_version() == out["manifest"]["version"]
+
+POPULATION = [
+    ("logreg", {"C": 0.5, "penalty": "l2", "solver": "lbfgs", "max_iter": 1000}),
+    ("rf", {"n_estimators": 20, "max_depth": 4, "min_samples_split": 2, "min_samples_leaf": 1, "n_jobs": -1,
+            "random_state": 0}),
+    ("gb", {"n_estimators": 20, "learning_rate": 0.1, "max_depth": 2, "subsample": 1.0, "random_state": 0}),
+    ("logreg", {"C": 5.0, "penalty": "l2", "solver": "lbfgs", "max_iter": 1000}),
+]
+
+def _split(frame: pd.DataFrame, cv_folds: int = 0) -> PreparedSplit:
+    X, y = frame[list("abcd")].to_numpy(), frame["y"].to_numpy()
+    return PreparedSplit(X[:300], y[:300], X[300:], y[300:], cv_folds)
+
+def test_parallel_population_matches_serial_in_population_order(frame, monkeypatch):
+    out = {}
+    for budget in (1, 2):
+        monkeypatch.setattr(training, "core_budget", lambda b=budget: b)
+        scored = _evaluate_population(uuid.uuid4().hex[:12], 0, POPULATION, _split(frame), CandidateCache("fp"))
+        out[budget] = scored
+    serial, parallel = out[1], out[2]
+    assert [c for c, _, _ in parallel] == POPULATION
+    assert [m for _, m, _ in parallel] == [m for _, m, _ in serial]
+    # Searched settings are kept on the exported estimator, not the per-worker n_jobs.
+    assert parallel[1][2].named_steps["clf"].n_jobs == -1
+
+def test_candidate_cache_fits_each_config_once(frame):
+    split, cache, run_id = _split(frame), CandidateCache("fp"), uuid.uuid4().hex[:12]
+    population = POPULATION + POPULATION[:2]          # survivors duplicated to fill, as the search does
+    first = _evaluate_population(run_id, 0, population, split, cache)
+    assert cache.fits == len(POPULATION)
+    assert first[4][2] is first[0][2]                  # duplicate resolves to the same fitted pipeline
+    again = _evaluate_population(run_id, "final", POPULATION, split, cache)
+    assert cache.fits == len(POPULATION)
+    assert [m for _, m, _ in again] == [m for _, m, _ in first[:4]]
+    # A config that left the population keeps its metrics but is refitted if it returns.
+    cache.retain(POPULATION[:1])
+    _evaluate_population(run_id, 1, POPULATION[:2], split, cache)
+    assert cache.fits == len(POPULATION) + 1
+
+def test_final_population_is_not_refitted(frame):
+    run_id = uuid.uuid4().hex[:12]
+    assert train_genetic(run_id, frame, "y", 8)["ok"]
+    candidates = _events(run_id, "candidate")
+    final = [c for c in candidates if c["generation"] == "final"]
+    # Survivors (the first half) come straight from the cache.
+    assert all(c["cached"] for c in final[:len(final) // 2])
+    assert _events(run_id, "eval")[0]["fits"] == sum(not c["cached"] for c in candidates)
+
+def test_split_scales_once_and_shares_the_arrays(frame):
+    split = _split(frame)
+    lin, lin_again, tree = split.arrays("logreg"), split.arrays("logreg"), split.arrays("rf")
+    assert lin["pre"] is split.scaler and lin_again["Xtr"] is lin["Xtr"]
+    np.testing.assert_allclose(lin["Xtr"].mean(axis=0), 0, atol=1e-12)
+    assert tree["pre"] == "passthrough" and tree["Xtr"] is split.Xtr
+    for a in (lin["Xtr"], lin["Xval"], tree["Xtr"], tree["Xval"]):
+        assert a.dtype == np.float64 and a.flags.c_contiguous
+    # The exported pipeline (shared scaler + classifier) scores raw inputs.
+    metrics, pipe, _ = training._fit_candidate(*POPULATION[0], inner_jobs=1, **lin)
+    p = pipe.predict_proba(split.Xval)[:, 1]
+    assert metrics == training._score(split.yval, p)
+
+def test_cv_folds_scale_on_their_own_training_rows(frame):
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import roc_auc_score
+    from sklearn.preprocessing import StandardScaler
+    split = _split(frame, cv_folds=3)
+    tr, te = split.folds[0]
+    metrics, _ = training._fit_fold(*POPULATION[0], **split.fold_arrays("logreg"), inner_jobs=1,
+                                    train_idx=tr, test_idx=te)
+    pre = StandardScaler().fit(split.Xtr[tr])
+    clf = LogisticRegression(C=0.5, max_iter=1000).fit(pre.transform(split.Xtr[tr]), split.ytr[tr])
+    expected = roc_auc_score(split.ytr[te], clf.predict_proba(pre.transform(split.Xtr[te]))[:, 1])
+    assert metrics["auc"] == pytest.approx(expected, abs=1e-12)
+
+def test_cv_prunes_candidates_below_the_bar(frame, monkeypatch):
+    monkeypatch.setattr(training, "core_budget", lambda: 1)   # one fold per wave
+    split, cache = _split(frame, cv_folds=3), CandidateCache("fp")
+    todo = {cache.key(f, p): (f, p) for f, p in POPULATION}
+    out = training._fit_cv(todo, split, cache, best_auc=1.01)
+    for metrics, pipe, _, fraction in out.values():
+        assert pipe is None and fraction == pytest.approx(1 / 3)
+    assert cache.budget_spent == pytest.approx(len(todo) / 3)
+
+def test_cv_search_exports_a_model_with_cv_metrics(frame):
+    run_id = uuid.uuid4().hex[:12]
+    out = train_genetic(run_id, frame, "y", 4, search_mode="cv", cv_folds=3)
+    assert out["ok"]
+    assert out["manifest"]["search"]["cv_folds"] == 3
+    full = [c for c in _events(run_id, "candidate") if not c["cached"] and c["fidelity"] == 1]
+    assert full and out["manifest"]["metrics"] in [c["metrics"] for c in full]
+
+def test_profiled_run_saves_stage_totals_and_stacks(frame):
+    import json
+    run_id = uuid.uuid4().hex[:12]
+    out = train_genetic(run_id, frame, "y", 4, profile=True)
+    arts = out["manifest"]["artifacts"]
+    profile = json.loads(open(arts["profile"]).read())
+    assert {"ingest", "prep", "final", "dump"} <= set(profile["stages"])
+    assert profile == _events(run_id, "profile")[0]
+    assert open(arts["profile_stacks"]).read().strip()
+    candidate = _events(run_id, "candidate")[0]
+    assert {"fit_s", "predict_s", "score_s", "cpu_s", "peak_rss_mb"} <= set(candidate)
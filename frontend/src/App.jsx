@@ -57,16 +57,20 @@ export default function App() {
 
   useEffect(() => {
     if (!runId) return;
-    const interval = setInterval(async () => {
-      const res = await fetch(`${API}/runs/${runId}/status`);
-      const data = await res.json();
-      setStatus(data);
-      if (data.status === "done" || data.status === "error") {
-        clearInterval(interval);
-        fetchChampion();
-      }
-    }, 3000);
-    return () => clearInterval(interval);
+    // Server-sent events: the browser resumes from Last-Event-ID on reconnect.
+    const source = new EventSource(`${API}/runs/${runId}/events`);
+    setStatus({ status: "running", events: [] });
+    source.onmessage = (msg) => {
+      const event = JSON.parse(msg.data);
+      setStatus((s) => ({ ...s, events: [...(s?.events || []), event] }));
+    };
+    source.addEventListener("status", (msg) => {
+      const { status: final } = JSON.parse(msg.data);
+      setStatus((s) => ({ ...s, status: final }));
+      source.close();
+      fetchChampion();
+    });
+    return () => source.close();
   }, [runId]);
 
   const fetchChampion = async () => {
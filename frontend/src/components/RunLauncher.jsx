@@ -5,11 +5,17 @@ export default function RunLauncher({API, dataset, onStarted, onStatus}){
   const [runId, setRunId] = useState(null)
   useEffect(()=>{
     if(!runId) return
-    const id = setInterval(async ()=>{
-      const r = await fetch(`${API}/runs/${runId}/status`)
-      onStatus(await r.json())
-    }, 1500)
-    return ()=>clearInterval(id)
+    let status = {status: "running", events: []}
+    const source = new EventSource(`${API}/runs/${runId}/events`)
+    source.onmessage = msg => {
+      status = {...status, events: [...status.events, JSON.parse(msg.data)]}
+      onStatus(status)
+    }
+    source.addEventListener("status", msg => {
+      status = {...status, status: JSON.parse(msg.data).status}
+      onStatus(status); source.close()
+    })
+    return ()=>source.close()
   }, [runId])
   async function launch(){
     const body = {dataset_id: dataset.dataset_id, target, n_trials: Number(trials)}